@@ -0,0 +1,104 @@
+"""
+Micro-benchmark of datasources.
+
+Usage:
+    uv run python scripts/benchmark_datasource.py [--sizes 10000 100000] [--repeat 50]
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable
+
+from ytdl_api.constants import DownloadStatus, MediaFormat
+from ytdl_api.datasource import IDataSource, IndexedInMemoryDB, InMemoryDB, SQLiteDB
+from ytdl_api.schemas.models import Download, DownloadStatusInfo
+from ytdl_api.utils import get_datetime_now
+
+CLIENTS = 1000
+TEMP_DIR = tempfile.TemporaryDirectory()
+DATASOURCES: dict[str, Callable[[], IDataSource]] = {
+    "tinydb": InMemoryDB,
+    "indexed": IndexedInMemoryDB,
+    "sqlite": lambda: SQLiteDB(Path(tempfile.mkstemp(suffix=".sqlite3", dir=TEMP_DIR.name)[1])),
+}
+
+
+def generate_downloads(size: int) -> list[Download]:
+    dt_now = get_datetime_now()
+    return [
+        Download(
+            client_id=f"client-{n % CLIENTS}",
+            title=f"Video {n}",
+            url=f"https://www.youtube.com/watch?v={n:011d}",
+            media_format=MediaFormat.MP4,
+            duration=60000,
+            thumbnail_url="https://i.ytimg.com/vi/default.jpg",
+            when_submitted=dt_now - timedelta(seconds=size - n),
+        )
+        for n in range(size)
+    ]
+
+
+def measure(fn: Callable[[], object], repeat: int) -> float:
+    """Return average time of single call in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def seed(datasource: IDataSource, downloads: list[Download]):
+    if isinstance(datasource, InMemoryDB):
+        # Every TinyDB insert rewrites whole table, so bulk insert is used to keep seeding fast.
+        datasource.db.insert_multiple(download.model_dump() for download in downloads)
+    else:
+        for download in downloads:
+            datasource.put_download(download)
+
+
+def benchmark(datasource: IDataSource, downloads: list[Download], repeat: int) -> dict[str, float]:
+    seed(datasource, downloads)
+    new_downloads = iter(generate_downloads(repeat))
+    results = {"put_download": measure(lambda: datasource.put_download(next(new_downloads)), repeat)}
+    sample = random.choice(downloads)
+    progress = DownloadStatusInfo(
+        key=sample.media_id,
+        title=sample.title,
+        client_id=sample.client_id,
+        media_id=sample.media_id,
+        status=DownloadStatus.DOWNLOADING,
+        progress=50,
+    )
+    till_when = downloads[len(downloads) // 100].when_submitted
+    results["get_download"] = measure(lambda: datasource.get_download(sample.client_id, sample.media_id), repeat)
+    results["update_download"] = measure(lambda: datasource.update_download(sample), repeat)
+    results["update_download_progress"] = measure(lambda: datasource.update_download_progress(progress), repeat)
+    results["fetch_available_downloads"] = measure(
+        lambda: datasource.fetch_available_downloads(sample.client_id), repeat
+    )
+    results["fetch_downloads_till_datetime (1%)"] = measure(
+        lambda: datasource.fetch_downloads_till_datetime(till_when), repeat
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    for size in args.sizes:
+        downloads = generate_downloads(size)
+        results = {name: benchmark(factory(), downloads, args.repeat) for name, factory in DATASOURCES.items()}
+        print(f"\n{size} records (ms per call)")
+        print(f"{'operation':<36}" + "".join(f"{name:>12}" for name in DATASOURCES))
+        for operation in results["tinydb"]:
+            print(f"{operation:<36}" + "".join(f"{results[name][operation]:>12.3f}" for name in DATASOURCES))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,14 @@ from confz import DataSource
 from fastapi.testclient import TestClient
 
 from ytdl_api.config import Settings
-from ytdl_api.datasource import IDataSource, InMemoryDB
+from ytdl_api.datasource import (
+    AsyncDataSourceAdapter,
+    AsyncIDataSource,
+    IDataSource,
+    IndexedInMemoryDB,
+    InMemoryDB,
+    SQLiteDB,
+)
 from ytdl_api.dependencies import get_database, get_downloader, get_settings
 from ytdl_api.queue import NotificationQueue
 from ytdl_api.schemas.models import Download
@@ -63,9 +70,18 @@ def settings(fake_media_path: Path) -> Iterable[Settings]:
         yield Settings()  # type: ignore
 
 
+@pytest.fixture(params=[InMemoryDB, IndexedInMemoryDB, SQLiteDB])
+def datasource(request: pytest.FixtureRequest, fake_media_path: Path) -> IDataSource:
+    if request.param is SQLiteDB:
+        return SQLiteDB(fake_media_path / "ytdl.sqlite3")
+    return request.param()
+
+
 @pytest.fixture()
-def datasource() -> InMemoryDB:
-    return InMemoryDB()
+def async_datasource(datasource: IDataSource) -> Iterable[AsyncIDataSource]:
+    async_datasource = AsyncDataSourceAdapter(datasource)
+    yield async_datasource
+    async_datasource.shutdown()
 
 
 @pytest.fixture()
@@ -74,7 +90,7 @@ def faker_for_downloads(fake_media_path: Path) -> FakerForDownloads:
 
 
 @pytest.fixture
-def app_client(settings: Settings, datasource: InMemoryDB, faker_for_downloads: FakerForDownloads) -> TestClient:
+def app_client(settings: Settings, datasource: IDataSource, faker_for_downloads: FakerForDownloads) -> TestClient:
     app = settings.init_app()
     app.dependency_overrides[get_settings] = lambda: settings
     app.dependency_overrides[get_database] = lambda: datasource
@@ -1,12 +1,15 @@
 import asyncio
 import inspect
+import threading
 from datetime import datetime
 
 import ffmpeg
 import pytest
 
-from ytdl_api.constants import DownloadStatus
-from ytdl_api.datasource import InMemoryDB
+from ytdl_api.cache import VideoInfoCache
+from ytdl_api.callbacks import ProgressCoalescer
+from ytdl_api.constants import DownloadStatus, MediaFormat, MergeStrategy
+from ytdl_api.datasource import AsyncIDataSource, IDataSource
 from ytdl_api.dependencies import get_pytube_downloader
 from ytdl_api.downloaders import PytubeDownloader
 from ytdl_api.queue import NotificationQueue
@@ -16,11 +19,11 @@ from ytdl_api.storage import LocalFileStorage
 
 @pytest.fixture()
 def downloader(
-    datasource: InMemoryDB,
+    async_datasource: AsyncIDataSource,
     notification_queue: NotificationQueue,
     fake_local_storage: LocalFileStorage,
 ) -> PytubeDownloader:
-    return get_pytube_downloader(datasource, notification_queue, fake_local_storage)
+    return get_pytube_downloader(async_datasource, notification_queue, fake_local_storage)
 
 
 @pytest.mark.skip(
@@ -30,7 +33,7 @@ def test_video_download(
     downloader: PytubeDownloader,
     mock_persisted_download: Download,
     local_storage: LocalFileStorage,
-    datasource: InMemoryDB,
+    datasource: IDataSource,
 ):
     """
     Test video download.
@@ -59,7 +62,7 @@ def _raise_ffmpeg_error(*args, **kwargs):
 def test_video_download_ffmpeg_failed(
     downloader: PytubeDownloader,
     mock_persisted_download: Download,
-    datasource: InMemoryDB,
+    datasource: IDataSource,
     notification_queue: NotificationQueue,
 ):
     """
@@ -74,9 +77,10 @@ def test_video_download_ffmpeg_failed(
     # bad looking loop, but I did not know a better way to get last event
     # from asyncio.Queue which should contain status = 'failed'
     event = None
+    subscriber = notification_queue.subscribe(mock_persisted_download.client_id)
     while True:
         try:
-            event = notification_queue.queues[mock_persisted_download.client_id].get_nowait()
+            event = subscriber.get_nowait().status_info
         except asyncio.QueueEmpty:
             assert isinstance(event, DownloadStatusInfo)
             assert event.status == DownloadStatus.FAILED
@@ -84,3 +88,125 @@ def test_video_download_ffmpeg_failed(
             assert event.media_id == mock_persisted_download.media_id
             # in order to break while True loop when needed event was found & tested
             break
+
+
+def test_video_download_fetches_streams_concurrently(
+    downloader: PytubeDownloader,
+    mock_persisted_download: Download,
+    datasource: IDataSource,
+    notification_queue: NotificationQueue,
+    mocker,
+):
+    """
+    Test that audio and video streams are fetched at the same time and progress is aggregated across them.
+    """
+    # Both streams have to reach barrier before any of them can finish, which is impossible if fetched one by one.
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fake_stream(url: str):
+        barrier.wait()
+        yield b"x" * 512
+        yield b"x" * 512
+
+    stream = mocker.Mock(filesize=1024, subtype="mp4", url="https://googlevideo.com")
+    youtube = mocker.patch("ytdl_api.downloaders.YouTube")
+    youtube.return_value.streams.filter.return_value.desc.return_value.get_by_itag.return_value = stream
+    mocker.patch("ytdl_api.downloaders.request.stream", side_effect=fake_stream)
+    merged_streams = {}
+
+    def fake_merge_streams(
+        video_stream_posix_path: str,
+        audio_stream_posix_path: str,
+        merged_streams_posix_path: str,
+        media_format: MediaFormat,
+    ) -> MergeStrategy:
+        merged_streams["video"] = video_stream_posix_path
+        merged_streams["audio"] = audio_stream_posix_path
+        with open(merged_streams_posix_path, "wb") as f:
+            f.write(b"merged")
+        return MergeStrategy.STREAM_COPY
+
+    downloader._merge_streams = fake_merge_streams
+    assert downloader.download(mock_persisted_download) is True
+    assert merged_streams["video"] != merged_streams["audio"]
+    finished_download = datasource.get_download(mock_persisted_download.client_id, mock_persisted_download.media_id)
+    assert finished_download.status == DownloadStatus.FINISHED
+    assert finished_download.merge_strategy == MergeStrategy.STREAM_COPY
+    progress_events = []
+    subscriber = notification_queue.subscribe(mock_persisted_download.client_id)
+    while True:
+        try:
+            event = subscriber.get_nowait().status_info
+        except asyncio.QueueEmpty:
+            break
+        if event.status == DownloadStatus.DOWNLOADING and event.progress:
+            progress_events.append(event.progress)
+    assert progress_events[-1] == 100
+
+
+@pytest.mark.parametrize(
+    "video_codec, audio_codec, expected_strategy, expected_args",
+    [
+        ("h264", "aac", MergeStrategy.STREAM_COPY, ["-acodec", "copy", "-vcodec", "copy"]),
+        ("h264", "opus", MergeStrategy.VIDEO_COPY, ["-acodec", "aac", "-vcodec", "copy"]),
+        ("vp8", "opus", MergeStrategy.TRANSCODE, ["concat"]),
+    ],
+)
+def test_merge_streams_strategy(
+    downloader: PytubeDownloader,
+    mocker,
+    video_codec: str,
+    audio_codec: str,
+    expected_strategy: MergeStrategy,
+    expected_args: list[str],
+):
+    """
+    Test that streams are remuxed without re-encoding when MP4 container supports their codecs.
+    """
+    codecs = {"video.webm": video_codec, "audio.webm": audio_codec}
+    mocker.patch(
+        "ytdl_api.downloaders.ffmpeg.probe", side_effect=lambda path: {"streams": [{"codec_name": codecs[path]}]}
+    )
+    run = mocker.patch.object(ffmpeg.nodes.OutputStream, "run", autospec=True)
+    strategy = downloader._merge_streams("video.webm", "audio.webm", "merged.mp4", MediaFormat.MP4)
+    assert strategy == expected_strategy
+    assert run.call_count == 1
+    compiled_args = " ".join(run.call_args.args[0].get_args())
+    assert " ".join(expected_args) in compiled_args
+
+
+def test_merge_streams_falls_back_to_transcoding(downloader: PytubeDownloader, mocker):
+    mocker.patch("ytdl_api.downloaders.ffmpeg.probe", return_value={"streams": [{"codec_name": "h264"}]})
+    run = mocker.patch.object(
+        ffmpeg.nodes.OutputStream, "run", autospec=True, side_effect=[ffmpeg.Error("ffmpeg", b"", b""), None]
+    )
+    strategy = downloader._merge_streams("video.mp4", "audio.m4a", "merged.mp4", MediaFormat.MP4)
+    assert strategy == MergeStrategy.TRANSCODE
+    assert run.call_count == 2
+
+
+def test_download_reuses_cached_streams_manifest(downloader: PytubeDownloader, mocker):
+    """
+    Test that streams resolved while fetching video info are reused for download.
+    """
+    downloader.video_info_cache = VideoInfoCache(ttl=60, max_size=10)
+    youtube = mocker.patch("ytdl_api.downloaders.YouTube")
+    manifest = mocker.Mock()
+    downloader.video_info_cache.put("https://www.youtube.com/watch?v=NcBjx_eyvxc", mocker.Mock(), manifest=manifest)
+    assert downloader._get_streams("https://www.youtube.com/watch?v=NcBjx_eyvxc") is manifest
+    youtube.assert_not_called()
+
+
+def test_progress_is_rate_limited_before_submitting_to_event_loop(
+    downloader: PytubeDownloader, mock_persisted_download: Download, mocker
+):
+    """
+    Test that only progress updates that are emitted are passed from download thread to event loop.
+    """
+    downloader.progress_coalescer = ProgressCoalescer(max_updates_per_second=1)
+    submit = mocker.patch.object(downloader.event_loop_bridge, "submit")
+    callback = mocker.Mock()
+    for progress in (1, 1, 2, 3):
+        downloader._report_progress(mock_persisted_download, progress, callback)
+    callback.assert_called_once_with()
+    submit.assert_called_once_with(callback.return_value)
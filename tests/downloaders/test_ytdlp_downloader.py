@@ -3,9 +3,9 @@ import inspect
 import pytest
 
 from ytdl_api.constants import MediaFormat
-from ytdl_api.datasource import IDataSource
+from ytdl_api.datasource import AsyncIDataSource
 from ytdl_api.dependencies import get_ytdlp_downloader
-from ytdl_api.downloaders import YTDLPDownloader
+from ytdl_api.downloaders import YTDLPDownloader, get_ytdlp_manifest
 from ytdl_api.queue import NotificationQueue
 from ytdl_api.schemas.models import Download, YoutubeURL
 from ytdl_api.schemas.responses import VideoInfoResponse
@@ -14,11 +14,35 @@ from ytdl_api.storage import LocalFileStorage
 
 @pytest.fixture()
 def downloader(
-    datasource: IDataSource,
+    async_datasource: AsyncIDataSource,
     notification_queue: NotificationQueue,
     fake_local_storage: LocalFileStorage,
 ) -> YTDLPDownloader:
-    return get_ytdlp_downloader(datasource, notification_queue, fake_local_storage)
+    return get_ytdlp_downloader(async_datasource, notification_queue, fake_local_storage)
+
+
+def test_get_ytdlp_manifest():
+    """
+    Test that only info needed for downloading streams is kept in cached manifest.
+    """
+    info = {
+        "id": "NcBjx_eyvxc",
+        "title": "title",
+        "webpage_url": "https://www.youtube.com/watch?v=NcBjx_eyvxc",
+        "extractor_key": "Youtube",
+        "formats": [
+            {"format_id": "sb0", "protocol": "mhtml", "fragments": [{"url": "https://i.ytimg.com/sb"}] * 100},
+            {"format_id": "140", "protocol": "https", "url": "https://rr.googlevideo.com/140"},
+        ],
+        "automatic_captions": {"en": [{"url": "https://www.youtube.com/api/timedtext"}] * 100},
+        "thumbnails": [{"url": "https://i.ytimg.com/vi/NcBjx_eyvxc/maxresdefault.jpg"}] * 100,
+        "heatmap": [{"start_time": 0.0, "end_time": 1.0, "value": 1.0}] * 100,
+    }
+    manifest = get_ytdlp_manifest(info)
+    assert {"automatic_captions", "thumbnails", "heatmap"}.isdisjoint(manifest)
+    assert manifest["id"] == info["id"]
+    assert [stream["format_id"] for stream in manifest["formats"]] == ["140"]
+    assert len(info["formats"]) == 2
 
 
 @pytest.mark.parametrize(
@@ -1,22 +1,45 @@
+import asyncio
+from pathlib import Path
+
+import pytest
 from fastapi.testclient import TestClient
 from pytest_mock.plugin import MockerFixture
 
+from ytdl_api.config import Settings
+from ytdl_api.constants import DownloadStatus, MediaOffloadMode
 from ytdl_api.datasource import IDataSource
+from ytdl_api.dependencies import get_settings
 from ytdl_api.schemas.models import Download
 from ytdl_api.schemas.requests import DownloadParams
 
 
 def test_submit_download(app_client: TestClient, uid: str, mock_download_params: DownloadParams, mocker: MockerFixture):
     app_client.cookies = {"uid": uid}
-    # Mocking BackgroundTasks because we don't actually want to start process of downloading video
-    mocker.patch("ytdl_api.endpoints.BackgroundTasks.add_task")
+    # Mocking worker pool because we don't actually want to start process of downloading video
+    submit = mocker.patch("ytdl_api.workers.DownloadWorkerPool.submit")
     response = app_client.put("/api/download", json=mock_download_params.model_dump())
     assert response.status_code == 201
+    submit.assert_called_once()
     json_response = response.json()
     assert json_response.get("mediaId") is not None
     assert json_response.get("whenSubmitted") is not None
 
 
+def test_submit_download_journals_job_off_event_loop(
+    app_client: TestClient, uid: str, mock_download_params: DownloadParams, mocker: MockerFixture
+):
+    def submit(*args):
+        # Raises RuntimeError unless job is submitted (and journaled) on event loop thread.
+        with pytest.raises(RuntimeError):
+            asyncio.get_running_loop()
+
+    app_client.cookies = {"uid": uid}
+    mocked_submit = mocker.patch("ytdl_api.workers.DownloadWorkerPool.submit", side_effect=submit)
+    response = app_client.put("/api/download", json=mock_download_params.model_dump())
+    assert response.status_code == 201
+    mocked_submit.assert_called_once()
+
+
 def test_download_file_endpoint(app_client: TestClient, mocked_downloaded_media: Download, datasource: IDataSource):
     app_client.cookies = {"uid": mocked_downloaded_media.client_id}
     response = app_client.get(
@@ -32,6 +55,62 @@ def test_download_file_endpoint(app_client: TestClient, mocked_downloaded_media:
     assert download.when_file_downloaded is not None
 
 
+def test_download_file_range_request(app_client: TestClient, mocked_downloaded_media: Download):
+    app_client.cookies = {"uid": mocked_downloaded_media.client_id}
+    response = app_client.get(
+        "/api/download",
+        params={"mediaId": mocked_downloaded_media.media_id},
+        headers={"Range": "bytes=0-99"},
+    )
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 0-99/1024"
+    assert len(response.content) == 100
+
+
+def test_download_file_head_request(app_client: TestClient, mocked_downloaded_media: Download, datasource: IDataSource):
+    app_client.cookies = {"uid": mocked_downloaded_media.client_id}
+    response = app_client.head("/api/download", params={"mediaId": mocked_downloaded_media.media_id})
+    assert response.status_code == 200
+    assert response.headers["content-length"] == "1024"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.content == b""
+    download = datasource.get_download(mocked_downloaded_media.client_id, mocked_downloaded_media.media_id)
+    assert download is not None
+    assert download.status == mocked_downloaded_media.status
+
+
+@pytest.mark.parametrize(
+    "media_offload, header",
+    [
+        (MediaOffloadMode.X_ACCEL_REDIRECT, "x-accel-redirect"),
+        (MediaOffloadMode.X_SENDFILE, "x-sendfile"),
+    ],
+)
+def test_download_file_offloaded_to_reverse_proxy(
+    app_client: TestClient,
+    settings: Settings,
+    mocked_downloaded_media: Download,
+    datasource: IDataSource,
+    media_offload: MediaOffloadMode,
+    header: str,
+):
+    offload_settings = settings.model_copy(update={"media_offload": media_offload})
+    app_client.app.dependency_overrides[get_settings] = lambda: offload_settings  # type: ignore
+    app_client.cookies = {"uid": mocked_downloaded_media.client_id}
+    response = app_client.get("/api/download", params={"mediaId": mocked_downloaded_media.media_id})
+    assert response.status_code == 200
+    assert response.content == b""
+    assert "attachment" in response.headers["content-disposition"]
+    file_path = Path(mocked_downloaded_media.file_path).resolve()
+    if media_offload == MediaOffloadMode.X_ACCEL_REDIRECT:
+        assert response.headers[header] == f"/protected-media/{file_path.name}"
+    else:
+        assert response.headers[header] == file_path.as_posix()
+    download = datasource.get_download(mocked_downloaded_media.client_id, mocked_downloaded_media.media_id)
+    assert download is not None
+    assert download.status == DownloadStatus.DOWNLOADED
+
+
 def test_download_file_but_non_exisiting_media_id(app_client: TestClient, mocked_downloaded_media: Download):
     app_client.cookies = {"uid": mocked_downloaded_media.client_id}
     response = app_client.get(
@@ -1,8 +1,16 @@
-from datetime import datetime
+import base64
+import json
+from datetime import datetime, timedelta, timezone
 
+import pytest
 from fastapi.testclient import TestClient
 
+from ytdl_api.datasource import IDataSource, IndexedInMemoryDB, InMemoryDB
+from ytdl_api.dependencies import get_database
 from ytdl_api.schemas.models import Download
+from ytdl_api.utils import decode_cursor, encode_cursor, get_datetime_now
+
+from ..utils import FakerForDownloads
 
 
 def test_get_downloads(uid: str, app_client: TestClient, mock_persisted_download: Download):
@@ -19,3 +27,162 @@ def test_get_downloads(uid: str, app_client: TestClient, mock_persisted_download
     assert (
         datetime.fromisoformat(json_response["downloads"][0]["whenSubmitted"]) == mock_persisted_download.when_submitted
     )
+
+
+def test_get_downloads_excludes_streams_by_default(uid: str, app_client: TestClient, mock_persisted_download: Download):
+    app_client.cookies = {"uid": uid}
+    response = app_client.get("/api/downloads")
+    assert response.status_code == 200
+    download = response.json()["downloads"][0]
+    assert "videoStreams" not in download
+    assert "audioStreams" not in download
+    assert "nextCursor" not in response.json()
+
+
+def test_get_downloads_fields_projection(uid: str, app_client: TestClient, mock_persisted_download: Download):
+    app_client.cookies = {"uid": uid}
+    response = app_client.get("/api/downloads", params={"fields": "mediaId,status,video_streams"})
+    assert response.status_code == 200
+    download = response.json()["downloads"][0]
+    assert download.keys() == {"mediaId", "status", "videoStreams"}
+    assert len(download["videoStreams"]) == len(mock_persisted_download.video_streams)
+
+
+def test_get_downloads_unknown_fields(uid: str, app_client: TestClient, mock_persisted_download: Download):
+    app_client.cookies = {"uid": uid}
+    response = app_client.get("/api/downloads", params={"fields": "mediaId,password"})
+    assert response.status_code == 400
+
+
+def test_get_downloads_pagination(
+    uid: str, app_client: TestClient, datasource: IDataSource, faker_for_downloads: FakerForDownloads
+):
+    dt_now = get_datetime_now()
+    downloads = [
+        faker_for_downloads.random_download(uid, when_submitted=dt_now - timedelta(minutes=minutes))
+        for minutes in (3, 5, 1, 4, 2)
+    ]
+    for download in downloads:
+        datasource.put_download(download)
+    expected = [download.media_id for download in sorted(downloads, key=lambda download: download.when_submitted)]
+    app_client.cookies = {"uid": uid}
+    media_ids = []
+    params = {"limit": 2}
+    while True:
+        response = app_client.get("/api/downloads", params=params)
+        assert response.status_code == 200
+        json_response = response.json()
+        assert len(json_response["downloads"]) <= 2
+        media_ids.extend(download["mediaId"] for download in json_response["downloads"])
+        if "nextCursor" not in json_response:
+            break
+        params["cursor"] = json_response["nextCursor"]
+    assert media_ids == expected
+
+
+def encode_json_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "invalid",
+        encode_json_cursor({"when_submitted": "2024-01-01T00:00:00"}),
+        encode_json_cursor([1, "media_id"]),
+        encode_json_cursor(["yesterday", "media_id"]),
+        encode_json_cursor(["0001-01-01T00:00:00+01:00", "media_id"]),
+    ],
+)
+def test_get_downloads_invalid_cursor(uid: str, app_client: TestClient, mock_persisted_download: Download, cursor: str):
+    app_client.cookies = {"uid": uid}
+    response = app_client.get("/api/downloads", params={"cursor": cursor})
+    assert response.status_code == 400
+
+
+def test_get_downloads_cursor_timezone(
+    uid: str, app_client: TestClient, datasource: IDataSource, faker_for_downloads: FakerForDownloads
+):
+    dt_now = get_datetime_now()
+    downloads = [
+        faker_for_downloads.random_download(uid, when_submitted=dt_now - timedelta(minutes=minutes))
+        for minutes in (2, 1)
+    ]
+    for download in downloads:
+        datasource.put_download(download)
+    app_client.cookies = {"uid": uid}
+    when_submitted, media_id = decode_cursor(app_client.get("/api/downloads", params={"limit": 1}).json()["nextCursor"])
+    # Cursor with the same time in different timezone or without timezone (considered UTC) is accepted.
+    for cursor_when_submitted in (
+        when_submitted.astimezone(timezone(timedelta(hours=2))),
+        when_submitted.replace(tzinfo=None),
+    ):
+        response = app_client.get("/api/downloads", params={"cursor": encode_cursor(cursor_when_submitted, media_id)})
+        assert response.status_code == 200
+        assert [download["mediaId"] for download in response.json()["downloads"]] == [downloads[1].media_id]
+
+
+def test_get_downloads_changes(
+    uid: str, app_client: TestClient, datasource: IDataSource, faker_for_downloads: FakerForDownloads
+):
+    downloads = [faker_for_downloads.random_download(uid) for _ in range(2)]
+    for download in downloads:
+        datasource.put_download(download)
+    app_client.cookies = {"uid": uid}
+    response = app_client.get("/api/downloads/changes")
+    assert response.status_code == 200
+    json_response = response.json()
+    assert [download["mediaId"] for download in json_response["downloads"]] == [d.media_id for d in downloads]
+    assert "videoStreams" not in json_response["downloads"][0]
+    seq = json_response["seq"]
+    assert seq == json_response["downloads"][-1]["seq"]
+
+    datasource.delete_download(downloads[0])
+    response = app_client.get("/api/downloads/changes", params={"since": seq, "fields": "mediaId,status"})
+    assert response.status_code == 200
+    json_response = response.json()
+    assert json_response["downloads"] == [{"mediaId": downloads[0].media_id, "status": "deleted"}]
+    assert json_response["seq"] > seq
+
+    response = app_client.get("/api/downloads/changes", params={"since": json_response["seq"]})
+    assert response.json() == {
+        "downloads": [],
+        "seq": json_response["seq"],
+        "epoch": json_response["epoch"],
+        "resync": False,
+    }
+
+
+@pytest.mark.parametrize("datasource", (InMemoryDB, IndexedInMemoryDB), indirect=True)
+def test_get_downloads_changes_after_datasource_restart(
+    uid: str, app_client: TestClient, datasource: IDataSource, faker_for_downloads: FakerForDownloads
+):
+    datasource_type = type(datasource)
+    app_client.app.dependency_overrides[get_database] = lambda: datasource
+    app_client.cookies = {"uid": uid}
+    for _ in range(5):
+        datasource.put_download(faker_for_downloads.random_download(uid))
+    json_response = app_client.get("/api/downloads/changes").json()
+    assert json_response["seq"] == 5
+    seq, epoch = json_response["seq"], json_response["epoch"]
+
+    # Sequence of new data source starts again, so client's sequence number is ahead of it.
+    datasource = datasource_type()
+    download = faker_for_downloads.random_download(uid)
+    datasource.put_download(download)
+    response = app_client.get("/api/downloads/changes", params={"since": seq, "epoch": epoch})
+    assert response.status_code == 200
+    json_response = response.json()
+    assert json_response["resync"] is True
+    assert json_response["epoch"] != epoch
+    assert [d["mediaId"] for d in json_response["downloads"]] == [download.media_id]
+    seq, epoch = json_response["seq"], json_response["epoch"]
+
+    # Sequence passed client's sequence number already, so only epoch tells they are different.
+    datasource = datasource_type()
+    downloads = [faker_for_downloads.random_download(uid) for _ in range(3)]
+    for download in downloads:
+        datasource.put_download(download)
+    json_response = app_client.get("/api/downloads/changes", params={"since": seq, "epoch": epoch}).json()
+    assert json_response["resync"] is True
+    assert [d["mediaId"] for d in json_response["downloads"]] == [d.media_id for d in downloads]
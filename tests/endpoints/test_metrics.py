@@ -0,0 +1,10 @@
+from fastapi.testclient import TestClient
+
+
+def test_metrics(app_client: TestClient):
+    response = app_client.get("/api/metrics")
+    assert response.status_code == 200
+    json_response = response.json()
+    assert json_response["downloadQueue"]["pending"] == 0
+    assert json_response["extractor"]["saturation"] == 0
+    assert json_response["notifications"]["connections"] == 0
@@ -11,13 +11,14 @@ def test_retry_failed_download(
     Test if failed download can be retried.
     """
     app_client.cookies = {"uid": uid}
-    # Mocking BackgroundTasks because we don't actually want to start process of downloading video
-    mocker.patch("ytdl_api.endpoints.BackgroundTasks.add_task")
+    # Mocking worker pool because we don't actually want to start process of downloading video
+    submit = mocker.patch("ytdl_api.workers.DownloadWorkerPool.submit")
     response = app_client.put(
         "/api/retry",
         params={"mediaId": mocked_failed_media_file.media_id},
     )
     assert response.status_code == 200
+    submit.assert_called_once()
 
 
 def test_retry_downloading_download(uid: str, app_client: TestClient, mocked_downloading_media_file: Download):
@@ -53,10 +54,11 @@ def test_retry_started_download(
     Test if started media can be retried.
     """
     app_client.cookies = {"uid": uid}
-    # Mocking BackgroundTasks because we don't actually want to start process of downloading video
-    mocker.patch("ytdl_api.endpoints.BackgroundTasks.add_task")
+    # Mocking worker pool because we don't actually want to start process of downloading video
+    submit = mocker.patch("ytdl_api.workers.DownloadWorkerPool.submit")
     response = app_client.put(
         "/api/retry",
         params={"mediaId": mock_persisted_download.media_id},
     )
     assert response.status_code == 200
+    submit.assert_called_once()
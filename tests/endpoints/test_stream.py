@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ytdl_api.config import Settings
+from ytdl_api.constants import DownloadStatus
+from ytdl_api.dependencies import get_notification_queue, get_settings
+from ytdl_api.queue import NotificationQueue
+from ytdl_api.schemas.models import DownloadStatusInfo
+from ytdl_api.sse import HEARTBEAT
+
+
+class Stream:
+    """
+    SSE connection to ASGI app that can be closed by client while app waits for next notification.
+    """
+
+    def __init__(self, app: FastAPI, uid: str, query_string: bytes = b""):
+        self.messages: list[dict] = []
+        self.disconnected = asyncio.Event()
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/api/download/stream",
+            "raw_path": b"/api/download/stream",
+            "root_path": "",
+            "query_string": query_string,
+            "headers": [(b"host", b"testserver"), (b"cookie", f"uid={uid}".encode())],
+            "client": ("testclient", 50000),
+            "server": ("testserver", 80),
+        }
+        self.response = asyncio.create_task(app(scope, self.receive, self.send))
+
+    async def receive(self) -> dict:
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message: dict):
+        self.messages.append(message)
+
+    @property
+    def chunks(self) -> list[bytes]:
+        return [message["body"] for message in self.messages if message.get("body")]
+
+    async def wait_for_chunk(self, content: bytes) -> bytes:
+        async def _wait():
+            while True:
+                for chunk in self.chunks:
+                    if content in chunk:
+                        return chunk
+                await asyncio.sleep(0.01)
+
+        return await asyncio.wait_for(_wait(), timeout=1)
+
+    async def close(self):
+        self.disconnected.set()
+        await asyncio.wait_for(self.response, timeout=1)
+
+
+def get_status_info(uid: str, media_id: str, progress: int) -> DownloadStatusInfo:
+    return DownloadStatusInfo(
+        key="key", title="title", client_id=uid, media_id=media_id, status=DownloadStatus.DOWNLOADING, progress=progress
+    )
+
+
+@pytest.fixture
+def app(app_client: TestClient, settings: Settings, notification_queue: NotificationQueue) -> FastAPI:
+    app = app_client.app
+    app.dependency_overrides[get_settings] = lambda: settings.model_copy(
+        update={"sse_heartbeat_interval_seconds": 0.05, "sse_batch_window_seconds": 0.05}
+    )
+    app.dependency_overrides[get_notification_queue] = lambda: notification_queue
+    return app
+
+
+@pytest.mark.asyncio
+async def test_stream_sends_heartbeats_and_closes_subscription_on_disconnect(
+    uid: str, app: FastAPI, notification_queue: NotificationQueue
+):
+    stream = Stream(app, uid)
+    await stream.wait_for_chunk(HEARTBEAT)
+    assert stream.messages[0]["status"] == 200
+    assert notification_queue.metrics().connections == 1
+
+    await notification_queue.put(uid, get_status_info(uid, "media", 10))
+    await stream.wait_for_chunk(b'"mediaId":"media"')
+
+    # Client leaves while stream waits for next notification.
+    await stream.close()
+    assert notification_queue.metrics().connections == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_batches_notifications(uid: str, app: FastAPI, notification_queue: NotificationQueue):
+    stream = Stream(app, uid, b"batch=true")
+    await stream.wait_for_chunk(HEARTBEAT)
+    for media_id, progress in (("first", 10), ("second", 10), ("first", 20)):
+        await notification_queue.put(uid, get_status_info(uid, media_id, progress))
+    chunk = await stream.wait_for_chunk(b"data: [")
+    await stream.close()
+    lines = chunk.decode().splitlines()
+    assert lines[0] == f"id: {notification_queue.buffers[uid].get_event_id(3)}"
+    statuses = json.loads(lines[1].removeprefix("data: "))
+    assert [(status["mediaId"], status["progress"]) for status in statuses] == [("second", 10), ("first", 20)]
+    assert len([chunk for chunk in stream.chunks if b'"mediaId"' in chunk]) == 1
@@ -0,0 +1,50 @@
+import asyncio
+import threading
+
+import pytest
+
+from ytdl_api.bridge import EventLoopBridge
+
+
+async def get_thread_id() -> int:
+    return threading.get_ident()
+
+
+@pytest.mark.asyncio
+async def test_bridge_runs_coroutines_on_bound_loop():
+    """
+    Test that coroutines created in worker thread are executed on bound event loop.
+    """
+    bridge = EventLoopBridge()
+    bridge.bind(asyncio.get_running_loop())
+    loop_thread_id = threading.get_ident()
+    executed_in = await asyncio.to_thread(bridge.run, get_thread_id())
+    assert executed_in == loop_thread_id
+
+
+@pytest.mark.asyncio
+async def test_bridge_submit_does_not_wait_for_result():
+    bridge = EventLoopBridge()
+    bridge.bind(asyncio.get_running_loop())
+    event = asyncio.Event()
+
+    async def set_event():
+        event.set()
+
+    await asyncio.to_thread(bridge.submit, set_event())
+    await asyncio.wait_for(event.wait(), timeout=1)
+
+
+def test_bridge_without_bound_loop_uses_asyncio_run():
+    bridge = EventLoopBridge()
+    assert bridge.run(get_thread_id()) == threading.get_ident()
+
+
+@pytest.mark.asyncio
+async def test_bridge_cannot_block_own_loop():
+    bridge = EventLoopBridge()
+    bridge.bind(asyncio.get_running_loop())
+    coro = get_thread_id()
+    with pytest.raises(RuntimeError):
+        bridge.run(coro)
+    coro.close()
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from ytdl_api.cache import SingleFlight, VideoInfoCache
+from ytdl_api.schemas.responses import VideoInfoResponse
+
+from .utils import FakerForDownloads
+
+URL = "https://www.youtube.com/watch?v=NcBjx_eyvxc"
+
+
+@pytest.fixture
+def video_info(faker_for_downloads: FakerForDownloads) -> VideoInfoResponse:
+    return faker_for_downloads.get_video_info_by_url(URL)
+
+
+def test_cache_is_keyed_by_video_id(video_info: VideoInfoResponse):
+    cache = VideoInfoCache(ttl=60, max_size=10)
+    cache.put(URL, video_info, manifest="manifest")
+    cached = cache.get("https://youtu.be/NcBjx_eyvxc")
+    assert cached is not None
+    assert cached.video_info == video_info
+    assert cached.manifest == "manifest"
+    assert cache.get(f"{URL}&list=PLsyeobzWxl7poL9JTVyndKe62ieoN-MZ3&index=1") is cached
+
+
+def test_cache_entry_expires(video_info: VideoInfoResponse, mocker):
+    monotonic = mocker.patch("ytdl_api.cache.time.monotonic", return_value=100.0)
+    cache = VideoInfoCache(ttl=60, max_size=10)
+    cache.put(URL, video_info)
+    monotonic.return_value = 159.0
+    assert cache.get(URL) is not None
+    monotonic.return_value = 160.0
+    assert cache.get(URL) is None
+
+
+def test_cache_evicts_least_recently_used(video_info: VideoInfoResponse):
+    cache = VideoInfoCache(ttl=60, max_size=2)
+    cache.put("https://www.youtube.com/watch?v=first", video_info)
+    cache.put("https://www.youtube.com/watch?v=second", video_info)
+    # "first" becomes most recently used so "second" should be evicted
+    assert cache.get("https://www.youtube.com/watch?v=first") is not None
+    cache.put("https://www.youtube.com/watch?v=third", video_info)
+    assert cache.get("https://www.youtube.com/watch?v=second") is None
+    assert cache.get("https://www.youtube.com/watch?v=first") is not None
+    assert cache.get("https://www.youtube.com/watch?v=third") is not None
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_in_flight_call():
+    """
+    Test that concurrent calls with the same key are executed only once.
+    """
+    single_flight = SingleFlight()
+    calls = 0
+    release = asyncio.Event()
+
+    async def extract():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return calls
+
+    callers = [asyncio.create_task(single_flight.do("video", extract)) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert single_flight.in_flight == 1
+    release.set()
+    assert await asyncio.gather(*callers) == [1] * 5
+    assert calls == 1
+    assert single_flight.in_flight == 0
+    # once call finished next one for the same key is executed again
+    assert await single_flight.do("video", extract) == 2
+
+
+@pytest.mark.asyncio
+async def test_single_flight_propagates_error_to_every_caller():
+    single_flight = SingleFlight()
+
+    async def extract():
+        await asyncio.sleep(0.01)
+        raise ValueError("Private video")
+
+    results = await asyncio.gather(*(single_flight.do("video", extract) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_single_flight_survives_cancelled_caller():
+    single_flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def extract():
+        await release.wait()
+        return "info"
+
+    first = asyncio.create_task(single_flight.do("video", extract))
+    second = asyncio.create_task(single_flight.do("video", extract))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+    assert await second == "info"
@@ -0,0 +1,44 @@
+import pytest
+
+from ytdl_api.callbacks import ProgressCoalescer, on_start_converting
+from ytdl_api.constants import DownloadStatus
+from ytdl_api.datasource import AsyncIDataSource
+from ytdl_api.queue import NotificationQueue
+from ytdl_api.schemas.models import Download
+
+
+def test_coalescer_skips_unchanged_and_too_frequent_progress(mocker):
+    monotonic = mocker.patch("ytdl_api.callbacks.time.monotonic", return_value=100.0)
+    coalescer = ProgressCoalescer(max_updates_per_second=2)
+    assert coalescer.should_emit("media", 1) is True
+    # same percentage is never emitted twice
+    monotonic.return_value = 110.0
+    assert coalescer.should_emit("media", 1) is False
+    # changed percentage is emitted only after minimal interval passed
+    monotonic.return_value = 110.1
+    assert coalescer.should_emit("media", 2) is True
+    monotonic.return_value = 110.2
+    assert coalescer.should_emit("media", 3) is False
+    monotonic.return_value = 110.7
+    assert coalescer.should_emit("media", 4) is True
+    # other media items are rate limited separately
+    assert coalescer.should_emit("other-media", 4) is True
+
+
+def test_coalescer_reset(mocker):
+    mocker.patch("ytdl_api.callbacks.time.monotonic", return_value=100.0)
+    coalescer = ProgressCoalescer(max_updates_per_second=1)
+    assert coalescer.should_emit("media", 100) is True
+    coalescer.reset("media")
+    assert coalescer.should_emit("media", 100) is True
+
+
+@pytest.mark.asyncio
+async def test_on_start_converting_updates_existing_download(
+    mock_persisted_download: Download, async_datasource: AsyncIDataSource, notification_queue: NotificationQueue
+):
+    await on_start_converting(mock_persisted_download, datasource=async_datasource, queue=notification_queue)
+    downloads = await async_datasource.fetch_available_downloads(mock_persisted_download.client_id)
+    assert len(downloads) == 1
+    assert downloads[0].status == DownloadStatus.CONVERTING
+    assert downloads[0].progress == -1
@@ -5,12 +5,21 @@ from unittest.mock import Mock
 
 import pytest
 
-from ytdl_api.commands import remove_expired_downloads
-from ytdl_api.datasource import IDataSource
+from ytdl_api.commands import (
+    recover_unfinished_downloads,
+    remove_expired_downloads,
+    remove_expired_downloads_task,
+    requeue_unfinished_downloads,
+)
+from ytdl_api.config import Settings
+from ytdl_api.constants import DownloadStatus
+from ytdl_api.datasource import AsyncIDataSource, IDataSource
+from ytdl_api.dependencies import get_database, get_download_worker_pool, get_storage
 from ytdl_api.schemas.models import Download
 from ytdl_api.utils import get_datetime_now
+from ytdl_api.workers import DOWNLOAD_JOURNAL_FILENAME, DownloadJournal, DownloadWorkerPool
 
-from .utils import FakerForDownloads
+from .utils import FakeDownloader, FakerForDownloads
 
 
 @pytest.fixture
@@ -49,8 +58,13 @@ def example_expired_downloads(fake_media_path: Path, faker_for_downloads: FakerF
     datasource.clear_downloads()
 
 
-def test_hard_remove_downloads(
-    fake_local_storage, datasource, mocked_logger, example_expired_downloads: tuple[timedelta, list[Download]]
+@pytest.mark.asyncio
+async def test_hard_remove_downloads(
+    fake_local_storage,
+    datasource,
+    async_datasource,
+    mocked_logger,
+    example_expired_downloads: tuple[timedelta, list[Download]],
 ):
     expiration_delta, downloads = example_expired_downloads
     client_id = downloads[0].client_id
@@ -58,7 +72,7 @@ def test_hard_remove_downloads(
     assert len(datasource.fetch_available_downloads(client_id)) == len(downloads)
 
     # Call the function
-    remove_expired_downloads(fake_local_storage, datasource, expiration_delta, mocked_logger)
+    await remove_expired_downloads(fake_local_storage, async_datasource, expiration_delta, mocked_logger)
 
     mocked_logger.info.assert_called_with("Soft deleted expired downloads from database.")
 
@@ -67,3 +81,103 @@ def test_hard_remove_downloads(
     assert datasource.get_download(expired_download1.client_id, expired_download1.key) is None
     expired_download2 = downloads[1]
     assert datasource.get_download(expired_download1.client_id, expired_download2.key) is None
+
+
+@pytest.mark.asyncio
+async def test_requeue_unfinished_downloads(
+    uid: str,
+    fake_media_path: Path,
+    faker_for_downloads: FakerForDownloads,
+    datasource: IDataSource,
+    async_datasource: AsyncIDataSource,
+    mocked_logger,
+):
+    """
+    Test that downloads left in journal after restart are restored in database and queued again.
+    """
+    journal = DownloadJournal(fake_media_path / "journal.jsonl")
+    download = faker_for_downloads.random_downloading_download(client_id=uid)
+    journal.record_enqueued(download)
+
+    worker_pool = Mock(spec=DownloadWorkerPool)
+    worker_pool.journal = DownloadJournal(journal.path)
+    downloader = FakeDownloader(faker_for_downloads)
+    await requeue_unfinished_downloads(worker_pool, async_datasource, downloader, mocked_logger)
+
+    worker_pool.submit.assert_called_once()
+    restored = datasource.get_download(uid, download.media_id)
+    assert restored is not None
+    assert restored.status == DownloadStatus.STARTED
+
+
+@pytest.mark.asyncio
+async def test_requeue_unfinished_downloads_skips_ended_downloads(
+    uid: str,
+    fake_media_path: Path,
+    faker_for_downloads: FakerForDownloads,
+    datasource: IDataSource,
+    async_datasource: AsyncIDataSource,
+    mocked_logger,
+):
+    """
+    Test that downloads which ended before they were marked as done in journal are not downloaded again.
+    """
+    journal = DownloadJournal(fake_media_path / "journal.jsonl")
+    finished = faker_for_downloads.random_finished_download(client_id=uid)
+    failed = faker_for_downloads.random_failed_download(client_id=uid)
+    for download in (finished, failed):
+        datasource.put_download(download)
+        journal.record_enqueued(download.model_copy(update={"status": DownloadStatus.STARTED}))
+
+    worker_pool = Mock(spec=DownloadWorkerPool)
+    worker_pool.journal = DownloadJournal(journal.path)
+    await requeue_unfinished_downloads(
+        worker_pool, async_datasource, FakeDownloader(faker_for_downloads), mocked_logger
+    )
+
+    worker_pool.submit.assert_not_called()
+    assert datasource.get_download(uid, finished.media_id).status == DownloadStatus.FINISHED
+    assert datasource.get_download(uid, failed.media_id).status == DownloadStatus.FAILED
+    assert worker_pool.journal.replay() == []
+
+
+@pytest.mark.asyncio
+async def test_recover_unfinished_downloads_uses_app_dependencies(
+    uid: str, settings: Settings, faker_for_downloads: FakerForDownloads, mocked_logger, mocker
+):
+    """
+    Test that recovered downloads are put to the same datasource and worker pool that endpoints use.
+    """
+    download = faker_for_downloads.random_downloading_download(client_id=uid)
+    DownloadJournal(Path(settings.storage.path) / DOWNLOAD_JOURNAL_FILENAME).record_enqueued(download)
+    submit = mocker.patch.object(DownloadWorkerPool, "submit", autospec=True)
+    await recover_unfinished_downloads(settings, mocked_logger)
+
+    # FastAPI resolves dependencies with keyword arguments.
+    assert submit.call_args.args[0] is get_download_worker_pool(settings=settings)
+    assert get_database(settings=settings).get_download(uid, download.media_id) is not None
+
+
+@pytest.mark.asyncio
+async def test_recover_unfinished_downloads_clears_staging_dir(settings: Settings, mocked_logger):
+    """
+    Test that partially written files of interrupted downloads are removed on startup.
+    """
+    staging_dir = get_storage(settings=settings).staging_dir
+    (staging_dir / "tmp-interrupted").mkdir()
+    await recover_unfinished_downloads(settings, mocked_logger)
+    assert list(staging_dir.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_remove_expired_downloads_task_uses_app_datasource(
+    uid: str, settings: Settings, faker_for_downloads: FakerForDownloads, mocked_logger
+):
+    """
+    Test that periodic task removes expired downloads from datasource that endpoints use.
+    """
+    expired = timedelta(seconds=settings.expiration_period_in_seconds + 60)
+    download = faker_for_downloads.random_download(uid, when_submitted=get_datetime_now() - expired)
+    get_database(settings=settings).put_download(download)
+    await remove_expired_downloads_task(settings, mocked_logger)
+    assert get_database(settings=settings).get_download(uid, download.media_id) is None
@@ -6,7 +6,12 @@ from confz import DataSource
 from fastapi.testclient import TestClient
 
 from ytdl_api.config import Settings
-from ytdl_api.dependencies import get_settings
+from ytdl_api.constants import DownloadStatus
+from ytdl_api.datasource import IndexedInMemoryDB, InMemoryDB, SQLiteDB
+from ytdl_api.dependencies import get_async_database, get_database, get_settings
+from ytdl_api.schemas.models import DownloadStatusInfo
+
+from .utils import FakerForDownloads
 
 
 @pytest.fixture()
@@ -37,3 +42,67 @@ def test_no_docs_if_disabled(app: TestClient):
     """
     response = app.get("/docs")
     assert response.status_code == 404
+
+
+@pytest.mark.parametrize(
+    "datasource_config, datasource_class",
+    [
+        ({"use_in_memory_db": True}, IndexedInMemoryDB),
+        ({"use_in_memory_db": True, "indexed": False}, InMemoryDB),
+        ({"sqlite_path": "db/ytdl.sqlite3"}, SQLiteDB),
+        ({"use_in_memory_db": "False", "sqlite_path": "db/ytdl.sqlite3"}, SQLiteDB),
+    ],
+)
+def test_datasource_selection(fake_media_path: Path, datasource_config: dict, datasource_class: type):
+    """
+    Test if datasource implementation is selected by datasource config.
+    """
+    if "sqlite_path" in datasource_config:
+        datasource_config = {**datasource_config, "sqlite_path": fake_media_path / datasource_config["sqlite_path"]}
+    data_source = DataSource(data={"datasource": datasource_config, "storage": {"path": fake_media_path}})
+    with Settings.change_config_sources(data_source):
+        settings = Settings()  # type: ignore
+    assert isinstance(settings.datasource.get_datasource(), datasource_class)
+
+
+@pytest.mark.parametrize(
+    "datasource_config",
+    [
+        {"use_in_memory_db": True, "sqlite_path": "db/ytdl.sqlite3"},
+        {"use_in_memory_db": "True", "sqlite_path": "db/ytdl.sqlite3"},
+        {"use_in_memory_db": False},
+        {"use_in_memory_db": "False"},
+    ],
+)
+def test_ambiguous_datasource_config(fake_media_path: Path, datasource_config: dict):
+    """
+    Test if config that doesn't select exactly one datasource is rejected.
+    """
+    if "sqlite_path" in datasource_config:
+        datasource_config = {**datasource_config, "sqlite_path": fake_media_path / datasource_config["sqlite_path"]}
+    data_source = DataSource(data={"datasource": datasource_config, "storage": {"path": fake_media_path}})
+    with Settings.change_config_sources(data_source), pytest.raises(ValueError):
+        Settings()  # type: ignore
+
+
+def test_shutdown_flushes_buffered_progress(settings: Settings, faker_for_downloads: FakerForDownloads, uid: str):
+    """
+    Test if progress buffered by datasource used by endpoints is written on application shutdown.
+    """
+    settings = settings.model_copy(update={"progress_flush_interval_seconds": 3600})
+    download = faker_for_downloads.random_download(uid, status=DownloadStatus.DOWNLOADING, progress=0)
+    sync_datasource = get_database(settings=settings)
+    sync_datasource.put_download(download)
+    progress = DownloadStatusInfo(
+        key=download.key,
+        title=download.title,
+        client_id=uid,
+        media_id=download.media_id,
+        status=DownloadStatus.DOWNLOADING,
+        progress=50,
+    )
+    with TestClient(settings.init_app()) as client:
+        async_datasource = get_async_database(settings=settings, sync_datasource=sync_datasource)
+        client.portal.call(async_datasource.update_download_progress, progress)
+        assert sync_datasource.get_download(uid, download.media_id).progress == 0
+    assert sync_datasource.get_download(uid, download.media_id).progress == 50
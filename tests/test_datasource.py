@@ -0,0 +1,298 @@
+import asyncio
+import sqlite3
+from datetime import timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+
+from ytdl_api.constants import DownloadStatus
+from ytdl_api.datasource import (
+    AsyncIDataSource,
+    IDataSource,
+    SQLiteDB,
+    StreamManifestRegistry,
+    WriteBehindDataSource,
+)
+from ytdl_api.schemas.models import Download, DownloadStatusInfo, StreamManifest, VideoStream
+from ytdl_api.utils import get_datetime_now, get_unique_id
+
+from .utils import FakerForDownloads
+
+
+def get_progress(download: Download, progress: int) -> DownloadStatusInfo:
+    return DownloadStatusInfo(
+        key=download.media_id,
+        title=download.title,
+        client_id=download.client_id,
+        media_id=download.media_id,
+        status=DownloadStatus.DOWNLOADING,
+        progress=progress,
+    )
+
+
+def test_fetch_downloads_till_datetime(datasource: IDataSource, faker_for_downloads: FakerForDownloads):
+    dt_now = get_datetime_now()
+    downloads = [
+        faker_for_downloads.random_download("test", when_submitted=dt_now - timedelta(days=days)) for days in (1, 3, 2)
+    ]
+    for download in downloads:
+        datasource.put_download(download)
+    expired = datasource.fetch_downloads_till_datetime(dt_now - timedelta(days=2))
+    assert sorted(download.media_id for download in expired) == sorted([downloads[1].media_id, downloads[2].media_id])
+
+
+def test_update_download_progress(datasource: IDataSource, faker_for_downloads: FakerForDownloads):
+    download = faker_for_downloads.random_download("test")
+    datasource.put_download(download)
+    datasource.update_download_progress(get_progress(download, 42))
+    updated = datasource.get_download(download.client_id, download.media_id)
+    assert updated is not None
+    assert updated.status == DownloadStatus.DOWNLOADING
+    assert updated.progress == 42
+    assert datasource.get_download("another-client", download.media_id) is None
+
+
+def test_deleted_downloads_are_not_available(datasource: IDataSource, faker_for_downloads: FakerForDownloads):
+    downloads = [faker_for_downloads.random_download("test") for _ in range(3)]
+    for download in downloads:
+        datasource.put_download(download)
+    datasource.delete_download_batch(downloads[:2])
+    available = datasource.fetch_available_downloads("test")
+    assert [download.media_id for download in available] == [downloads[2].media_id]
+    assert datasource.get_download("test", downloads[0].media_id) is None
+
+
+@pytest.mark.asyncio
+async def test_async_datasource_adapter(async_datasource: AsyncIDataSource, faker_for_downloads: FakerForDownloads):
+    download = faker_for_downloads.random_download("test")
+    await async_datasource.put_download(download)
+    await asyncio.gather(
+        *(async_datasource.update_download_progress(get_progress(download, progress)) for progress in range(1, 11))
+    )
+    updated = await async_datasource.get_download(download.client_id, download.media_id)
+    assert updated is not None
+    # Calls are executed in the order they were made.
+    assert updated.progress == 10
+
+
+@pytest.mark.asyncio
+async def test_write_behind_datasource_flushes_progress_in_batches(
+    async_datasource: AsyncIDataSource, faker_for_downloads: FakerForDownloads
+):
+    write_behind = WriteBehindDataSource(async_datasource, flush_interval=0.05)
+    downloads = [faker_for_downloads.random_download("test") for _ in range(2)]
+    for download in downloads:
+        await write_behind.put_download(download)
+    batch = AsyncMock(wraps=async_datasource.update_download_progress_batch)
+    async_datasource.update_download_progress_batch = batch  # type: ignore
+    for progress in range(1, 6):
+        for download in downloads:
+            await write_behind.update_download_progress(get_progress(download, progress))
+    stored = await write_behind.get_download(downloads[0].client_id, downloads[0].media_id)
+    assert stored is not None
+    assert stored.progress == 0
+    await asyncio.sleep(0.1)
+    batch.assert_awaited_once()
+    for download in downloads:
+        stored = await write_behind.get_download(download.client_id, download.media_id)
+        assert stored is not None
+        assert stored.progress == 5
+
+
+@pytest.mark.asyncio
+async def test_write_behind_datasource_state_transition_discards_buffered_progress(
+    async_datasource: AsyncIDataSource, faker_for_downloads: FakerForDownloads
+):
+    write_behind = WriteBehindDataSource(async_datasource, flush_interval=0.05)
+    download = faker_for_downloads.random_download("test")
+    await write_behind.put_download(download)
+    await write_behind.update_download_progress(get_progress(download, 50))
+    await write_behind.mark_as_failed(download)
+    stored = await async_datasource.get_download(download.client_id, download.media_id)
+    assert stored is not None
+    assert stored.status == DownloadStatus.FAILED
+    await asyncio.sleep(0.1)
+    stored = await async_datasource.get_download(download.client_id, download.media_id)
+    assert stored is not None
+    assert stored.status == DownloadStatus.FAILED
+    assert stored.progress == 0
+
+
+def test_patch_download(datasource: IDataSource, faker_for_downloads: FakerForDownloads):
+    download = faker_for_downloads.random_download("test", select_streams=True)
+    datasource.put_download(download)
+    when_finished = get_datetime_now()
+    datasource.patch_download(
+        download.media_id,
+        status=DownloadStatus.FINISHED,
+        progress=100,
+        file_path="/media/file.mp4",
+        when_download_finished=when_finished,
+    )
+    patched = datasource.get_download(download.client_id, download.media_id)
+    assert patched is not None
+    assert patched.status == DownloadStatus.FINISHED
+    assert patched.progress == 100
+    assert patched.file_path == "/media/file.mp4"
+    assert patched.when_download_finished == when_finished
+    # Fields that weren't patched are left untouched.
+    assert patched.video_streams == download.video_streams
+    assert patched.audio_streams == download.audio_streams
+    assert patched.title == download.title
+    assert len(datasource.fetch_available_downloads("test")) == 1
+
+
+@pytest.mark.parametrize("fields", [{"unknown": 1}, {"key": "other"}])
+def test_patch_download_invalid_fields(datasource: IDataSource, faker_for_downloads: FakerForDownloads, fields: dict):
+    download = faker_for_downloads.random_download("test")
+    datasource.put_download(download)
+    with pytest.raises(ValueError):
+        datasource.patch_download(download.media_id, **fields)
+
+
+def test_fetch_available_downloads_page(datasource: IDataSource, faker_for_downloads: FakerForDownloads):
+    dt_now = get_datetime_now()
+    downloads = [
+        faker_for_downloads.random_download("test", when_submitted=dt_now - timedelta(minutes=minutes))
+        for minutes in (2, 4, 1, 3)
+    ]
+    for download in downloads:
+        datasource.put_download(download)
+    first_page = datasource.fetch_available_downloads("test", limit=2, include_streams=False)
+    assert [download.media_id for download in first_page] == [downloads[1].media_id, downloads[3].media_id]
+    assert all(not download.video_streams and not download.audio_streams for download in first_page)
+    after = (first_page[-1].when_submitted, first_page[-1].media_id)
+    second_page = datasource.fetch_available_downloads("test", after=after, limit=2)
+    assert [download.media_id for download in second_page] == [downloads[0].media_id, downloads[2].media_id]
+    assert second_page[0].video_streams == downloads[0].video_streams
+
+
+def test_fetch_changed_downloads(datasource: IDataSource, faker_for_downloads: FakerForDownloads):
+    downloads = [faker_for_downloads.random_download("test") for _ in range(3)]
+    for download in downloads:
+        datasource.put_download(download)
+    datasource.put_download(faker_for_downloads.random_download("another-client"))
+    seq = max(download.seq for download in datasource.fetch_available_downloads("test"))
+    assert datasource.fetch_changed_downloads("test", seq) == []
+    datasource.update_download_progress(get_progress(downloads[1], 10))
+    datasource.delete_download(downloads[0])
+    datasource.patch_download(downloads[2].media_id, progress=20)
+    datasource.update_download_progress_batch([get_progress(downloads[1], 30)])
+    changed = datasource.fetch_changed_downloads("test", seq, include_streams=False)
+    assert [download.media_id for download in changed] == [
+        downloads[0].media_id,
+        downloads[2].media_id,
+        downloads[1].media_id,
+    ]
+    assert [download.seq for download in changed] == sorted(download.seq for download in changed)
+    assert changed[0].status == DownloadStatus.DELETED
+    assert changed[2].progress == 30
+    assert all(not download.video_streams for download in changed)
+    assert datasource.fetch_changed_downloads("test", changed[-1].seq) == []
+    assert datasource.get_change_sequence()[1] == changed[-1].seq
+
+
+def test_sqlite_datasource_adds_seq_column(tmp_path, faker_for_downloads: FakerForDownloads):
+    path = tmp_path / "ytdl.sqlite3"
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE downloads (media_id TEXT PRIMARY KEY, client_id TEXT NOT NULL, status TEXT NOT NULL, "
+            "when_submitted REAL NOT NULL, data TEXT NOT NULL)"
+        )
+    connection.close()
+    datasource = SQLiteDB(path)
+    download = faker_for_downloads.random_download("test")
+    datasource.put_download(download)
+    changed = datasource.fetch_changed_downloads("test", 0)
+    assert [download.seq for download in changed] == [1]
+    epoch, _ = datasource.get_change_sequence()
+    datasource.close()
+    # Sequence and its epoch continue from the stored ones after reopening database.
+    datasource = SQLiteDB(path)
+    datasource.mark_as_failed(download)
+    assert [download.seq for download in datasource.fetch_changed_downloads("test", 1)] == [2]
+    assert datasource.get_change_sequence() == (epoch, 2)
+    datasource.close()
+
+
+def test_sqlite_datasource_seq_is_shared_by_connections(tmp_path, faker_for_downloads: FakerForDownloads):
+    path = tmp_path / "ytdl.sqlite3"
+    first, second = SQLiteDB(path), SQLiteDB(path)
+    downloads = [faker_for_downloads.random_download("test") for _ in range(3)]
+    first.put_download(downloads[0])
+    second.put_download(downloads[1])
+    first.update_download_progress_batch(
+        [
+            DownloadStatusInfo(
+                key=download.media_id,
+                title=download.title,
+                client_id="test",
+                media_id=download.media_id,
+                status=DownloadStatus.DOWNLOADING,
+                progress=10,
+            )
+            for download in downloads[:2]
+        ]
+    )
+    second.put_download(downloads[2])
+    first.delete_download_batch(downloads[:1])
+    changed = second.fetch_changed_downloads("test", 0)
+    assert [(download.media_id, download.seq) for download in changed] == [
+        (downloads[1].media_id, 4),
+        (downloads[2].media_id, 5),
+        (downloads[0].media_id, 6),
+    ]
+    # Change made through other connection is returned after the highest sequence number client knows.
+    assert [download.media_id for download in first.fetch_changed_downloads("test", 5)] == [downloads[0].media_id]
+    first.close()
+    second.close()
+
+
+def test_stream_manifest_registry():
+    registry = StreamManifestRegistry()
+    registry.put("video", StreamManifest(video_streams=[VideoStream(id="1", mimetype="video/mp4", resolution="720p")]))
+    registry.move_reference(None, "video")
+    registry.move_reference(None, "video")
+    registry.move_reference("video", None)
+    assert registry.get("video") is not None
+    # Moving reference to the same manifest doesn't change reference count.
+    registry.move_reference("video", "video")
+    registry.move_reference("video", None)
+    assert registry.get("video") is None
+    assert len(registry) == 0
+
+
+def test_downloads_share_streams_manifest(datasource: IDataSource, faker_for_downloads: FakerForDownloads):
+    download = faker_for_downloads.random_download("test")
+    same_video_download = download.model_copy(update={"media_id": get_unique_id(), "client_id": "another-client"})
+    datasource.put_download(download)
+    datasource.put_download(same_video_download)
+    stored = datasource.get_download(same_video_download.client_id, same_video_download.media_id)
+    assert stored is not None
+    assert stored.manifest_id == download.manifest_id
+    assert stored.video_streams == download.video_streams
+    assert stored.audio_streams == download.audio_streams
+    # Manifest is kept while some download references it.
+    datasource.delete_download(download)
+    datasource.update_download_progress(get_progress(same_video_download, 50))
+    (stored,) = datasource.fetch_available_downloads(same_video_download.client_id)
+    assert stored.progress == 50
+    assert stored.video_streams == download.video_streams
+    (stored,) = datasource.fetch_available_downloads(same_video_download.client_id, include_streams=False)
+    assert stored.video_streams == [] and stored.audio_streams == []
+
+
+def test_sqlite_datasource_counts_manifest_references(tmp_path, faker_for_downloads: FakerForDownloads):
+    datasource = SQLiteDB(tmp_path / "ytdl.sqlite3")
+    downloads = [faker_for_downloads.random_download("test") for _ in range(3)]
+    downloads = [download.model_copy(update={"manifest_id": "video"}) for download in downloads]
+    for download in downloads:
+        datasource.put_download(download)
+    datasource.put_download(downloads[0])
+    datasource.delete_download(downloads[0])
+    datasource.delete_download(downloads[0])
+    rows = datasource._connection.execute("SELECT manifest_id, refcount FROM manifests").fetchall()
+    assert rows == [("video", 2)]
+    datasource.delete_download_batch(downloads)
+    assert datasource._connection.execute("SELECT COUNT(*) FROM manifests").fetchone() == (0,)
+    datasource.close()
@@ -0,0 +1,166 @@
+import asyncio
+
+import pytest
+
+from ytdl_api.constants import DownloadStatus
+from ytdl_api.queue import NotificationQueue, Resync, Subscriber
+from ytdl_api.schemas.models import DownloadStatusInfo
+
+
+def get_event(media_id: str, status: DownloadStatus, progress: int | None = None) -> DownloadStatusInfo:
+    return DownloadStatusInfo(
+        key=media_id, title="title", client_id="client", media_id=media_id, status=status, progress=progress
+    )
+
+
+def drain(subscriber: Subscriber) -> list[tuple[str, DownloadStatus, int | None]]:
+    events = []
+    while True:
+        try:
+            notification = subscriber.get_nowait()
+        except asyncio.QueueEmpty:
+            return events
+        event = notification.status_info
+        events.append((event.media_id, event.status, event.progress))
+
+
+@pytest.mark.asyncio
+async def test_progress_is_superseded_and_transitions_are_kept():
+    queue = NotificationQueue()
+    await queue.put("client", get_event("a", DownloadStatus.DOWNLOADING, 0))
+    await queue.put("client", get_event("b", DownloadStatus.DOWNLOADING, 0))
+    for progress in (10, 20, 30):
+        await queue.put("client", get_event("a", DownloadStatus.DOWNLOADING, progress))
+    await queue.put("client", get_event("a", DownloadStatus.FAILED))
+    # Progress of retried download doesn't supersede progress published before failure.
+    await queue.put("client", get_event("a", DownloadStatus.DOWNLOADING, 5))
+    assert drain(queue.subscribe("client")) == [
+        ("b", DownloadStatus.DOWNLOADING, 0),
+        ("a", DownloadStatus.DOWNLOADING, 30),
+        ("a", DownloadStatus.FAILED, None),
+        ("a", DownloadStatus.DOWNLOADING, 5),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_buffer_is_bounded():
+    queue = NotificationQueue(max_size=3)
+    for media_id in "abcde":
+        await queue.put("client", get_event(media_id, DownloadStatus.FINISHED, 100))
+    assert [media_id for media_id, *_ in drain(queue.subscribe("client"))] == ["c", "d", "e"]
+    assert len(queue.buffers["client"]) == 3
+
+
+@pytest.mark.asyncio
+async def test_state_transition_survives_progress_burst():
+    queue = NotificationQueue(max_size=5)
+    subscriber = queue.subscribe("client")
+    await queue.put("client", get_event("a", DownloadStatus.FINISHED, 100))
+    for progress in range(1, 11):
+        await queue.put("client", get_event("b", DownloadStatus.DOWNLOADING, progress))
+    # Replaced progress doesn't take slot in buffer, so nothing is dropped.
+    assert len(queue.buffers["client"]) == 2
+    assert drain(subscriber) == [("a", DownloadStatus.FINISHED, 100), ("b", DownloadStatus.DOWNLOADING, 10)]
+
+
+@pytest.mark.asyncio
+async def test_every_subscriber_receives_every_notification():
+    queue = NotificationQueue()
+    first_tab, second_tab = queue.subscribe("client"), queue.subscribe("client")
+    getters = [asyncio.create_task(first_tab.get()), asyncio.create_task(second_tab.get())]
+    await asyncio.sleep(0)
+    assert not any(getter.done() for getter in getters)
+    await queue.put("client", get_event("a", DownloadStatus.CONVERTING, -1))
+    first, second = await asyncio.wait_for(asyncio.gather(*getters), timeout=1)
+    # Notification is shared by subscribers and serialized once.
+    assert first is second
+    assert first.data is second.data
+    await queue.put("client", get_event("a", DownloadStatus.DOWNLOADING, 10))
+    await queue.put("client", get_event("a", DownloadStatus.DOWNLOADING, 20))
+    assert drain(first_tab) == [("a", DownloadStatus.DOWNLOADING, 20)]
+    await queue.put("client", get_event("a", DownloadStatus.FINISHED, 100))
+    assert drain(second_tab) == [("a", DownloadStatus.DOWNLOADING, 20), ("a", DownloadStatus.FINISHED, 100)]
+    assert drain(first_tab) == [("a", DownloadStatus.FINISHED, 100)]
+    # Tab opened later doesn't receive notifications that were already delivered.
+    assert drain(queue.subscribe("client")) == []
+
+
+@pytest.mark.asyncio
+async def test_idle_buffers_are_evicted(mocker):
+    monotonic = mocker.patch("ytdl_api.queue.time.monotonic", return_value=100.0)
+    queue = NotificationQueue(ttl=60)
+    await queue.put("gone", get_event("a", DownloadStatus.DOWNLOADING, 10))
+    queue.subscribe("closed").close()
+    subscriber = queue.subscribe("listening")
+    monotonic.return_value = 130.0
+    queue.subscribe("recently-closed").close()
+    monotonic.return_value = 170.0
+    await queue.put("listening", get_event("b", DownloadStatus.DOWNLOADING, 20))
+    assert set(queue.buffers) == {"listening", "recently-closed"}
+    subscriber.close()
+
+
+@pytest.mark.asyncio
+async def test_reconnecting_subscriber_receives_missed_notifications():
+    queue = NotificationQueue(max_size=3)
+    subscriber = queue.subscribe("client")
+    await queue.put("client", get_event("a", DownloadStatus.CONVERTING, -1))
+    last_event_id = subscriber.get_nowait().id
+    subscriber.close()
+    await queue.put("client", get_event("b", DownloadStatus.FINISHED, 100))
+    await queue.put("client", get_event("c", DownloadStatus.FINISHED, 100))
+    # Another tab already received missed notifications, but reconnecting one still gets them.
+    assert [media_id for media_id, *_ in drain(queue.subscribe("client"))] == ["b", "c"]
+    assert [media_id for media_id, *_ in drain(queue.subscribe("client", last_event_id))] == ["b", "c"]
+
+    # Missed notifications were rolled out of buffer.
+    for media_id in "def":
+        await queue.put("client", get_event(media_id, DownloadStatus.FINISHED, 100))
+    subscriber = queue.subscribe("client", last_event_id)
+    resync = subscriber.get_nowait()
+    assert isinstance(resync, Resync)
+    assert resync.id == queue.buffers["client"].get_event_id(6)
+    assert drain(subscriber) == []
+    await queue.put("client", get_event("g", DownloadStatus.FINISHED, 100))
+    assert [media_id for media_id, *_ in drain(subscriber)] == ["g"]
+    # Subscriber resumed after resync event doesn't need another one.
+    assert [media_id for media_id, *_ in drain(queue.subscribe("client", resync.id))] == ["g"]
+
+
+@pytest.mark.parametrize("last_event_id", ["unknown-1", "invalid", "0-0"])
+@pytest.mark.asyncio
+async def test_subscriber_with_unknown_event_id_resyncs(last_event_id: str):
+    queue = NotificationQueue()
+    await queue.put("client", get_event("a", DownloadStatus.FINISHED, 100))
+    subscriber = queue.subscribe("client", last_event_id)
+    assert isinstance(subscriber.get_nowait(), Resync)
+    assert drain(subscriber) == []
+
+
+@pytest.mark.asyncio
+async def test_lagging_subscriber_resyncs():
+    queue = NotificationQueue(max_size=2)
+    subscriber = queue.subscribe("client")
+    for media_id in "abc":
+        await queue.put("client", get_event(media_id, DownloadStatus.FINISHED, 100))
+    assert isinstance(subscriber.get_nowait(), Resync)
+    assert drain(subscriber) == []
+
+
+@pytest.mark.asyncio
+async def test_batch_collects_notifications_published_within_window():
+    queue = NotificationQueue(max_size=4)
+    subscriber = queue.subscribe("client")
+    getter = asyncio.create_task(subscriber.get_batch(0.05))
+    await queue.put("client", get_event("a", DownloadStatus.DOWNLOADING, 10))
+    await asyncio.sleep(0)
+    for event in (get_event("b", DownloadStatus.FINISHED, 100), get_event("a", DownloadStatus.DOWNLOADING, 20)):
+        await queue.put("client", event)
+    batch = await asyncio.wait_for(getter, timeout=1)
+    assert [(n.status_info.media_id, n.status_info.progress) for n in batch] == [("b", 100), ("a", 20)]
+
+    # Notifications published after lost ones aren't returned together with resync marker.
+    for media_id in "cdefg":
+        await queue.put("client", get_event(media_id, DownloadStatus.FINISHED, 100))
+    batch = await asyncio.wait_for(subscriber.get_batch(0.05), timeout=1)
+    assert len(batch) == 1 and isinstance(batch[0], Resync)
@@ -0,0 +1,51 @@
+import errno
+import tempfile
+from pathlib import Path
+
+from ytdl_api.schemas.models import Download
+from ytdl_api.storage import LocalFileStorage
+
+from .utils import FakerForDownloads
+
+
+def test_save_download_from_staging_dir_renames_file(
+    uid: str, fake_local_storage: LocalFileStorage, faker_for_downloads: FakerForDownloads
+):
+    """
+    Test that file downloaded into staging directory is moved into storage without copying.
+    """
+    download: Download = faker_for_downloads.random_started_download(client_id=uid)
+    with tempfile.TemporaryDirectory(dir=fake_local_storage.staging_dir) as tmpdir:
+        downloaded_file = Path(tmpdir) / download.storage_filename
+        downloaded_file.write_bytes(b"media")
+        inode = downloaded_file.stat().st_ino
+        file_path = fake_local_storage.save_download_from_file(download, downloaded_file)
+        assert not downloaded_file.exists()
+    saved_file = Path(file_path)
+    assert saved_file.read_bytes() == b"media"
+    assert saved_file.stat().st_ino == inode
+
+
+def test_save_download_copies_file_across_devices(
+    uid: str, fake_local_storage: LocalFileStorage, faker_for_downloads: FakerForDownloads, mocker
+):
+    download: Download = faker_for_downloads.random_started_download(client_id=uid)
+    mocker.patch("ytdl_api.storage.os.replace", side_effect=OSError(errno.EXDEV, "Invalid cross-device link"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        downloaded_file = Path(tmpdir) / download.storage_filename
+        downloaded_file.write_bytes(b"media")
+        file_path = fake_local_storage.save_download_from_file(download, downloaded_file)
+    assert Path(file_path).read_bytes() == b"media"
+
+
+def test_clear_staging_dir_removes_interrupted_downloads(fake_local_storage: LocalFileStorage):
+    """
+    Test that files left in staging directory by interrupted downloads are removed.
+    """
+    assert fake_local_storage.staging_dir.is_dir()
+    interrupted_dir = Path(tempfile.mkdtemp(dir=fake_local_storage.staging_dir))
+    (interrupted_dir / "video.mp4.part").write_bytes(b"media")
+    (fake_local_storage.staging_dir / "audio.webm").write_bytes(b"media")
+    fake_local_storage.clear_staging_dir()
+    assert fake_local_storage.staging_dir.is_dir()
+    assert list(fake_local_storage.staging_dir.iterdir()) == []
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from ytdl_api.cache import VideoInfoCache
+from ytdl_api.exceptions import VideoInfoExtractionTimeout
+from ytdl_api.schemas.models import Download
+from ytdl_api.schemas.responses import VideoInfoResponse
+from ytdl_api.types import YoutubeURL
+from ytdl_api.workers import DOWNLOAD_JOURNAL_FILENAME, DownloadJournal, DownloadWorkerPool, VideoInfoExtractorPool
+
+from .utils import FakeDownloader, FakerForDownloads
+
+
+class BlockingDownloader(FakeDownloader):
+    def __init__(self, faker_for_downloads: FakerForDownloads):
+        super().__init__(faker_for_downloads)
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+        self.finished = threading.Semaphore(0)
+
+    def download(self, download: Download) -> bool:
+        self.started.release()
+        self.release.wait(timeout=5)
+        self.finished.release()
+        return True
+
+
+@pytest.fixture
+def blocking_downloader(faker_for_downloads: FakerForDownloads) -> BlockingDownloader:
+    return BlockingDownloader(faker_for_downloads)
+
+
+def test_worker_pool_limits_concurrent_downloads(
+    uid: str, faker_for_downloads: FakerForDownloads, blocking_downloader: BlockingDownloader
+):
+    """
+    Test that worker pool runs at most `max_workers` downloads at once and queues the rest.
+    """
+    pool = DownloadWorkerPool(max_workers=2, logger=logging.getLogger("test"))
+    for _ in range(5):
+        pool.submit(blocking_downloader, faker_for_downloads.random_started_download(client_id=uid))
+    assert blocking_downloader.started.acquire(timeout=5)
+    assert blocking_downloader.started.acquire(timeout=5)
+    metrics = pool.metrics()
+    assert metrics.active == 2
+    assert metrics.pending == 3
+    assert metrics.submitted == 5
+    blocking_downloader.release.set()
+    for _ in range(5):
+        assert blocking_downloader.finished.acquire(timeout=5)
+    pool.shutdown()
+    assert pool.metrics().max_wait_time > 0
+
+
+def test_worker_pool_shutdown_drops_pending_jobs(
+    uid: str, fake_media_path: Path, faker_for_downloads: FakerForDownloads, blocking_downloader: BlockingDownloader
+):
+    """
+    Test that pending jobs are not started after shutdown and stay in journal for replay.
+    """
+    journal = DownloadJournal(fake_media_path / DOWNLOAD_JOURNAL_FILENAME)
+    pool = DownloadWorkerPool(max_workers=1, logger=logging.getLogger("test"), journal=journal)
+    downloads = [faker_for_downloads.random_started_download(client_id=uid) for _ in range(3)]
+    for download in downloads:
+        pool.submit(blocking_downloader, download)
+    assert blocking_downloader.started.acquire(timeout=5)
+    pool.shutdown()
+    assert pool.metrics().pending == 0
+    blocking_downloader.release.set()
+    assert blocking_downloader.finished.acquire(timeout=5)
+    assert not blocking_downloader.started.acquire(timeout=0.2)
+    assert pool.metrics().active == 0
+    replayed = DownloadJournal(journal.path).replay()
+    assert [download.media_id for download in replayed] == [download.media_id for download in downloads[1:]]
+
+
+def test_worker_pool_requires_workers():
+    with pytest.raises(ValueError):
+        DownloadWorkerPool(max_workers=0, logger=logging.getLogger("test"))
+
+
+def test_journal_replays_unfinished_downloads(uid: str, fake_media_path: Path, faker_for_downloads: FakerForDownloads):
+    """
+    Test that journal returns only downloads which were not marked as done and compacts itself.
+    """
+    journal_path = fake_media_path / DOWNLOAD_JOURNAL_FILENAME
+    journal = DownloadJournal(journal_path)
+    finished = faker_for_downloads.random_started_download(client_id=uid)
+    unfinished = faker_for_downloads.random_started_download(client_id=uid)
+    journal.record_enqueued(finished)
+    journal.record_enqueued(unfinished)
+    journal.record_done(finished.media_id)
+    # simulating partially written line after process was killed
+    with journal_path.open("a") as f:
+        f.write('{"event": "enq')
+
+    replayed = DownloadJournal(journal_path).replay()
+    assert [download.media_id for download in replayed] == [unfinished.media_id]
+    assert len(journal_path.read_text().splitlines()) == 1
+
+
+def test_journal_truncated_when_no_pending_jobs(
+    uid: str, fake_media_path: Path, faker_for_downloads: FakerForDownloads
+):
+    journal = DownloadJournal(fake_media_path / DOWNLOAD_JOURNAL_FILENAME)
+    download = faker_for_downloads.random_started_download(client_id=uid)
+    journal.record_enqueued(download)
+    journal.record_done(download.media_id)
+    assert journal.path.read_text() == ""
+    assert journal.replay() == []
+
+
+class SlowDownloader(FakeDownloader):
+    def __init__(self, faker_for_downloads: FakerForDownloads, delay: float):
+        super().__init__(faker_for_downloads)
+        self.delay = delay
+        self.calls = 0
+
+    def get_video_info(self, url: YoutubeURL | str) -> VideoInfoResponse:
+        self.calls += 1
+        time.sleep(self.delay)
+        return super().get_video_info(url)
+
+
+@pytest.mark.asyncio
+async def test_extractor_pool_shares_extraction(faker_for_downloads: FakerForDownloads):
+    """
+    Test that concurrent requests for the same video are served by single extraction off event loop.
+    """
+    extractor = VideoInfoExtractorPool(max_workers=1, timeout=5)
+    downloader = SlowDownloader(faker_for_downloads, delay=0.1)
+    url = "https://www.youtube.com/watch?v=NcBjx_eyvxc"
+    results = await asyncio.gather(*(extractor.get_video_info(downloader, url) for _ in range(3)))
+    assert all(isinstance(result, VideoInfoResponse) for result in results)
+    assert downloader.calls == 1
+    metrics = extractor.metrics()
+    assert metrics.active == 0
+    assert metrics.pending == 0
+    extractor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_extractor_pool_timeout(faker_for_downloads: FakerForDownloads):
+    extractor = VideoInfoExtractorPool(max_workers=1, timeout=0.05)
+    downloader = SlowDownloader(faker_for_downloads, delay=0.2)
+    with pytest.raises(VideoInfoExtractionTimeout):
+        await extractor.get_video_info(downloader, "https://www.youtube.com/watch?v=NcBjx_eyvxc")
+    metrics = extractor.metrics()
+    assert metrics.timeouts == 1
+    assert metrics.saturation == 1.0
+    extractor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_extractor_pool_timeout_of_queued_extraction(faker_for_downloads: FakerForDownloads):
+    """
+    Test that extraction which timed out before it was started is not reported as pending.
+    """
+    extractor = VideoInfoExtractorPool(max_workers=1, timeout=0.05)
+    downloader = SlowDownloader(faker_for_downloads, delay=0.2)
+    urls = ("https://www.youtube.com/watch?v=NcBjx_eyvxc", "https://www.youtube.com/watch?v=TNhaISOUy6Q")
+    results = await asyncio.gather(*(extractor.get_video_info(downloader, url) for url in urls), return_exceptions=True)
+    assert all(isinstance(result, VideoInfoExtractionTimeout) for result in results)
+    await asyncio.sleep(0.3)
+    metrics = extractor.metrics()
+    assert metrics.pending == 0
+    assert metrics.active == 0
+    assert metrics.saturation == 0
+    extractor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_extractor_pool_returns_cached_video_info(faker_for_downloads: FakerForDownloads):
+    """
+    Test that cached video info is returned without waiting behind running extraction.
+    """
+    video_info_cache = VideoInfoCache(ttl=60, max_size=10)
+    extractor = VideoInfoExtractorPool(max_workers=1, timeout=0.1, video_info_cache=video_info_cache)
+    downloader = SlowDownloader(faker_for_downloads, delay=0.3)
+    cached_url = "https://www.youtube.com/watch?v=NcBjx_eyvxc"
+    video_info_cache.put(cached_url, faker_for_downloads.get_video_info_by_url(cached_url))
+    slow = asyncio.ensure_future(extractor.get_video_info(downloader, "https://www.youtube.com/watch?v=TNhaISOUy6Q"))
+    await asyncio.sleep(0.01)
+    assert (await extractor.get_video_info(downloader, cached_url)).url == cached_url
+    assert downloader.calls == 1
+    with pytest.raises(VideoInfoExtractionTimeout):
+        await slow
+    extractor.shutdown()
@@ -55,9 +55,10 @@ class FakerForDownloads:
     ) -> Download:
         media_id = get_unique_id()
         when_submitted = when_submitted or datetime.now()
-        video_data = choice(list(self.fixtures.values()))
+        video_id, video_data = choice(list(self.fixtures.items()))
         download_data = {
             **video_data,
+            "manifest_id": video_id,
             "media_id": media_id,
             "client_id": client_id,
             "media_format": choice(list(MediaFormat)),
@@ -0,0 +1,61 @@
+import asyncio
+from concurrent.futures import Future
+from logging import Logger
+from typing import Any, Coroutine
+
+
+class EventLoopBridge:
+    """
+    Schedules coroutines created in download worker threads on application's event loop, so
+    callbacks share loop with endpoints (and their asyncio primitives) instead of spinning up
+    new event loop on every call. Until loop is bound coroutines are executed with `asyncio.run`.
+    """
+
+    def __init__(self, logger: Logger | None = None):
+        self.logger = logger
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def unbind(self):
+        self._loop = None
+
+    def run(self, coro: Coroutine[Any, Any, Any]) -> Any:
+        """
+        Execute coroutine on bound event loop and wait for its result.
+        """
+        loop = self._get_loop()
+        if loop is None:
+            return asyncio.run(coro)
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def submit(self, coro: Coroutine[Any, Any, Any]):
+        """
+        Schedule coroutine on bound event loop without waiting for its result.
+        """
+        loop = self._get_loop()
+        if loop is None:
+            asyncio.run(coro)
+            return
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        future.add_done_callback(self._log_exception)
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop | None:
+        loop = self._loop
+        if loop is None or loop.is_closed() or not loop.is_running():
+            return None
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is loop:
+            raise RuntimeError("EventLoopBridge cannot be used from event loop's own thread.")
+        return loop
+
+    def _log_exception(self, future: Future):
+        if future.cancelled() or self.logger is None:
+            return
+        exception = future.exception()
+        if exception is not None:
+            self.logger.error("Callback scheduled on event loop failed.", exc_info=exception)
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Generic, TypeVar
+
+from .schemas.responses import VideoInfoResponse
+from .types import YoutubeURL, get_video_id
+
+T = TypeVar("T")
+
+
+@dataclass
+class CachedVideoInfo:
+    video_info: VideoInfoResponse
+    # Downloader specific resolved streams manifest which allows to skip extraction when downloading.
+    manifest: Any = None
+
+
+class VideoInfoCache:
+    """
+    Thread-safe cache of video metadata keyed by canonical video ID. Entries expire after `ttl`
+    seconds and least recently used entry is evicted once cache holds `max_size` entries.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, CachedVideoInfo]] = OrderedDict()
+
+    def get(self, url: YoutubeURL | str) -> CachedVideoInfo | None:
+        video_id = get_video_id(url)
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is None:
+                return None
+            expires_at, cached = entry
+            if expires_at <= time.monotonic():
+                del self._entries[video_id]
+                return None
+            self._entries.move_to_end(video_id)
+            return cached
+
+    def put(self, url: YoutubeURL | str, video_info: VideoInfoResponse, manifest: Any = None):
+        video_id = get_video_id(url)
+        with self._lock:
+            self._entries[video_id] = (time.monotonic() + self.ttl, CachedVideoInfo(video_info, manifest))
+            self._entries.move_to_end(video_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SingleFlight(Generic[T]):
+    """
+    Deduplicates concurrent calls sharing the same key: while call for a key is in flight every
+    other caller awaits its result instead of starting its own. Cancelling one of the callers
+    does not cancel shared call.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task[T]] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task[T]):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Marking exception as retrieved in case all callers were cancelled.
+            task.exception()
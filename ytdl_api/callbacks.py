@@ -1,11 +1,14 @@
+import threading
+import time
 from logging import Logger
 from pathlib import Path
 from typing import Any, Callable, Coroutine
 
 import ffmpeg
+from starlette.concurrency import run_in_threadpool
 
 from .constants import DownloadStatus
-from .datasource import IDataSource
+from .datasource import AsyncIDataSource
 from .queue import NotificationQueue
 from .schemas.models import Download, DownloadStatusInfo
 from .storage import IStorage
@@ -13,6 +16,36 @@ from .types import DownloadDataInfo
 from .utils import extract_percentage_progress, get_datetime_now, get_file_size
 
 
+class ProgressCoalescer:
+    """
+    Rate limiter for download progress updates. Update for media item is let through only if
+    percentage changed and at least `1 / max_updates_per_second` seconds passed since last emitted one.
+    """
+
+    def __init__(self, max_updates_per_second: float):
+        self.min_interval = 1 / max_updates_per_second
+        self._lock = threading.Lock()
+        self._last_emitted: dict[str, tuple[float, int | None]] = {}
+
+    def should_emit(self, media_id: str, progress: int | None) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            last_emitted = self._last_emitted.get(media_id)
+            if last_emitted is not None:
+                last_emitted_at, last_progress = last_emitted
+                if progress == last_progress or now - last_emitted_at < self.min_interval:
+                    return False
+            self._last_emitted[media_id] = (now, progress)
+            return True
+
+    def reset(self, media_id: str):
+        """
+        Forget state of media item. Should be called on download state transitions.
+        """
+        with self._lock:
+            self._last_emitted.pop(media_id, None)
+
+
 async def noop_callback(*args, **kwargs):  # pragma: no cover
     """
     Empty on downaload progess callback. Use as default/placeholder callback for
@@ -26,12 +59,17 @@ async def noop_callback(*args, **kwargs):  # pragma: no cover
 
 async def on_download_start_callback(
     download: Download,
-    datasource: IDataSource,
+    datasource: AsyncIDataSource,
     queue: NotificationQueue,
+    coalescer: ProgressCoalescer | None = None,
 ):
+    if coalescer is not None:
+        coalescer.reset(download.media_id)
     download.status = DownloadStatus.DOWNLOADING
     download.when_started_download = get_datetime_now()
-    datasource.update_download(download)
+    await datasource.patch_download(
+        download.media_id, status=download.status, when_started_download=download.when_started_download
+    )
     await queue.put(
         download.client_id,
         DownloadStatusInfo(
@@ -47,13 +85,14 @@ async def on_download_start_callback(
 
 async def on_pytube_progress_callback(
     download: Download,
-    datasource: IDataSource,
+    datasource: AsyncIDataSource,
     queue: NotificationQueue,
-    *args,
-    **kwargs,
+    progress: int,
 ):
     """
-    Callback which will be used in Pytube's progress update callback
+    Callback which will be used for reporting progress of downloading Pytube's streams. `progress` is
+    percentage of bytes downloaded across all streams chosen for download. Progress is rate limited by
+    downloader before callback is scheduled.
     """
     download_proress = DownloadStatusInfo(
         key=download.key,
@@ -61,18 +100,19 @@ async def on_pytube_progress_callback(
         client_id=download.client_id,
         media_id=download.media_id,
         status=DownloadStatus.DOWNLOADING,
-        progress=-1,
+        progress=progress,
     )
-    datasource.update_download_progress(download_proress)
+    await datasource.update_download_progress(download_proress)
     return await queue.put(download.client_id, download_proress)
 
 
 async def on_ytdlp_progress_callback(progress: DownloadDataInfo, **kwargs):
     """
-    Callback which will be used in Pytube's progress update callback
+    Callback which will be used in Pytube's progress update callback. Progress is rate limited by
+    downloader before callback is scheduled.
     """
     download: Download = kwargs["download"]
-    datasource: IDataSource = kwargs["datasource"]
+    datasource: AsyncIDataSource = kwargs["datasource"]
     queue: NotificationQueue = kwargs["queue"]
     progress = extract_percentage_progress(progress.get("_percent_str"))
     download_proress = DownloadStatusInfo(
@@ -83,13 +123,13 @@ async def on_ytdlp_progress_callback(progress: DownloadDataInfo, **kwargs):
         status=DownloadStatus.DOWNLOADING,
         progress=progress,
     )
-    datasource.update_download_progress(download_proress)
+    await datasource.update_download_progress(download_proress)
     return await queue.put(download.client_id, download_proress)
 
 
 async def on_start_converting(
     download: Download,
-    datasource: IDataSource,
+    datasource: AsyncIDataSource,
     queue: NotificationQueue,
 ):
     """
@@ -98,7 +138,7 @@ async def on_start_converting(
     progress = -1
     download.status = DownloadStatus.CONVERTING
     download.progress = progress
-    datasource.put_download(download)
+    await datasource.patch_download(download.media_id, status=download.status, progress=download.progress)
     await queue.put(
         download.client_id,
         DownloadStatusInfo(
@@ -115,19 +155,23 @@ async def on_start_converting(
 async def on_finish_callback(
     download: Download,
     download_tmp_path: Path,
-    datasource: IDataSource,
+    datasource: AsyncIDataSource,
     queue: NotificationQueue,
     storage: IStorage,
     logger: Logger,
+    coalescer: ProgressCoalescer | None = None,
 ):
     """
     Callback which is executed once ffmpeg finished converting files.
     """
+    if coalescer is not None:
+        coalescer.reset(download.media_id)
     file_posix_path = download_tmp_path.as_posix()
     file_size_bytes, file_size_hr = get_file_size(download_tmp_path)
     logger.debug(f"Uploading downloaded file {file_posix_path} to storage." f" File size: {file_size_hr}")
     try:
-        in_storage_filename = storage.save_download_from_file(download, download_tmp_path)
+        # Callback is executed on application's event loop so file is moved to storage in threadpool.
+        in_storage_filename = await run_in_threadpool(storage.save_download_from_file, download, download_tmp_path)
         logger.debug(f"File {file_posix_path} uploaded...")
     except Exception as e:
         logger.error("Failed to save download file to storage.")
@@ -137,6 +181,7 @@ async def on_finish_callback(
             datasource=datasource,
             queue=queue,
             logger=logger,
+            coalescer=coalescer,
         )
         return
     status = DownloadStatus.FINISHED
@@ -146,7 +191,16 @@ async def on_finish_callback(
     download.filesize = file_size_bytes
     download.filesize_hr = file_size_hr
     download.when_download_finished = get_datetime_now()
-    datasource.update_download(download)
+    await datasource.patch_download(
+        download.media_id,
+        file_path=download.file_path,
+        status=download.status,
+        progress=download.progress,
+        filesize=download.filesize,
+        filesize_hr=download.filesize_hr,
+        merge_strategy=download.merge_strategy,
+        when_download_finished=download.when_download_finished,
+    )
     logger.debug(f'Download status for ({download.media_id}): {download.filename} updated to "{status}"')
     await queue.put(
         download.client_id,
@@ -165,17 +219,20 @@ async def on_finish_callback(
 async def on_error_callback(
     download: Download,
     exception: Exception,
-    datasource: IDataSource,
+    datasource: AsyncIDataSource,
     queue: NotificationQueue,
     logger: Logger,
+    coalescer: ProgressCoalescer | None = None,
 ):
     """
     Callback that is called when exception occured while downloading or converting media file.
     """
+    if coalescer is not None:
+        coalescer.reset(download.media_id)
     if isinstance(exception, ffmpeg.Error):
         logger.error(exception.stderr)
     logger.exception(exception)
-    datasource.mark_as_failed(download)
+    await datasource.mark_as_failed(download)
     await queue.put(
         download.client_id,
         download_progress=DownloadStatusInfo(
@@ -1,13 +1,19 @@
 from datetime import timedelta
 from logging import Logger
 
+from starlette.concurrency import run_in_threadpool
+
+from . import dependencies
 from .config import Settings
-from .datasource import IDataSource
+from .constants import DownloadStatus
+from .datasource import AsyncIDataSource
+from .downloaders import IDownloader
 from .storage import IStorage
 from .utils import get_datetime_now
+from .workers import DownloadWorkerPool
 
 
-def remove_expired_downloads(storage: IStorage, datasource: IDataSource, expired: timedelta, logger: Logger):
+async def remove_expired_downloads(storage: IStorage, datasource: AsyncIDataSource, expired: timedelta, logger: Logger):
     """
     Remove all expired downloads including media files associated with them. `expired` parameter
     is a timedelta object that specifies how old download has to be to be considered as expired.
@@ -15,24 +21,80 @@ def remove_expired_downloads(storage: IStorage, datasource: IDataSource, expired
     dt_now = get_datetime_now()
     expired_dt = dt_now - expired
     logger.info(f"Fetching expired downloads. Expiration date: {expired_dt.strftime('%Y-%m-%d %H:%M:%S')}")
-    downloads = datasource.fetch_downloads_till_datetime(expired_dt)
+    downloads = await datasource.fetch_downloads_till_datetime(expired_dt)
     logger.info(f"Found {len(downloads)} expired downloads.")
-    storage.remove_download_batch([download.storage_filename for download in downloads], skip_on_error=True)
+    await run_in_threadpool(
+        storage.remove_download_batch, [download.storage_filename for download in downloads], skip_on_error=True
+    )
     logger.info("Removed expired downloads from storage.")
-    datasource.delete_download_batch(downloads)
+    await datasource.delete_download_batch(downloads)
     logger.info("Soft deleted expired downloads from database.")
 
 
-def remove_expired_downloads_task(settings: Settings, logger: Logger):
+async def remove_expired_downloads_task(settings: Settings, logger: Logger):
     """
     Task that is executed periodically to remove expired downloads.
     """
     logger.info("Starting task to remove expired downloads...")
     expiration_delta = timedelta(seconds=settings.expiration_period_in_seconds)
-    remove_expired_downloads(
+    await remove_expired_downloads(
         storage=settings.storage.get_storage(),
-        datasource=settings.datasource.get_datasource(),
+        datasource=dependencies.get_async_database(
+            settings=settings, sync_datasource=dependencies.get_database(settings=settings)
+        ),
         expired=expiration_delta,
         logger=logger,
     )
     logger.info("Task to remove expired downloads finished.")
+
+
+async def requeue_unfinished_downloads(
+    worker_pool: DownloadWorkerPool, datasource: AsyncIDataSource, downloader: IDownloader, logger: Logger
+):
+    """
+    Replay download journal and put downloads that were not finished before shutdown back to worker pool.
+    Downloads which already ended (process was stopped before they were marked as done in journal) are skipped.
+    """
+    if worker_pool.journal is None:
+        return
+    downloads = worker_pool.journal.replay()
+    logger.info(f"Found {len(downloads)} unfinished downloads in journal.")
+    for download in downloads:
+        stored = await datasource.get_download(download.client_id, download.media_id)
+        if stored is not None and stored.status.has_ended:
+            logger.info(f"Download {download.media_id} already ended with status {stored.status}, skipping it.")
+            await run_in_threadpool(worker_pool.journal.record_done, download.media_id)
+            continue
+        download.status = DownloadStatus.STARTED
+        download.progress = 0
+        if stored is None:
+            await datasource.put_download(download)
+        else:
+            await datasource.patch_download(download.media_id, status=download.status, progress=download.progress)
+        await run_in_threadpool(worker_pool.submit, downloader, download)
+    logger.info("Unfinished downloads were put back to download queue.")
+
+
+async def recover_unfinished_downloads(settings: Settings, logger: Logger):
+    """
+    Task that is executed on application startup to resume downloads interrupted by restart.
+    """
+    # Cached dependencies are called with keyword arguments like FastAPI does, otherwise `lru_cache`
+    # returns different instances than the ones used by endpoints.
+    datasource = dependencies.get_async_database(
+        settings=settings, sync_datasource=dependencies.get_database(settings=settings)
+    )
+    storage = dependencies.get_storage(settings=settings)
+    downloader = dependencies.get_downloader(
+        settings=settings,
+        datasource=datasource,
+        event_queue=dependencies.get_notification_queue(settings=settings),
+        storage=storage,
+        event_loop_bridge=dependencies.get_event_loop_bridge(),
+        coalescer=dependencies.get_progress_coalescer(settings=settings),
+        video_info_cache=dependencies.get_video_info_cache(settings=settings),
+    )
+    worker_pool = dependencies.get_download_worker_pool(settings=settings)
+    # Partially written files of interrupted downloads are removed before they are downloaded again.
+    await run_in_threadpool(storage.clear_staging_dir)
+    await requeue_unfinished_downloads(worker_pool, datasource, downloader, logger)
@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 from functools import partial
 from importlib.metadata import version
@@ -8,11 +9,11 @@ from confz import BaseConfig, EnvSource
 from croniter import croniter
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import field_validator
+from pydantic import TypeAdapter, field_validator
 from starlette.middleware import Middleware
 
-from .constants import DownloaderType
-from .datasource import InMemoryDB
+from .constants import DownloaderType, MediaOffloadMode
+from .datasource import IDataSource, IndexedInMemoryDB, InMemoryDB, SQLiteDB
 from .storage import IStorage, LocalFileStorage
 from .utils import LOGGER
 
@@ -46,11 +47,31 @@ class InMemoryDBConfig(BaseConfig):
     """
 
     use_in_memory_db: bool = True
+    indexed: bool = True  # use indexed storage instead of TinyDB table
 
-    def get_datasource(self):
+    def get_datasource(self) -> IDataSource:
+        if self.indexed:
+            return IndexedInMemoryDB()
         return InMemoryDB()
 
 
+class SQLiteDBConfig(BaseConfig):
+    """
+    SQLite database config.
+    """
+
+    sqlite_path: Path
+
+    @field_validator("sqlite_path")
+    @classmethod
+    def validate_sqlite_path(cls, value):
+        Path(value).parent.mkdir(parents=True, exist_ok=True)
+        return value
+
+    def get_datasource(self) -> IDataSource:
+        return SQLiteDB(self.sqlite_path)
+
+
 class Settings(BaseConfig):
     """
     Application settings config
@@ -72,12 +93,27 @@ class Settings(BaseConfig):
     cookie_httponly: bool = True
 
     downloader: DownloaderType = DownloaderType.PYTUBE
-    datasource: InMemoryDBConfig
+    datasource: InMemoryDBConfig | SQLiteDBConfig
     storage: LocalStorageConfig
 
     expiration_period_in_seconds: int = 60 * 60 * 24  # 1 day in seconds
     remove_expired_downloads_task_cron: str = "0 0 * * *"  # every day at midnight
 
+    download_workers: int = 2  # number of downloads executed concurrently
+    download_journal_enabled: bool = True  # persist download jobs to replay them after restart
+    progress_updates_per_second: float = 2.0  # max rate of progress notifications per download
+    progress_flush_interval_seconds: float = 1.0  # how often buffered progress is written to datasource (0 = always)
+    video_info_cache_ttl_seconds: int = 60 * 5  # stream URLs expire so metadata is cached only briefly
+    video_info_cache_max_size: int = 256
+    extractor_workers: int = 2  # number of video info extractions executed concurrently
+    extractor_timeout_seconds: float = 30.0
+    media_offload: MediaOffloadMode = MediaOffloadMode.NONE  # let reverse proxy send media files
+    media_offload_location: str = "/protected-media/"  # internal proxy location mapped to storage path
+    notification_buffer_size: int = 100  # max notifications buffered for single client
+    notification_buffer_ttl_seconds: float = 60 * 10  # buffers of clients that stopped reading are evicted
+    sse_heartbeat_interval_seconds: float = 15.0  # keeps idle SSE connections open and detects dead ones
+    sse_batch_window_seconds: float = 0.2  # how long notifications are collected for batched SSE events
+
     CONFIG_SOURCES = EnvSource(
         allow_all=True,
         deny=["title", "description", "version"],
@@ -91,6 +127,20 @@ class Settings(BaseConfig):
             return "0.0.dummy"
         return version(self.downloader.value)
 
+    @field_validator("datasource", mode="before")
+    @classmethod
+    def validate_datasource(cls, value):
+        # Union alone would silently pick in-memory database when options are ambiguous.
+        if not isinstance(value, dict):
+            return value
+        has_sqlite_path = value.get("sqlite_path") is not None
+        use_in_memory_db = TypeAdapter(bool).validate_python(value.get("use_in_memory_db", not has_sqlite_path))
+        if use_in_memory_db == has_sqlite_path:
+            raise ValueError("Exactly one of `use_in_memory_db` and `sqlite_path` datasource options should be set.")
+        if use_in_memory_db:
+            return InMemoryDBConfig(**value)
+        return SQLiteDBConfig(**{key: item for key, item in value.items() if key != "use_in_memory_db"})
+
     @field_validator("remove_expired_downloads_task_cron", mode="before")
     @classmethod
     def validate_remove_expired_downloads_task_cron(cls, value):
@@ -98,6 +148,62 @@ class Settings(BaseConfig):
             return value
         raise ValueError("Invalid cron expression value.")
 
+    @field_validator("download_workers", "extractor_workers")
+    @classmethod
+    def validate_workers(cls, value):
+        if value < 1:
+            raise ValueError("At least one worker is required.")
+        return value
+
+    @field_validator("notification_buffer_size")
+    @classmethod
+    def validate_notification_buffer_size(cls, value):
+        if value < 1:
+            raise ValueError("Notification buffer should hold at least one notification.")
+        return value
+
+    @field_validator("notification_buffer_ttl_seconds")
+    @classmethod
+    def validate_notification_buffer_ttl_seconds(cls, value):
+        if value <= 0:
+            raise ValueError("Notification buffer TTL should be greater than 0.")
+        return value
+
+    @field_validator("sse_heartbeat_interval_seconds")
+    @classmethod
+    def validate_sse_heartbeat_interval_seconds(cls, value):
+        if value <= 0:
+            raise ValueError("SSE heartbeat interval should be greater than 0.")
+        return value
+
+    @field_validator("sse_batch_window_seconds")
+    @classmethod
+    def validate_sse_batch_window_seconds(cls, value):
+        if value <= 0:
+            raise ValueError("SSE batch window should be greater than 0.")
+        return value
+
+    @field_validator("progress_updates_per_second")
+    @classmethod
+    def validate_progress_updates_per_second(cls, value):
+        if value <= 0:
+            raise ValueError("Progress updates rate should be greater than 0.")
+        return value
+
+    @field_validator("progress_flush_interval_seconds")
+    @classmethod
+    def validate_progress_flush_interval_seconds(cls, value):
+        if value < 0:
+            raise ValueError("Progress flush interval can't be negative.")
+        return value
+
+    @field_validator("media_offload_location")
+    @classmethod
+    def validate_media_offload_location(cls, value):
+        if not value.startswith("/"):
+            raise ValueError("Media offload location should be absolute URI path.")
+        return value
+
     @field_validator("allow_origins", mode="before")
     @classmethod
     def validate_allow_origins(cls, value):
@@ -154,7 +260,15 @@ class Settings(BaseConfig):
             app.add_exception_handler(error, partial(handler, LOGGER))  # type: ignore
 
     def __get_lifespan_function__(__pydantic_self__):
-        from .commands import remove_expired_downloads_task
+        from .commands import recover_unfinished_downloads, remove_expired_downloads_task
+        from .dependencies import (
+            get_async_database,
+            get_database,
+            get_download_worker_pool,
+            get_event_loop_bridge,
+            get_video_info_cache,
+            get_video_info_extractor_pool,
+        )
         from .utils import repeat_at
 
         partial_remove_expired_downloads = partial(remove_expired_downloads_task, __pydantic_self__, LOGGER)
@@ -164,9 +278,21 @@ class Settings(BaseConfig):
 
         @asynccontextmanager
         async def lifespan_context(app: FastAPI):  # pragma: no cover
+            get_event_loop_bridge().bind(asyncio.get_running_loop())
+            await recover_unfinished_downloads(__pydantic_self__, LOGGER)
             cyclic_remove_expired_downloads_task()
             yield
             LOGGER.debug("Application shutdown...")
+            # Cached dependencies are called with keyword arguments like FastAPI does, so instances used by
+            # endpoints are shut down instead of new ones.
+            get_download_worker_pool(settings=__pydantic_self__).shutdown()
+            get_video_info_extractor_pool(
+                settings=__pydantic_self__, video_info_cache=get_video_info_cache(settings=__pydantic_self__)
+            ).shutdown()
+            await get_async_database(
+                settings=__pydantic_self__, sync_datasource=get_database(settings=__pydantic_self__)
+            ).flush()
+            get_event_loop_bridge().unbind()
 
         return lifespan_context
 
@@ -19,6 +19,15 @@ class DownloadStatus(str, Enum):
     DELETED = "deleted"
     FAILED = "failed"
 
+    @property
+    def has_ended(self) -> bool:
+        return self in [
+            DownloadStatus.FINISHED,
+            DownloadStatus.DOWNLOADED,
+            DownloadStatus.DELETED,
+            DownloadStatus.FAILED,
+        ]
+
     def __str__(self) -> str:  # pragma: no cover
         return self.value
 
@@ -36,3 +45,28 @@ class MediaFormat(str, Enum):
 
     def __str__(self) -> str:  # pragma: no cover
         return self.value
+
+
+class MergeStrategy(str, Enum):
+    STREAM_COPY = "stream-copy"  # both streams remuxed without re-encoding
+    VIDEO_COPY = "video-copy"  # video stream remuxed, audio stream transcoded
+    TRANSCODE = "transcode"  # both streams transcoded
+
+    def __str__(self) -> str:  # pragma: no cover
+        return self.value
+
+
+class MediaOffloadMode(str, Enum):
+    NONE = "none"  # media files are sent by application
+    X_ACCEL_REDIRECT = "x-accel-redirect"  # nginx
+    X_SENDFILE = "x-sendfile"  # Apache mod_xsendfile, lighttpd
+
+    @property
+    def header(self) -> str | None:
+        return {
+            MediaOffloadMode.X_ACCEL_REDIRECT: "X-Accel-Redirect",
+            MediaOffloadMode.X_SENDFILE: "X-Sendfile",
+        }.get(self)
+
+    def __str__(self) -> str:  # pragma: no cover
+        return self.value
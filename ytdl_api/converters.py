@@ -1,21 +1,28 @@
-from .downloaders import IDownloader
+from typing import Any
+
 from .schemas.models import Download
 from .schemas.requests import DownloadParams
+from .schemas.responses import DownloadResponse, VideoInfoResponse
+from .types import get_video_id
+
+# Stream lists are the largest part of download so they are left out of download lists unless requested.
+DOWNLOAD_RESPONSE_STREAMS_FIELDS = {"video_streams", "audio_streams"}
+DOWNLOAD_RESPONSE_DEFAULT_FIELDS = set(DownloadResponse.model_fields) - DOWNLOAD_RESPONSE_STREAMS_FIELDS
 
 
 def create_download_from_download_params(
-    client_id: str, download_params: DownloadParams, downloader: IDownloader
+    client_id: str, download_params: DownloadParams, video_info: VideoInfoResponse
 ) -> Download:
     """
-    Function for creating Download object from DownloadParams.
+    Function for creating Download object from DownloadParams and info about requested video.
     """
-    video_info = downloader.get_video_info(download_params.url)
     download = Download(
         client_id=client_id,
         title=video_info.title,
         url=video_info.url,
         audio_streams=video_info.audio_streams,
         video_streams=video_info.video_streams,
+        manifest_id=get_video_id(video_info.url),
         audio_stream_id=download_params.audio_stream_id,
         video_stream_id=download_params.video_stream_id,
         media_format=download_params.media_format,
@@ -23,3 +30,27 @@ def create_download_from_download_params(
         duration=video_info.duration,
     )
     return download
+
+
+def get_download_response_fields(fields: str | None) -> set[str]:
+    """
+    Function for parsing comma-separated list of download response fields (either aliases or names).
+    Returns default fields if list is empty. Raises ValueError if there are unknown fields.
+    """
+    if not fields:
+        return DOWNLOAD_RESPONSE_DEFAULT_FIELDS
+    names = {field.alias or name: name for name, field in DownloadResponse.model_fields.items()}
+    names.update({name: name for name in DownloadResponse.model_fields})
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - names.keys()
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return {names[field] for field in requested}
+
+
+def create_download_response(download: Download, fields: set[str]) -> dict[str, Any]:
+    """
+    Function for creating JSON serializable download response that contains only specified fields
+    of `DownloadResponse` schema.
+    """
+    return download.model_dump(mode="json", by_alias=True, include=fields)
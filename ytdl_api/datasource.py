@@ -1,14 +1,107 @@
+import asyncio
+import bisect
 import datetime
+import json
+import secrets
+import sqlite3
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from logging import Logger
+from pathlib import Path
+from typing import Any, Callable
 
 from pydantic import TypeAdapter
 from tinydb import Query, TinyDB, where
 from tinydb.storages import MemoryStorage
 
 from .constants import DownloadStatus
-from .schemas.models import Download, DownloadStatusInfo
+from .schemas.models import Download, DownloadStatusInfo, StreamManifest
 from .utils import get_datetime_now
 
+# Fields of download that are updated by progress updates.
+PROGRESS_FIELDS = {"status", "progress"}
+# Fields of download that can be left out when listing downloads.
+STREAMS_FIELDS = {"video_streams", "audio_streams"}
+
+# Position in list of downloads ordered by submission time: (when_submitted, media_id) of last fetched download.
+DownloadsCursor = tuple[datetime.datetime, str]
+# State of change sequence of data source: (epoch, last assigned change sequence number). Epoch changes whenever
+# sequence numbers start from the beginning again (e.g. in-memory data source was created again after restart).
+ChangeSequence = tuple[str, int]
+
+
+def validate_patch_fields(fields: dict[str, Any]):
+    """
+    Check that fields of partial download update exist.
+    """
+    invalid_fields = set(fields) - set(Download.model_fields)
+    if invalid_fields:
+        raise ValueError(f"Fields can't be patched: {', '.join(sorted(invalid_fields))}")
+
+
+def get_held_manifest_id(manifest_id: str | None, status: DownloadStatus | str | None) -> str | None:
+    """
+    Return ID of streams manifest that download references. Deleted downloads don't reference manifests.
+    """
+    return manifest_id if status != DownloadStatus.DELETED else None
+
+
+class StreamManifestRegistry:
+    """
+    Reference-counted table of streams manifests keyed by canonical video ID, so downloads of the same
+    video share single manifest instead of keeping their own copies of stream lists. Manifest is removed
+    once no download references it. Not thread-safe, data source has to serialize access.
+    """
+
+    def __init__(self):
+        self._manifests: dict[str, StreamManifest] = {}
+        self._references: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._manifests)
+
+    def get(self, manifest_id: str) -> StreamManifest | None:
+        return self._manifests.get(manifest_id)
+
+    def put(self, manifest_id: str, manifest: StreamManifest):
+        """
+        Store manifest (latest one replaces previous). References are counted by `move_reference`.
+        """
+        self._manifests[manifest_id] = manifest
+
+    def move_reference(self, previous_id: str | None, current_id: str | None):
+        """
+        Move reference of changed download from manifest it referenced before to the one it references now.
+        """
+        if previous_id == current_id:
+            return
+        if current_id is not None:
+            self._references[current_id] = self._references.get(current_id, 0) + 1
+        if previous_id is not None:
+            references = self._references.get(previous_id, 0) - 1
+            if references > 0:
+                self._references[previous_id] = references
+            else:
+                self._references.pop(previous_id, None)
+                self._manifests.pop(previous_id, None)
+
+    def rehydrate(self, download: Download) -> Download:
+        """
+        Return copy of download with stream lists of its manifest (lists are shared, not copied).
+        """
+        manifest = self._manifests.get(download.manifest_id) if download.manifest_id else None
+        if manifest is None or download.video_streams or download.audio_streams:
+            return download.model_copy()
+        return download.model_copy(
+            update={"video_streams": manifest.video_streams, "audio_streams": manifest.audio_streams}
+        )
+
+    def clear(self):
+        self._manifests.clear()
+        self._references.clear()
+
 
 class IDataSource(ABC):
     """
@@ -17,9 +110,34 @@ class IDataSource(ABC):
     """
 
     @abstractmethod
-    def fetch_available_downloads(self, client_id: str) -> list[Download]:  # pragma: no cover
+    def fetch_available_downloads(
+        self,
+        client_id: str,
+        after: DownloadsCursor | None = None,
+        limit: int | None = None,
+        include_streams: bool = True,
+    ) -> list[Download]:  # pragma: no cover
+        """
+        Abstract method that returns list of clients non-deleted downloads from data source ordered by
+        submission time. Only downloads after `after` cursor are returned and at most `limit` of them.
+        If `include_streams` is False, stream lists of downloads are left empty.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def fetch_changed_downloads(
+        self, client_id: str, since: int, include_streams: bool = True
+    ) -> list[Download]:  # pragma: no cover
         """
-        Abstract method that returns list of clients non-deleted downloads from data source.
+        Abstract method that returns list of clients downloads (deleted ones included) which were changed
+        after change sequence number `since`, ordered by change sequence number.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get_change_sequence(self) -> ChangeSequence:  # pragma: no cover
+        """
+        Abstract method that returns epoch of change sequence and last assigned change sequence number.
         """
         raise NotImplementedError()
 
@@ -51,6 +169,13 @@ class IDataSource(ABC):
         """
         raise NotImplementedError()
 
+    @abstractmethod
+    def patch_download(self, media_id: str, **fields: Any):  # pragma: no cover
+        """
+        Abstract method for updating only specified fields of download instance in data source.
+        """
+        raise NotImplementedError()
+
     @abstractmethod
     def update_download_progress(self, progress_obj: DownloadStatusInfo):  # pragma: no cover
         """
@@ -102,10 +227,158 @@ class IDataSource(ABC):
         """
         raise NotImplementedError()
 
+    def update_download_progress_batch(self, progress_objs: list[DownloadStatusInfo]):
+        """
+        Method that updates progress for multiple media items. Should be reimplemented if data source
+        supports writing them at once.
+        """
+        for progress_obj in progress_objs:
+            self.update_download_progress(progress_obj)
+
+
+class AsyncIDataSource(ABC):
+    """
+    Asynchronous variant of `IDataSource` interface which is used by endpoints, callbacks and commands,
+    so accessing data never blocks event loop.
+    """
+
+    @abstractmethod
+    async def fetch_available_downloads(
+        self,
+        client_id: str,
+        after: DownloadsCursor | None = None,
+        limit: int | None = None,
+        include_streams: bool = True,
+    ) -> list[Download]:  # pragma: no cover
+        """
+        Abstract method that returns list of clients non-deleted downloads from data source ordered by
+        submission time. Only downloads after `after` cursor are returned and at most `limit` of them.
+        If `include_streams` is False, stream lists of downloads are left empty.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def fetch_changed_downloads(
+        self, client_id: str, since: int, include_streams: bool = True
+    ) -> list[Download]:  # pragma: no cover
+        """
+        Abstract method that returns list of clients downloads (deleted ones included) which were changed
+        after change sequence number `since`, ordered by change sequence number.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def get_change_sequence(self) -> ChangeSequence:  # pragma: no cover
+        """
+        Abstract method that returns epoch of change sequence and last assigned change sequence number.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def fetch_downloads_till_datetime(self, till_when: datetime.datetime) -> list[Download]:  # pragma: no cover
+        """
+        Abstract method that returns list of downloads from data source till specific datetime.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def put_download(self, download: Download):  # pragma: no cover
+        """
+        Abstract method for inserting download instance to data source.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def get_download(self, client_id: str, media_id: str) -> Download | None:  # pragma: no cover
+        """
+        Abstract method for fetching download instance from data source
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def update_download(self, download: Download):  # pragma: no cover
+        """
+        Abstract method for updating download instance from data source
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def patch_download(self, media_id: str, **fields: Any):  # pragma: no cover
+        """
+        Abstract method for updating only specified fields of download instance in data source.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def update_download_progress(self, progress_obj: DownloadStatusInfo):  # pragma: no cover
+        """
+        Abstract method that updates progress for media item of specific user/client.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def delete_download(
+        self,
+        download: Download,
+        when_deleted: datetime.datetime | None = None,
+    ):  # pragma: no cover
+        """
+        Abstract method that deletes download.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def mark_as_downloaded(
+        self,
+        download: Download,
+        when_file_downloaded: datetime.datetime | None = None,
+    ):  # pragma: no cover
+        """
+        Abstract method that marks download as downloaded by user/client.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def clear_downloads(self):  # pragma: no cover
+        """
+        Method for clearing all downloads.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def mark_as_failed(
+        self, download: Download, when_failed: datetime.datetime | None = None
+    ):  # pragma: no cover
+        """
+        Method for setting download status to "failed" for download.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def delete_download_batch(self, downloads: list[Download]):  # pragma: no cover
+        """
+        Abstract method for deleting multiple downloads from database.
+        """
+        raise NotImplementedError()
+
+    async def update_download_progress_batch(self, progress_objs: list[DownloadStatusInfo]):
+        """
+        Method that updates progress for multiple media items.
+        """
+        for progress_obj in progress_objs:
+            await self.update_download_progress(progress_obj)
+
+    async def flush(self):
+        """
+        Method for writing changes that are buffered by data source. Should be reimplemented by
+        data sources that don't write changes immediately.
+        """
+        pass
+
 
 class InMemoryDB(IDataSource):
     """
-    Simple in-memory database implementation.
+    Simple in-memory database implementation. Stream lists are kept once per video in `StreamManifestRegistry`.
     """
 
     def __init__(
@@ -113,29 +386,60 @@ class InMemoryDB(IDataSource):
     ):
         self.db = TinyDB(storage=MemoryStorage)
         self.db.default_table_name = "downloads"
+        # Sequence numbers start from the beginning with every instance, so each one has its own epoch.
+        self._epoch = secrets.token_hex(4)
+        self._seq = 0
+        self._manifests = StreamManifestRegistry()
+
+    def fetch_available_downloads(
+        self,
+        client_id: str,
+        after: DownloadsCursor | None = None,
+        limit: int | None = None,
+        include_streams: bool = True,
+    ) -> list[Download]:
+        downloads = self.db.search((Query()["client_id"] == client_id) & (Query()["status"] != DownloadStatus.DELETED))
+        downloads.sort(key=lambda download: (download["when_submitted"], download["media_id"]))
+        if after is not None:
+            downloads = [d for d in downloads if (d["when_submitted"], d["media_id"]) > after]
+        return self._validate(downloads[:limit], include_streams)
+
+    def fetch_changed_downloads(self, client_id: str, since: int, include_streams: bool = True) -> list[Download]:
+        downloads = self.db.search((Query()["client_id"] == client_id) & (Query()["seq"] > since))
+        downloads.sort(key=lambda download: download["seq"])
+        return self._validate(downloads, include_streams)
 
-    def fetch_available_downloads(self, client_id: str) -> list[Download]:
-        return self.db.search((Query()["client_id"] == client_id) & (Query()["status"] != DownloadStatus.DELETED))
+    def get_change_sequence(self) -> ChangeSequence:
+        return self._epoch, self._seq
 
     def fetch_downloads_till_datetime(self, till_when: datetime.datetime) -> list[Download]:
         downloads = self.db.search(Query()["when_submitted"] <= till_when)
-        return TypeAdapter(list[Download]).validate_python(downloads)
+        return self._validate(downloads)
 
     def put_download(self, download: Download):
-        self.db.insert(download.model_dump())
+        document = {**download.model_dump(), "seq": self._next_seq()}
+        self._track_manifest(None, document)
+        self.db.insert(document)
 
     def get_download(self, client_id: str, media_id: str) -> Download | None:
         q = Query()
         download = self.db.get(
             (q["client_id"] == client_id) & (q["media_id"] == media_id) & (q["status"] != DownloadStatus.DELETED)
         )
-        return Download(**download) if download else None
+        return Download(**self._rehydrate(download)) if download else None
 
     def update_download(self, download: Download):
-        self.db.update(download.model_dump(), Query()["media_id"] == download.media_id)
+        self.db.update(
+            self._updater({**download.model_dump(), "seq": self._next_seq()}),
+            Query()["media_id"] == download.media_id,
+        )
+
+    def patch_download(self, media_id: str, **fields: Any):
+        validate_patch_fields(fields)
+        self.db.update(self._updater({**fields, "seq": self._next_seq()}), Query()["media_id"] == media_id)
 
     def update_download_progress(self, progress_obj: DownloadStatusInfo):
-        self.db.update(progress_obj.model_dump(), (Query()["media_id"] == progress_obj.key))
+        self.db.update(self._updater(self._progress_fields(progress_obj)), (Query()["media_id"] == progress_obj.key))
 
     def delete_download(
         self,
@@ -144,7 +448,7 @@ class InMemoryDB(IDataSource):
     ):
         when_deleted = when_deleted or get_datetime_now()
         self.db.update(
-            {"status": DownloadStatus.DELETED, "when_deleted": when_deleted},
+            self._updater({"status": DownloadStatus.DELETED, "when_deleted": when_deleted, "seq": self._next_seq()}),
             (Query()["media_id"] == download.media_id),
         )
 
@@ -155,17 +459,24 @@ class InMemoryDB(IDataSource):
     ):
         when_file_downloaded = when_file_downloaded or get_datetime_now()
         self.db.update(
-            {"status": DownloadStatus.DOWNLOADED, "when_file_downloaded": when_file_downloaded},
+            self._updater(
+                {
+                    "status": DownloadStatus.DOWNLOADED,
+                    "when_file_downloaded": when_file_downloaded,
+                    "seq": self._next_seq(),
+                }
+            ),
             (Query()["media_id"] == download.media_id),
         )
 
     def clear_downloads(self):
         self.db.truncate()
+        self._manifests.clear()
 
     def mark_as_failed(self, download: Download, when_failed: datetime.datetime | None = None):
         when_failed = when_failed or get_datetime_now()
         self.db.update(
-            {"status": DownloadStatus.FAILED, "when_failed": when_failed},
+            self._updater({"status": DownloadStatus.FAILED, "when_failed": when_failed, "seq": self._next_seq()}),
             (Query()["media_id"] == download.media_id),
         )
 
@@ -173,9 +484,819 @@ class InMemoryDB(IDataSource):
         when_deleted = get_datetime_now()
         batch = [
             (
-                {"status": DownloadStatus.DELETED, "when_deleted": when_deleted},
+                self._updater(
+                    {"status": DownloadStatus.DELETED, "when_deleted": when_deleted, "seq": self._next_seq()}
+                ),
                 where("media_id") == download.media_id,
             )
             for download in downloads
         ]
         self.db.update_multiple(batch)
+
+    def update_download_progress_batch(self, progress_objs: list[DownloadStatusInfo]):
+        self.db.update_multiple(
+            [
+                (self._updater(self._progress_fields(progress_obj)), where("media_id") == progress_obj.key)
+                for progress_obj in progress_objs
+            ]
+        )
+
+    def _progress_fields(self, progress_obj: DownloadStatusInfo) -> dict[str, Any]:
+        return {**progress_obj.model_dump(include=PROGRESS_FIELDS), "seq": self._next_seq()}
+
+    def _next_seq(self) -> int:
+        self._seq += 1
+        return self._seq
+
+    def _updater(self, fields: dict[str, Any]) -> Callable[[dict], None]:
+        # Document is updated in place by TinyDB, so manifest reference is moved in the same pass.
+        def update(document: dict):
+            previous_id = get_held_manifest_id(document.get("manifest_id"), document.get("status"))
+            document.update(fields)
+            self._track_manifest(previous_id, document)
+
+        return update
+
+    def _track_manifest(self, previous_id: str | None, document: dict):
+        manifest_id = get_held_manifest_id(document.get("manifest_id"), document.get("status"))
+        if document.get("manifest_id") is not None and (document.get("video_streams") or document.get("audio_streams")):
+            if manifest_id is not None:
+                manifest = StreamManifest(
+                    video_streams=document["video_streams"], audio_streams=document["audio_streams"]
+                )
+                self._manifests.put(manifest_id, manifest)
+            document.update({"video_streams": [], "audio_streams": []})
+        self._manifests.move_reference(previous_id, manifest_id)
+
+    def _rehydrate(self, document: dict) -> dict:
+        manifest = self._manifests.get(document["manifest_id"]) if document.get("manifest_id") else None
+        if manifest is None or document.get("video_streams") or document.get("audio_streams"):
+            return document
+        return {**document, "video_streams": manifest.video_streams, "audio_streams": manifest.audio_streams}
+
+    def _validate(self, documents: list[dict], include_streams: bool = True) -> list[Download]:
+        if include_streams:
+            documents = [self._rehydrate(document) for document in documents]
+        else:
+            documents = [{k: v for k, v in document.items() if k not in STREAMS_FIELDS} for document in documents]
+        return TypeAdapter(list[Download]).validate_python(documents)
+
+
+class IndexedInMemoryDB(IDataSource):
+    """
+    In-memory database that keeps downloads in hash index by media ID with secondary indexes
+    by client ID and submission time, so lookups and updates don't scan whole table. Client index is
+    ordered by change sequence number, so changed downloads are found without scanning clients history.
+    Stream lists are kept once per video in `StreamManifestRegistry` and rehydrated only when returned.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._downloads: dict[str, Download] = {}
+        # Sequence numbers start from the beginning with every instance, so each one has its own epoch.
+        self._epoch = secrets.token_hex(4)
+        self._seq = 0
+        # Dicts are used as insertion-ordered sets of media IDs. Changed download is moved to the end.
+        self._client_index: dict[str, dict[str, None]] = {}
+        # Media IDs sorted by submission time (used for expiration of downloads).
+        self._when_submitted_keys: list[datetime.datetime] = []
+        self._when_submitted_index: list[str] = []
+        self._manifests = StreamManifestRegistry()
+
+    def fetch_available_downloads(
+        self,
+        client_id: str,
+        after: DownloadsCursor | None = None,
+        limit: int | None = None,
+        include_streams: bool = True,
+    ) -> list[Download]:
+        with self._lock:
+            downloads = [
+                download
+                for download in (self._downloads[media_id] for media_id in self._client_index.get(client_id, ()))
+                if download.status != DownloadStatus.DELETED
+                and (after is None or (download.when_submitted, download.media_id) > after)
+            ]
+            downloads.sort(key=lambda download: (download.when_submitted, download.media_id))
+            # Only downloads that are returned are copied.
+            return [self._copy_unlocked(download, include_streams) for download in downloads[:limit]]
+
+    def fetch_changed_downloads(self, client_id: str, since: int, include_streams: bool = True) -> list[Download]:
+        downloads = []
+        with self._lock:
+            for media_id in reversed(self._client_index.get(client_id, {})):
+                download = self._downloads[media_id]
+                if download.seq <= since:
+                    break
+                downloads.append(download)
+            return [self._copy_unlocked(download, include_streams) for download in reversed(downloads)]
+
+    def get_change_sequence(self) -> ChangeSequence:
+        with self._lock:
+            return self._epoch, self._seq
+
+    def fetch_downloads_till_datetime(self, till_when: datetime.datetime) -> list[Download]:
+        with self._lock:
+            end = bisect.bisect_right(self._when_submitted_keys, till_when)
+            return [self._copy_unlocked(self._downloads[media_id]) for media_id in self._when_submitted_index[:end]]
+
+    def put_download(self, download: Download):
+        with self._lock:
+            self._put_unlocked(download)
+
+    def get_download(self, client_id: str, media_id: str) -> Download | None:
+        with self._lock:
+            download = self._downloads.get(media_id)
+            if download is None or download.client_id != client_id or download.status == DownloadStatus.DELETED:
+                return None
+            return self._copy_unlocked(download)
+
+    def update_download(self, download: Download):
+        with self._lock:
+            stored = self._downloads.get(download.media_id)
+            if stored is None:
+                return
+            if stored.client_id != download.client_id or stored.when_submitted != download.when_submitted:
+                # Indexed fields have changed so download has to be reindexed.
+                self._put_unlocked(download)
+            else:
+                self._store_unlocked(download)
+
+    def patch_download(self, media_id: str, **fields: Any):
+        validate_patch_fields(fields)
+        with self._lock:
+            stored = self._downloads.get(media_id)
+            if stored is None:
+                return
+            if {"client_id", "when_submitted"} & fields.keys():
+                self._put_unlocked(stored.model_copy(update=fields))
+            else:
+                self._store_unlocked(stored, fields)
+
+    def update_download_progress(self, progress_obj: DownloadStatusInfo):
+        self._update(progress_obj.key, progress_obj.model_dump(include=PROGRESS_FIELDS))
+
+    def update_download_progress_batch(self, progress_objs: list[DownloadStatusInfo]):
+        with self._lock:
+            for progress_obj in progress_objs:
+                self._update_unlocked(progress_obj.key, progress_obj.model_dump(include=PROGRESS_FIELDS))
+
+    def delete_download(
+        self,
+        download: Download,
+        when_deleted: datetime.datetime | None = None,
+    ):
+        when_deleted = when_deleted or get_datetime_now()
+        self._update(download.media_id, {"status": DownloadStatus.DELETED, "when_deleted": when_deleted})
+
+    def mark_as_downloaded(
+        self,
+        download: Download,
+        when_file_downloaded: datetime.datetime | None = None,
+    ):
+        when_file_downloaded = when_file_downloaded or get_datetime_now()
+        self._update(
+            download.media_id,
+            {"status": DownloadStatus.DOWNLOADED, "when_file_downloaded": when_file_downloaded},
+        )
+
+    def clear_downloads(self):
+        with self._lock:
+            self._downloads.clear()
+            self._client_index.clear()
+            self._when_submitted_keys.clear()
+            self._when_submitted_index.clear()
+            self._manifests.clear()
+
+    def mark_as_failed(self, download: Download, when_failed: datetime.datetime | None = None):
+        when_failed = when_failed or get_datetime_now()
+        self._update(download.media_id, {"status": DownloadStatus.FAILED, "when_failed": when_failed})
+
+    def delete_download_batch(self, downloads: list[Download]):
+        when_deleted = get_datetime_now()
+        with self._lock:
+            for download in downloads:
+                self._update_unlocked(
+                    download.media_id, {"status": DownloadStatus.DELETED, "when_deleted": when_deleted}
+                )
+
+    def _put_unlocked(self, download: Download):
+        if download.media_id in self._downloads:
+            self._unindex(self._downloads[download.media_id])
+        self._client_index.setdefault(download.client_id, {})
+        self._store_unlocked(download)
+        position = bisect.bisect_right(self._when_submitted_keys, download.when_submitted)
+        self._when_submitted_keys.insert(position, download.when_submitted)
+        self._when_submitted_index.insert(position, download.media_id)
+
+    def _update(self, media_id: str, fields: dict):
+        with self._lock:
+            self._update_unlocked(media_id, fields)
+
+    def _update_unlocked(self, media_id: str, fields: dict):
+        stored = self._downloads.get(media_id)
+        if stored is not None:
+            self._store_unlocked(stored, fields)
+
+    def _store_unlocked(self, download: Download, fields: dict | None = None):
+        # Every change gets next sequence number and moves download to the end of client index.
+        self._seq += 1
+        stored = download.model_copy(update={**(fields or {}), "seq": self._seq})
+        manifest_id = get_held_manifest_id(stored.manifest_id, stored.status)
+        if stored.manifest_id is not None and (stored.video_streams or stored.audio_streams):
+            if manifest_id is not None:
+                self._manifests.put(
+                    manifest_id, StreamManifest(video_streams=stored.video_streams, audio_streams=stored.audio_streams)
+                )
+            stored = stored.model_copy(update={"video_streams": [], "audio_streams": []})
+        previous = self._downloads.get(download.media_id)
+        previous_id = get_held_manifest_id(previous.manifest_id, previous.status) if previous else None
+        self._manifests.move_reference(previous_id, manifest_id)
+        self._downloads[download.media_id] = stored
+        client_downloads = self._client_index[download.client_id]
+        client_downloads.pop(download.media_id, None)
+        client_downloads[download.media_id] = None
+
+    def _copy_unlocked(self, download: Download, include_streams: bool = True) -> Download:
+        if not include_streams:
+            return download.model_copy(update={"video_streams": [], "audio_streams": []})
+        return self._manifests.rehydrate(download)
+
+    def _unindex(self, download: Download):
+        client_downloads = self._client_index.get(download.client_id, {})
+        client_downloads.pop(download.media_id, None)
+        if not client_downloads:
+            self._client_index.pop(download.client_id, None)
+        start = bisect.bisect_left(self._when_submitted_keys, download.when_submitted)
+        end = bisect.bisect_right(self._when_submitted_keys, download.when_submitted)
+        for position in range(start, end):
+            if self._when_submitted_index[position] == download.media_id:
+                del self._when_submitted_keys[position]
+                del self._when_submitted_index[position]
+                break
+
+
+class SQLiteDB(IDataSource):
+    """
+    SQLite database implementation for persistent single-node deployments. Download is stored as
+    JSON document along with columns that are used for filtering and indexed. Database works in WAL
+    mode, so frequent progress updates don't block reads. Change sequence numbers are taken from
+    `sequence` table in the same transaction as change itself, so they keep increasing in commit order
+    even if database file is shared by multiple connections or processes.
+    Stream lists are stored once per video in `manifests` table and merged into download by SQLite
+    only when they are requested. References to manifests are counted by triggers.
+    """
+
+    CREATE_TABLE = """
+        CREATE TABLE IF NOT EXISTS downloads (
+            media_id TEXT PRIMARY KEY,
+            client_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            when_submitted REAL NOT NULL,
+            seq INTEGER NOT NULL DEFAULT 0,
+            manifest_id TEXT,
+            data TEXT NOT NULL
+        )
+    """
+    CREATE_MANIFESTS_TABLE = """
+        CREATE TABLE IF NOT EXISTS manifests (
+            manifest_id TEXT PRIMARY KEY,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            data TEXT NOT NULL DEFAULT '{}'
+        )
+    """
+    CREATE_SEQUENCE_TABLE = "CREATE TABLE IF NOT EXISTS sequence (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+    # Sequence of databases created by previous versions continues from the highest stored one.
+    INIT_SEQUENCE = (
+        "INSERT OR IGNORE INTO sequence (name, value) SELECT 'downloads', COALESCE(MAX(seq), 0) FROM downloads"
+    )
+    # Row is locked for writing until transaction is committed, so concurrent writers are serialized.
+    INCREMENT_SEQUENCE = "UPDATE sequence SET value = value + ? WHERE name = 'downloads'"
+    SELECT_SEQUENCE = "SELECT value FROM sequence WHERE name = 'downloads'"
+    # Epoch is generated once per database file, sequence numbers stored in it never start again.
+    INIT_EPOCH = "INSERT OR IGNORE INTO sequence (name, value) VALUES ('epoch', random() & 4294967295)"
+    SELECT_EPOCH = "SELECT value FROM sequence WHERE name = 'epoch'"
+    # Databases created by previous versions lack some of the columns.
+    ADD_COLUMNS = {
+        "seq": "ALTER TABLE downloads ADD COLUMN seq INTEGER NOT NULL DEFAULT 0",
+        "manifest_id": "ALTER TABLE downloads ADD COLUMN manifest_id TEXT",
+    }
+    CREATE_INDEXES = (
+        "CREATE INDEX IF NOT EXISTS ix_downloads_client_id_status ON downloads (client_id, status)",
+        "CREATE INDEX IF NOT EXISTS ix_downloads_when_submitted ON downloads (when_submitted)",
+        "CREATE INDEX IF NOT EXISTS ix_downloads_client_id_seq ON downloads (client_id, seq)",
+    )
+    # Download references manifest unless it is deleted.
+    ACQUIRE_MANIFEST = """
+        INSERT INTO manifests (manifest_id, refcount) VALUES (NEW.manifest_id, 1)
+        ON CONFLICT (manifest_id) DO UPDATE SET refcount = refcount + 1;
+    """
+    RELEASE_MANIFEST = """
+        UPDATE manifests SET refcount = refcount - 1 WHERE manifest_id = OLD.manifest_id;
+        DELETE FROM manifests WHERE manifest_id = OLD.manifest_id AND refcount <= 0;
+    """
+    CREATE_TRIGGERS = (
+        f"""
+        CREATE TRIGGER IF NOT EXISTS tr_downloads_insert_manifest AFTER INSERT ON downloads
+        WHEN NEW.manifest_id IS NOT NULL AND NEW.status != '{DownloadStatus.DELETED.value}'
+        BEGIN {ACQUIRE_MANIFEST} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS tr_downloads_acquire_manifest AFTER UPDATE OF status, manifest_id ON downloads
+        WHEN NEW.manifest_id IS NOT NULL AND NEW.status != '{DownloadStatus.DELETED.value}'
+            AND (OLD.manifest_id IS NOT NEW.manifest_id OR OLD.status = '{DownloadStatus.DELETED.value}')
+        BEGIN {ACQUIRE_MANIFEST} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS tr_downloads_release_manifest AFTER UPDATE OF status, manifest_id ON downloads
+        WHEN OLD.manifest_id IS NOT NULL AND OLD.status != '{DownloadStatus.DELETED.value}'
+            AND (OLD.manifest_id IS NOT NEW.manifest_id OR NEW.status = '{DownloadStatus.DELETED.value}')
+        BEGIN {RELEASE_MANIFEST} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS tr_downloads_delete_manifest AFTER DELETE ON downloads
+        WHEN OLD.manifest_id IS NOT NULL AND OLD.status != '{DownloadStatus.DELETED.value}'
+        BEGIN {RELEASE_MANIFEST} END
+        """,
+    )
+    # media_id is primary key, so it is indexed by SQLite itself.
+    SELECT_AVAILABLE = """
+        SELECT {data} FROM downloads LEFT JOIN manifests USING (manifest_id)
+        WHERE client_id = ? AND status != ? AND (when_submitted, media_id) > (?, ?)
+        ORDER BY when_submitted, media_id
+        LIMIT ?
+    """
+    SELECT_CHANGED = (
+        "SELECT {data} FROM downloads LEFT JOIN manifests USING (manifest_id) WHERE client_id = ? AND seq > ? "
+        "ORDER BY seq"
+    )
+    # Stream lists of manifest replace empty ones of download.
+    DATA_WITH_STREAMS = "COALESCE(json_patch(downloads.data, manifests.data), downloads.data)"
+    DATA_WITHOUT_STREAMS = "json_remove(downloads.data, '$.video_streams', '$.audio_streams')"
+    SELECT_TILL_DATETIME = (
+        f"SELECT {DATA_WITH_STREAMS} FROM downloads LEFT JOIN manifests USING (manifest_id) "
+        "WHERE when_submitted <= ? ORDER BY when_submitted, downloads.rowid"
+    )
+    SELECT_ONE = (
+        f"SELECT {DATA_WITH_STREAMS} FROM downloads LEFT JOIN manifests USING (manifest_id) "
+        "WHERE media_id = ? AND client_id = ? AND status != ?"
+    )
+    SELECT_MANIFEST_REFERENCE = "SELECT manifest_id, status FROM downloads WHERE media_id = ?"
+    PUT_MANIFEST = "INSERT INTO manifests (manifest_id, data) VALUES (?, ?) ON CONFLICT (manifest_id) DO UPDATE SET data = excluded.data"
+    DELETE_UNREFERENCED_MANIFEST = "DELETE FROM manifests WHERE manifest_id = ? AND refcount <= 0"
+    # Upsert (unlike "INSERT OR REPLACE") updates existing row, so triggers see previous manifest reference.
+    UPSERT = """
+        INSERT INTO downloads (media_id, client_id, status, when_submitted, seq, manifest_id, data)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (media_id) DO UPDATE SET client_id = excluded.client_id, status = excluded.status,
+            when_submitted = excluded.when_submitted, seq = excluded.seq, manifest_id = excluded.manifest_id,
+            data = excluded.data
+    """
+    UPDATE = (
+        "UPDATE downloads SET client_id = ?, status = ?, when_submitted = ?, seq = ?, manifest_id = ?, data = ? "
+        "WHERE media_id = ?"
+    )
+    UPDATE_PROGRESS = (
+        "UPDATE downloads SET status = ?, seq = ?, "
+        "data = json_set(data, '$.status', ?, '$.progress', ?, '$.seq', ?) WHERE media_id = ?"
+    )
+    UPDATE_STATUS = (
+        "UPDATE downloads SET status = ?, seq = ?, "
+        "data = json_set(data, '$.status', ?, ?, ?, '$.seq', ?) WHERE media_id = ?"
+    )
+    DELETE_ALL = "DELETE FROM downloads"
+    DELETE_ALL_MANIFESTS = "DELETE FROM manifests"
+    INDEXED_COLUMNS = ("client_id", "status", "when_submitted", "seq", "manifest_id")
+
+    def __init__(self, path: Path | str):
+        self.path = path
+        self._lock = threading.Lock()
+        # Connection is shared by event loop and download worker threads, access is serialized with lock.
+        # Statements are executed with constant SQL, so they are prepared once and reused from statement cache.
+        self._connection = sqlite3.connect(path, check_same_thread=False, cached_statements=32)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode "NORMAL" is safe from corruption and avoids fsync on every committed update.
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(self.CREATE_TABLE)
+            self._connection.execute(self.CREATE_MANIFESTS_TABLE)
+            columns = {row[1] for row in self._connection.execute("PRAGMA table_info(downloads)")}
+            for column, statement in self.ADD_COLUMNS.items():
+                if column not in columns:
+                    self._connection.execute(statement)
+            for statement in (*self.CREATE_INDEXES, *self.CREATE_TRIGGERS):
+                self._connection.execute(statement)
+            self._connection.execute(self.CREATE_SEQUENCE_TABLE)
+            self._connection.execute(self.INIT_SEQUENCE)
+            self._connection.execute(self.INIT_EPOCH)
+            (epoch,) = self._connection.execute(self.SELECT_EPOCH).fetchone()
+        self._epoch = f"{epoch:08x}"
+
+    def fetch_available_downloads(
+        self,
+        client_id: str,
+        after: DownloadsCursor | None = None,
+        limit: int | None = None,
+        include_streams: bool = True,
+    ) -> list[Download]:
+        # Streams are removed from document by SQLite, so they are neither transferred nor parsed.
+        sql = self.SELECT_AVAILABLE.format(
+            data=self.DATA_WITH_STREAMS if include_streams else self.DATA_WITHOUT_STREAMS
+        )
+        after_when_submitted, after_media_id = (after[0].timestamp(), after[1]) if after else (float("-inf"), "")
+        params = (client_id, DownloadStatus.DELETED.value, after_when_submitted, after_media_id, limit or -1)
+        rows = self._fetchall(sql, params)
+        return [Download.model_validate_json(data) for (data,) in rows]
+
+    def fetch_changed_downloads(self, client_id: str, since: int, include_streams: bool = True) -> list[Download]:
+        sql = self.SELECT_CHANGED.format(data=self.DATA_WITH_STREAMS if include_streams else self.DATA_WITHOUT_STREAMS)
+        rows = self._fetchall(sql, (client_id, since))
+        return [Download.model_validate_json(data) for (data,) in rows]
+
+    def get_change_sequence(self) -> ChangeSequence:
+        ((last_seq,),) = self._fetchall(self.SELECT_SEQUENCE, ())
+        return self._epoch, last_seq
+
+    def fetch_downloads_till_datetime(self, till_when: datetime.datetime) -> list[Download]:
+        rows = self._fetchall(self.SELECT_TILL_DATETIME, (till_when.timestamp(),))
+        return [Download.model_validate_json(data) for (data,) in rows]
+
+    def put_download(self, download: Download):
+        with self._lock, self._connection:
+            seq = self._next_seq()
+            self._connection.execute(
+                self.UPSERT,
+                (
+                    download.media_id,
+                    download.client_id,
+                    download.status.value,
+                    download.when_submitted.timestamp(),
+                    seq,
+                    download.manifest_id,
+                    self._dump_unlocked(download, seq),
+                ),
+            )
+
+    def get_download(self, client_id: str, media_id: str) -> Download | None:
+        rows = self._fetchall(self.SELECT_ONE, (media_id, client_id, DownloadStatus.DELETED.value))
+        return Download.model_validate_json(rows[0][0]) if rows else None
+
+    def update_download(self, download: Download):
+        with self._lock, self._connection:
+            seq = self._next_seq()
+            self._connection.execute(
+                self.UPDATE,
+                (
+                    download.client_id,
+                    download.status.value,
+                    download.when_submitted.timestamp(),
+                    seq,
+                    download.manifest_id,
+                    self._dump_unlocked(download, seq),
+                    download.media_id,
+                ),
+            )
+            if download.manifest_id is not None:
+                self._connection.execute(self.DELETE_UNREFERENCED_MANIFEST, (download.manifest_id,))
+
+    def patch_download(self, media_id: str, **fields: Any):
+        validate_patch_fields(fields)
+        if not fields:
+            return
+        with self._lock, self._connection:
+            if fields.get("video_streams") or fields.get("audio_streams"):
+                fields = self._patch_streams_unlocked(media_id, fields)
+            fields = {**fields, "seq": self._next_seq()}
+            # Statement depends only on names of patched fields, so it is cached like the constant ones.
+            columns, json_paths, params = [], [], []
+            values = TypeAdapter(dict[str, Any]).dump_python(fields, mode="json")
+            for name, value in values.items():
+                if name in self.INDEXED_COLUMNS:
+                    columns.append(f"{name} = ?")
+                    params.append(fields[name].timestamp() if name == "when_submitted" else value)
+            for name, value in values.items():
+                if isinstance(value, (list, dict)):
+                    json_paths.append(f"'$.{name}', json(?)")
+                    params.append(json.dumps(value))
+                else:
+                    json_paths.append(f"'$.{name}', ?")
+                    params.append(value)
+            columns.append(f"data = json_set(data, {', '.join(json_paths)})")
+            self._connection.execute(
+                f"UPDATE downloads SET {', '.join(columns)} WHERE media_id = ?", (*params, media_id)
+            )
+
+    def update_download_progress(self, progress_obj: DownloadStatusInfo):
+        self._execute_change(self.UPDATE_PROGRESS, partial(self._progress_params, progress_obj))
+
+    def update_download_progress_batch(self, progress_objs: list[DownloadStatusInfo]):
+        if not progress_objs:
+            return
+        with self._lock, self._connection:
+            first_seq = self._next_seq(len(progress_objs))
+            self._connection.executemany(
+                self.UPDATE_PROGRESS,
+                [
+                    self._progress_params(progress_obj, seq)
+                    for seq, progress_obj in enumerate(progress_objs, start=first_seq)
+                ],
+            )
+
+    def delete_download(
+        self,
+        download: Download,
+        when_deleted: datetime.datetime | None = None,
+    ):
+        when_deleted = when_deleted or get_datetime_now()
+        self._execute_change(
+            self.UPDATE_STATUS,
+            partial(self._status_params, download, DownloadStatus.DELETED, "when_deleted", when_deleted),
+        )
+
+    def mark_as_downloaded(
+        self,
+        download: Download,
+        when_file_downloaded: datetime.datetime | None = None,
+    ):
+        when_file_downloaded = when_file_downloaded or get_datetime_now()
+        self._execute_change(
+            self.UPDATE_STATUS,
+            partial(
+                self._status_params, download, DownloadStatus.DOWNLOADED, "when_file_downloaded", when_file_downloaded
+            ),
+        )
+
+    def clear_downloads(self):
+        with self._lock, self._connection:
+            self._connection.execute(self.DELETE_ALL)
+            self._connection.execute(self.DELETE_ALL_MANIFESTS)
+
+    def mark_as_failed(self, download: Download, when_failed: datetime.datetime | None = None):
+        when_failed = when_failed or get_datetime_now()
+        self._execute_change(
+            self.UPDATE_STATUS,
+            partial(self._status_params, download, DownloadStatus.FAILED, "when_failed", when_failed),
+        )
+
+    def delete_download_batch(self, downloads: list[Download]):
+        if not downloads:
+            return
+        when_deleted = get_datetime_now()
+        with self._lock, self._connection:
+            first_seq = self._next_seq(len(downloads))
+            batch = [
+                self._status_params(download, DownloadStatus.DELETED, "when_deleted", when_deleted, seq)
+                for seq, download in enumerate(downloads, start=first_seq)
+            ]
+            self._connection.executemany(self.UPDATE_STATUS, batch)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    @staticmethod
+    def _progress_params(progress_obj: DownloadStatusInfo, seq: int) -> tuple:
+        status = progress_obj.status.value
+        return (status, seq, status, progress_obj.progress, seq, progress_obj.key)
+
+    @staticmethod
+    def _status_params(
+        download: Download, status: DownloadStatus, when_field: str, when: datetime.datetime, seq: int
+    ) -> tuple:
+        return (status.value, seq, status.value, f"$.{when_field}", when.isoformat(), seq, download.media_id)
+
+    def _dump_unlocked(self, download: Download, seq: int) -> str:
+        """
+        Return JSON document of download. Streams of download that references manifest are stored in manifest.
+        """
+        update: dict[str, Any] = {"seq": seq}
+        if download.manifest_id is not None and (download.video_streams or download.audio_streams):
+            if get_held_manifest_id(download.manifest_id, download.status) is not None:
+                manifest = StreamManifest(video_streams=download.video_streams, audio_streams=download.audio_streams)
+                self._connection.execute(self.PUT_MANIFEST, (download.manifest_id, manifest.model_dump_json()))
+            update.update(video_streams=[], audio_streams=[])
+        return download.model_copy(update=update).model_dump_json()
+
+    def _patch_streams_unlocked(self, media_id: str, fields: dict[str, Any]) -> dict[str, Any]:
+        rows = self._connection.execute(self.SELECT_MANIFEST_REFERENCE, (media_id,)).fetchall()
+        if not rows:
+            return fields
+        manifest_id = fields.get("manifest_id", rows[0][0])
+        if manifest_id is None:
+            return fields
+        if get_held_manifest_id(manifest_id, fields.get("status", rows[0][1])) is not None:
+            manifest = StreamManifest(
+                video_streams=fields.get("video_streams", []), audio_streams=fields.get("audio_streams", [])
+            )
+            self._connection.execute(self.PUT_MANIFEST, (manifest_id, manifest.model_dump_json()))
+        return {**fields, "video_streams": [], "audio_streams": []}
+
+    def _next_seq(self, count: int = 1) -> int:
+        """
+        Reserve `count` change sequence numbers and return the first one. Must be called with lock held
+        inside transaction that writes the change, so changes are committed in order of their numbers.
+        """
+        self._connection.execute(self.INCREMENT_SEQUENCE, (count,))
+        (last_seq,) = self._connection.execute(self.SELECT_SEQUENCE).fetchone()
+        return last_seq - count + 1
+
+    def _execute_change(self, sql: str, params: Callable[[int], tuple]):
+        """
+        Execute statement that changes download with parameters built for next change sequence number.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(sql, params(self._next_seq()))
+
+    def _fetchall(self, sql: str, params: tuple) -> list[tuple]:
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+
+class AsyncDataSourceAdapter(AsyncIDataSource):
+    """
+    Adapter that exposes synchronous `IDataSource` implementation as `AsyncIDataSource` by executing
+    its methods in dedicated thread executor. With single worker (default) calls are executed in the
+    same order as they were made, so e.g. progress update can't overwrite status of finished download.
+    """
+
+    def __init__(self, datasource: IDataSource, max_workers: int = 1):
+        self.datasource = datasource
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ytdl-datasource")
+
+    async def fetch_available_downloads(
+        self,
+        client_id: str,
+        after: DownloadsCursor | None = None,
+        limit: int | None = None,
+        include_streams: bool = True,
+    ) -> list[Download]:
+        return await self._run(self.datasource.fetch_available_downloads, client_id, after, limit, include_streams)
+
+    async def fetch_changed_downloads(self, client_id: str, since: int, include_streams: bool = True) -> list[Download]:
+        return await self._run(self.datasource.fetch_changed_downloads, client_id, since, include_streams)
+
+    async def get_change_sequence(self) -> ChangeSequence:
+        return await self._run(self.datasource.get_change_sequence)
+
+    async def fetch_downloads_till_datetime(self, till_when: datetime.datetime) -> list[Download]:
+        return await self._run(self.datasource.fetch_downloads_till_datetime, till_when)
+
+    async def put_download(self, download: Download):
+        return await self._run(self.datasource.put_download, download)
+
+    async def get_download(self, client_id: str, media_id: str) -> Download | None:
+        return await self._run(self.datasource.get_download, client_id, media_id)
+
+    async def update_download(self, download: Download):
+        return await self._run(self.datasource.update_download, download)
+
+    async def patch_download(self, media_id: str, **fields: Any):
+        return await self._run(partial(self.datasource.patch_download, media_id, **fields))
+
+    async def update_download_progress(self, progress_obj: DownloadStatusInfo):
+        return await self._run(self.datasource.update_download_progress, progress_obj)
+
+    async def delete_download(
+        self,
+        download: Download,
+        when_deleted: datetime.datetime | None = None,
+    ):
+        return await self._run(self.datasource.delete_download, download, when_deleted)
+
+    async def mark_as_downloaded(
+        self,
+        download: Download,
+        when_file_downloaded: datetime.datetime | None = None,
+    ):
+        return await self._run(self.datasource.mark_as_downloaded, download, when_file_downloaded)
+
+    async def clear_downloads(self):
+        return await self._run(self.datasource.clear_downloads)
+
+    async def mark_as_failed(self, download: Download, when_failed: datetime.datetime | None = None):
+        return await self._run(self.datasource.mark_as_failed, download, when_failed)
+
+    async def delete_download_batch(self, downloads: list[Download]):
+        return await self._run(self.datasource.delete_download_batch, downloads)
+
+    async def update_download_progress_batch(self, progress_objs: list[DownloadStatusInfo]):
+        return await self._run(self.datasource.update_download_progress_batch, progress_objs)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    async def _run(self, fn: Callable[..., Any], *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+
+class WriteBehindDataSource(AsyncIDataSource):
+    """
+    Write-behind layer over `AsyncIDataSource`. Progress updates are kept in memory (only latest one per
+    media item) and written to underlying data source in batches every `flush_interval` seconds. Any other
+    write is passed through immediately and discards buffered progress of that media item, so state
+    transitions (finished, failed, deleted etc.) are persisted synchronously and never overwritten by
+    stale progress. Reads can therefore return progress that is at most `flush_interval` seconds old.
+    """
+
+    def __init__(self, datasource: AsyncIDataSource, flush_interval: float, logger: Logger | None = None):
+        self.datasource = datasource
+        self.flush_interval = flush_interval
+        self.logger = logger
+        self._pending: dict[str, DownloadStatusInfo] = {}
+        self._flush_task: asyncio.Task | None = None
+
+    async def fetch_available_downloads(
+        self,
+        client_id: str,
+        after: DownloadsCursor | None = None,
+        limit: int | None = None,
+        include_streams: bool = True,
+    ) -> list[Download]:
+        return await self.datasource.fetch_available_downloads(client_id, after, limit, include_streams)
+
+    async def fetch_changed_downloads(self, client_id: str, since: int, include_streams: bool = True) -> list[Download]:
+        return await self.datasource.fetch_changed_downloads(client_id, since, include_streams)
+
+    async def get_change_sequence(self) -> ChangeSequence:
+        return await self.datasource.get_change_sequence()
+
+    async def fetch_downloads_till_datetime(self, till_when: datetime.datetime) -> list[Download]:
+        return await self.datasource.fetch_downloads_till_datetime(till_when)
+
+    async def put_download(self, download: Download):
+        self._pending.pop(download.media_id, None)
+        return await self.datasource.put_download(download)
+
+    async def get_download(self, client_id: str, media_id: str) -> Download | None:
+        return await self.datasource.get_download(client_id, media_id)
+
+    async def update_download(self, download: Download):
+        self._pending.pop(download.media_id, None)
+        return await self.datasource.update_download(download)
+
+    async def patch_download(self, media_id: str, **fields: Any):
+        self._pending.pop(media_id, None)
+        return await self.datasource.patch_download(media_id, **fields)
+
+    async def update_download_progress(self, progress_obj: DownloadStatusInfo):
+        self._pending[progress_obj.key] = progress_obj
+        self._ensure_flush_task()
+
+    async def delete_download(
+        self,
+        download: Download,
+        when_deleted: datetime.datetime | None = None,
+    ):
+        self._pending.pop(download.media_id, None)
+        return await self.datasource.delete_download(download, when_deleted)
+
+    async def mark_as_downloaded(
+        self,
+        download: Download,
+        when_file_downloaded: datetime.datetime | None = None,
+    ):
+        self._pending.pop(download.media_id, None)
+        return await self.datasource.mark_as_downloaded(download, when_file_downloaded)
+
+    async def clear_downloads(self):
+        self._pending.clear()
+        return await self.datasource.clear_downloads()
+
+    async def mark_as_failed(self, download: Download, when_failed: datetime.datetime | None = None):
+        self._pending.pop(download.media_id, None)
+        return await self.datasource.mark_as_failed(download, when_failed)
+
+    async def delete_download_batch(self, downloads: list[Download]):
+        for download in downloads:
+            self._pending.pop(download.media_id, None)
+        return await self.datasource.delete_download_batch(downloads)
+
+    async def update_download_progress_batch(self, progress_objs: list[DownloadStatusInfo]):
+        for progress_obj in progress_objs:
+            self._pending[progress_obj.key] = progress_obj
+        self._ensure_flush_task()
+
+    async def flush(self):
+        """
+        Write all buffered progress updates to underlying data source.
+        """
+        if not self._pending:
+            return
+        batch, self._pending = list(self._pending.values()), {}
+        try:
+            await self.datasource.update_download_progress_batch(batch)
+        except Exception as e:
+            # Progress is overwritten by next update anyway, so failed batch is not retried.
+            if self.logger is not None:
+                self.logger.exception(e)
+
+    def _ensure_flush_task(self):
+        loop = asyncio.get_running_loop()
+        if self._flush_task is None or self._flush_task.done() or self._flush_task.get_loop() is not loop:
+            self._flush_task = loop.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        # Task finishes once buffer is empty and is started again by next progress update.
+        while self._pending:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
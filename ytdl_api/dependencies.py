@@ -1,11 +1,13 @@
 import secrets
 from functools import lru_cache, partial
+from pathlib import Path
 
 from fastapi import Cookie, Depends, HTTPException, Response
 from starlette import status
 
-from . import datasource, downloaders, queue, storage
+from . import bridge, cache, datasource, downloaders, queue, storage, workers
 from .callbacks import (
+    ProgressCoalescer,
     on_download_start_callback,
     on_error_callback,
     on_finish_callback,
@@ -26,8 +28,10 @@ def get_settings() -> Settings:  # pragma: no cover
 
 
 @lru_cache
-def get_notification_queue() -> queue.NotificationQueue:
-    return queue.NotificationQueue()
+def get_notification_queue(settings: Settings = Depends(get_settings)) -> queue.NotificationQueue:
+    return queue.NotificationQueue(
+        max_size=settings.notification_buffer_size, ttl=settings.notification_buffer_ttl_seconds
+    )
 
 
 @lru_cache
@@ -35,16 +39,73 @@ def get_database(settings: Settings = Depends(get_settings)) -> datasource.IData
     return settings.datasource.get_datasource()
 
 
+@lru_cache
+def get_async_database(
+    settings: Settings = Depends(get_settings),
+    sync_datasource: datasource.IDataSource = Depends(get_database),
+) -> datasource.AsyncIDataSource:
+    async_datasource = datasource.AsyncDataSourceAdapter(sync_datasource)
+    if settings.progress_flush_interval_seconds == 0:
+        return async_datasource
+    return datasource.WriteBehindDataSource(
+        async_datasource, flush_interval=settings.progress_flush_interval_seconds, logger=LOGGER
+    )
+
+
+@lru_cache
+def get_download_worker_pool(settings: Settings = Depends(get_settings)) -> workers.DownloadWorkerPool:
+    journal = None
+    if settings.download_journal_enabled:
+        journal = workers.DownloadJournal(Path(settings.storage.path) / workers.DOWNLOAD_JOURNAL_FILENAME)
+    return workers.DownloadWorkerPool(max_workers=settings.download_workers, logger=LOGGER, journal=journal)
+
+
+@lru_cache
+def get_event_loop_bridge() -> bridge.EventLoopBridge:
+    return bridge.EventLoopBridge(logger=LOGGER)
+
+
+@lru_cache
+def get_progress_coalescer(settings: Settings = Depends(get_settings)) -> ProgressCoalescer:
+    return ProgressCoalescer(max_updates_per_second=settings.progress_updates_per_second)
+
+
+@lru_cache
+def get_video_info_cache(settings: Settings = Depends(get_settings)) -> cache.VideoInfoCache:
+    return cache.VideoInfoCache(
+        ttl=settings.video_info_cache_ttl_seconds,
+        max_size=settings.video_info_cache_max_size,
+    )
+
+
+@lru_cache
+def get_video_info_extractor_pool(
+    settings: Settings = Depends(get_settings),
+    video_info_cache: cache.VideoInfoCache = Depends(get_video_info_cache),
+) -> workers.VideoInfoExtractorPool:
+    return workers.VideoInfoExtractorPool(
+        max_workers=settings.extractor_workers,
+        timeout=settings.extractor_timeout_seconds,
+        video_info_cache=video_info_cache,
+    )
+
+
+@lru_cache
 def get_storage(settings: Settings = Depends(get_settings)) -> storage.IStorage:
     return settings.storage.get_storage()
 
 
 def get_ytdlp_downloader(
-    datasource: datasource.IDataSource,
+    datasource: datasource.AsyncIDataSource,
     event_queue: queue.NotificationQueue,
     storage: storage.IStorage,
+    event_loop_bridge: bridge.EventLoopBridge | None = None,
+    coalescer: ProgressCoalescer | None = None,
+    video_info_cache: cache.VideoInfoCache | None = None,
 ):
-    on_download_started_hook = partial(on_download_start_callback, datasource=datasource, queue=event_queue)
+    on_download_started_hook = partial(
+        on_download_start_callback, datasource=datasource, queue=event_queue, coalescer=coalescer
+    )
     on_progress_hook = partial(on_ytdlp_progress_callback, datasource=datasource, queue=event_queue)
     on_finish_hook = partial(
         on_finish_callback,
@@ -52,27 +113,38 @@ def get_ytdlp_downloader(
         queue=event_queue,
         storage=storage,
         logger=LOGGER,
+        coalescer=coalescer,
     )
     on_error_hook = partial(
         on_error_callback,
         datasource=datasource,
         queue=event_queue,
         logger=LOGGER,
+        coalescer=coalescer,
     )
     return downloaders.YTDLPDownloader(
         on_download_started_callback=on_download_started_hook,
         on_progress_callback=on_progress_hook,
         on_finish_callback=on_finish_hook,
         on_error_callback=on_error_hook,
+        event_loop_bridge=event_loop_bridge,
+        video_info_cache=video_info_cache,
+        staging_dir=storage.staging_dir,
+        progress_coalescer=coalescer,
     )
 
 
 def get_pytube_downloader(
-    datasource: datasource.IDataSource,
+    datasource: datasource.AsyncIDataSource,
     event_queue: queue.NotificationQueue,
     storage: storage.IStorage,
+    event_loop_bridge: bridge.EventLoopBridge | None = None,
+    coalescer: ProgressCoalescer | None = None,
+    video_info_cache: cache.VideoInfoCache | None = None,
 ):
-    on_download_started_hook = partial(on_download_start_callback, datasource=datasource, queue=event_queue)
+    on_download_started_hook = partial(
+        on_download_start_callback, datasource=datasource, queue=event_queue, coalescer=coalescer
+    )
     on_progress_hook = partial(on_pytube_progress_callback, datasource=datasource, queue=event_queue)
     on_converting_hook = partial(on_start_converting, datasource=datasource, queue=event_queue)
     on_finish_hook = partial(
@@ -81,12 +153,14 @@ def get_pytube_downloader(
         queue=event_queue,
         storage=storage,
         logger=LOGGER,
+        coalescer=coalescer,
     )
     on_error_hook = partial(
         on_error_callback,
         datasource=datasource,
         queue=event_queue,
         logger=LOGGER,
+        coalescer=coalescer,
     )
     return downloaders.PytubeDownloader(
         on_download_started_callback=on_download_started_hook,
@@ -94,19 +168,26 @@ def get_pytube_downloader(
         on_converting_callback=on_converting_hook,
         on_finish_callback=on_finish_hook,
         on_error_callback=on_error_hook,
+        event_loop_bridge=event_loop_bridge,
+        video_info_cache=video_info_cache,
+        staging_dir=storage.staging_dir,
+        progress_coalescer=coalescer,
     )
 
 
 def get_downloader(
     settings: Settings = Depends(get_settings),
-    datasource: datasource.IDataSource = Depends(get_database),
+    datasource: datasource.AsyncIDataSource = Depends(get_async_database),
     event_queue: queue.NotificationQueue = Depends(get_notification_queue),
     storage: storage.IStorage = Depends(get_storage),
+    event_loop_bridge: bridge.EventLoopBridge = Depends(get_event_loop_bridge),
+    coalescer: ProgressCoalescer = Depends(get_progress_coalescer),
+    video_info_cache: cache.VideoInfoCache = Depends(get_video_info_cache),
 ) -> downloaders.IDownloader:
     if settings.downloader == DownloaderType.YTDLP:
-        return get_ytdlp_downloader(datasource, event_queue, storage)
+        return get_ytdlp_downloader(datasource, event_queue, storage, event_loop_bridge, coalescer, video_info_cache)
     elif settings.downloader == DownloaderType.PYTUBE:
-        return get_pytube_downloader(datasource, event_queue, storage)
+        return get_pytube_downloader(datasource, event_queue, storage, event_loop_bridge, coalescer, video_info_cache)
 
 
 def get_uid_dependency_factory(raise_error_on_empty: bool = False):
@@ -1,23 +1,34 @@
-import asyncio
 import tempfile
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from pathlib import Path
-from typing import Literal, Optional
+from typing import Any, Callable, Coroutine, Optional
 
 import ffmpeg
-from pytube import StreamQuery, YouTube
+from pytube import StreamQuery, YouTube, request
 from yt_dlp import YoutubeDL
 
+from .bridge import EventLoopBridge
+from .cache import VideoInfoCache
 from .callbacks import (
     OnDownloadFinishedCallback,
     OnDownloadStateChangedCallback,
     OnErrorCallback,
+    ProgressCoalescer,
     noop_callback,
 )
+from .constants import MediaFormat, MergeStrategy
 from .schemas.models import AudioStream, Download, VideoStream
 from .schemas.responses import VideoInfoResponse
 from .types import YoutubeURL
+from .utils import extract_percentage_progress
+
+# Codecs (video, audio) which can be copied into container without re-encoding.
+STREAM_COPY_CODECS: dict[MediaFormat, tuple[tuple[str, ...], tuple[str, ...]]] = {
+    MediaFormat.MP4: (("h264", "hevc", "av1", "vp9"), ("aac", "mp3", "alac")),
+}
 
 
 class IDownloader(ABC):
@@ -32,7 +43,15 @@ class IDownloader(ABC):
         on_converting_callback: Optional[OnDownloadStateChangedCallback] = None,
         on_finish_callback: Optional[OnDownloadFinishedCallback] = None,
         on_error_callback: Optional[OnErrorCallback] = None,
+        event_loop_bridge: Optional[EventLoopBridge] = None,
+        video_info_cache: Optional[VideoInfoCache] = None,
+        staging_dir: Optional[Path] = None,
+        progress_coalescer: Optional[ProgressCoalescer] = None,
     ):
+        self.event_loop_bridge = event_loop_bridge or EventLoopBridge()
+        self.video_info_cache = video_info_cache
+        self.progress_coalescer = progress_coalescer
+        self.staging_dir = staging_dir
         self.on_download_callback_start = on_download_started_callback or noop_callback
         self.on_progress_callback = on_progress_callback or noop_callback
         self.on_converting_callback = on_converting_callback or noop_callback
@@ -53,6 +72,42 @@ class IDownloader(ABC):
         """
         raise NotImplementedError()
 
+    def _report_progress(
+        self, download: Download, progress: int | None, callback: Callable[[], Coroutine[Any, Any, Any]]
+    ):
+        """
+        Submit progress callback to event loop from download thread. Progress is rate limited before
+        callback is created, so updates that would be dropped anyway don't cross to event loop thread.
+        """
+        if self.progress_coalescer is not None and not self.progress_coalescer.should_emit(download.media_id, progress):
+            return
+        self.event_loop_bridge.submit(callback())
+
+
+class _StreamsProgress:
+    """
+    Thread-safe progress of downloading several streams at once. `on_change` is called with new
+    percentage while holding lock, so progress is reported in increasing order.
+    """
+
+    def __init__(self, total_bytes: int, on_change: Callable[[int], None]):
+        self.total_bytes = total_bytes
+        self.on_change = on_change
+        self.downloaded_bytes = 0
+        self.percentage = 0
+        self._lock = threading.Lock()
+
+    def add(self, chunk_size: int):
+        """
+        Add size of downloaded chunk.
+        """
+        with self._lock:
+            self.downloaded_bytes += chunk_size
+            percentage = min(100, self.downloaded_bytes * 100 // self.total_bytes) if self.total_bytes else 0
+            if percentage != self.percentage:
+                self.percentage = percentage
+                self.on_change(percentage)
+
 
 class PytubeDownloader(IDownloader):
     """
@@ -60,6 +115,9 @@ class PytubeDownloader(IDownloader):
     """
 
     def get_video_info(self, url: YoutubeURL | str) -> VideoInfoResponse:
+        cached = self.video_info_cache.get(url) if self.video_info_cache else None
+        if cached is not None:
+            return cached.video_info
         video = YouTube(url)
         streams = video.streams.filter(is_dash=True).desc()
         audio_streams = [
@@ -82,35 +140,78 @@ class PytubeDownloader(IDownloader):
             video_streams=video_streams,
             duration=video.length,
         )
+        if self.video_info_cache:
+            self.video_info_cache.put(url, video_info, manifest=streams)
         return video_info
 
+    def _get_streams(self, url: YoutubeURL | str) -> StreamQuery:
+        """
+        Return DASH streams of video reusing manifest resolved by `get_video_info` if it is still cached.
+        """
+        cached = self.video_info_cache.get(url) if self.video_info_cache else None
+        if cached is not None and cached.manifest is not None:
+            return cached.manifest
+        return YouTube(url).streams.filter(is_dash=True).desc()
+
     def __download_stream(
         self,
         directory_to_download_to: Path,
-        stream_id: str | None,
+        stream_id: str,
         media_id: str,
         streams: StreamQuery,
-        downloaded_streams_aggregation: dict,
-        stream_type: Literal["audio", "video"],
-    ):
-        if stream_id is None:
-            return
+        progress: _StreamsProgress,
+    ) -> Path:
         stream = streams.get_by_itag(stream_id)
-        downloaded_stream_file_path = stream.download(
-            directory_to_download_to, filename_prefix=f"{stream_id}_{media_id}"
-        )
-        downloaded_streams_aggregation[stream_type] = Path(downloaded_stream_file_path)
+        downloaded_stream_file_path = directory_to_download_to / f"{stream_id}_{media_id}.{stream.subtype}"
+        with downloaded_stream_file_path.open("wb") as f:
+            for chunk in request.stream(stream.url):
+                f.write(chunk)
+                progress.add(len(chunk))
+        return downloaded_stream_file_path
+
+    def _probe_codec(self, stream_posix_path: str) -> str | None:
+        try:
+            probe = ffmpeg.probe(stream_posix_path)
+        except ffmpeg.Error:
+            return None
+        return next((stream.get("codec_name") for stream in probe["streams"]), None)
 
     def _merge_streams(
         self,
         video_stream_posix_path: str,
         audio_stream_posix_path: str,
         merged_streams_posix_path: str,
-    ):
+        media_format: MediaFormat = MediaFormat.MP4,
+    ) -> MergeStrategy:
+        """
+        Merge video and audio streams into single file. Streams are remuxed without re-encoding
+        when target container can hold their codecs and transcoded otherwise.
+        """
+        video_input = ffmpeg.input(video_stream_posix_path)
+        audio_input = ffmpeg.input(audio_stream_posix_path)
+        video_codecs, audio_codecs = STREAM_COPY_CODECS.get(media_format, ((), ()))
+        if self._probe_codec(video_stream_posix_path) in video_codecs:
+            copy_audio = self._probe_codec(audio_stream_posix_path) in audio_codecs
+            try:
+                (
+                    ffmpeg.output(
+                        video_input.video,
+                        audio_input.audio,
+                        merged_streams_posix_path,
+                        vcodec="copy",
+                        acodec="copy" if copy_audio else "aac",
+                    )
+                    .overwrite_output()
+                    .run(capture_stdout=True, capture_stderr=True)
+                )
+                return MergeStrategy.STREAM_COPY if copy_audio else MergeStrategy.VIDEO_COPY
+            except ffmpeg.Error:
+                # Falling back to full transcoding below.
+                pass
         (
             ffmpeg.concat(
-                ffmpeg.input(video_stream_posix_path),
-                ffmpeg.input(audio_stream_posix_path),
+                video_input,
+                audio_input,
                 a=1,
                 v=1,
             )
@@ -118,6 +219,7 @@ class PytubeDownloader(IDownloader):
             .overwrite_output()
             .run(capture_stdout=True, capture_stderr=True)
         )
+        return MergeStrategy.TRANSCODE
 
     def download(
         self,
@@ -127,58 +229,97 @@ class PytubeDownloader(IDownloader):
             self.on_progress_callback,
             download,
         )
-        kwargs = {
-            "on_progress_callback": lambda stream, chunk, bytes_remaining: asyncio.run(
-                on_progress_callback(stream=stream, chunk=chunk, bytes_remaining=bytes_remaining)
-            )
-        }
+
+        def on_progress(percentage: int):
+            self._report_progress(download, percentage, partial(on_progress_callback, progress=percentage))
+
         try:
-            asyncio.run(self.on_download_callback_start(download))
-            streams = YouTube(download.url, **kwargs).streams.filter(is_dash=True).desc()
-            downloaded_streams_file_paths: dict[str, Path] = {}
-            with tempfile.TemporaryDirectory() as tmpdir:
+            self.event_loop_bridge.run(self.on_download_callback_start(download))
+            streams = self._get_streams(download.url)
+            stream_ids = {"audio": download.audio_stream_id, "video": download.video_stream_id}
+            stream_ids = {stream_type: stream_id for stream_type, stream_id in stream_ids.items() if stream_id}
+            progress = _StreamsProgress(
+                sum(streams.get_by_itag(stream_id).filesize for stream_id in stream_ids.values()),
+                on_change=on_progress,
+            )
+            with tempfile.TemporaryDirectory(dir=self.staging_dir) as tmpdir:
                 directory_to_download_to = Path(tmpdir)
-                # Downloading audio stream if chosen
-                self.__download_stream(
-                    directory_to_download_to,
-                    download.audio_stream_id,
-                    download.media_id,
-                    streams,
-                    downloaded_streams_file_paths,
-                    "audio",
-                )
-                # Downloading video stream if chosen
-                self.__download_stream(
-                    directory_to_download_to,
-                    download.video_stream_id,
-                    download.media_id,
-                    streams,
-                    downloaded_streams_file_paths,
-                    "video",
-                )
+                # Downloading chosen audio and video streams concurrently
+                with ThreadPoolExecutor(max_workers=len(stream_ids), thread_name_prefix="ytdl-stream") as executor:
+                    futures = {
+                        stream_type: executor.submit(
+                            self.__download_stream,
+                            directory_to_download_to,
+                            stream_id,
+                            download.media_id,
+                            streams,
+                            progress,
+                        )
+                        for stream_type, stream_id in stream_ids.items()
+                    }
+                    downloaded_streams_file_paths = {
+                        stream_type: future.result() for stream_type, future in futures.items()
+                    }
                 # Converting to chosen format
-                asyncio.run(self.on_converting_callback(download))
+                self.event_loop_bridge.run(self.on_converting_callback(download))
                 converted_file_path = directory_to_download_to / download.storage_filename
-                self._merge_streams(
+                download.merge_strategy = self._merge_streams(
                     downloaded_streams_file_paths["video"].as_posix(),
                     downloaded_streams_file_paths["audio"].as_posix(),
                     converted_file_path.as_posix(),
+                    download.media_format,
                 )
                 # Finshing download process
-                asyncio.run(self.on_finish_callback(download, converted_file_path))
+                self.event_loop_bridge.run(self.on_finish_callback(download, converted_file_path))
                 return True
         except Exception as e:
             if self.on_error_callback:
-                asyncio.run(self.on_error_callback(download, e))
+                self.event_loop_bridge.run(self.on_error_callback(download, e))
             return False
 
 
+# Keys of info extracted by yt-dlp that `YoutubeDL.process_ie_result` needs to download video without extracting
+# it again. Rest of info (captions, thumbnails, heatmap etc.) often takes hundreds of KB per video, so it isn't cached.
+YTDLP_MANIFEST_KEYS = (
+    "_type",
+    "id",
+    "title",
+    "duration",
+    "thumbnail",
+    "webpage_url",
+    "webpage_url_basename",
+    "webpage_url_domain",
+    "extractor",
+    "extractor_key",
+    "http_headers",
+    "live_status",
+    "is_live",
+    "was_live",
+    "_has_drm",
+    "_format_sort_fields",
+    "formats",
+)
+
+
+def get_ytdlp_manifest(info: dict) -> dict:
+    """
+    Return part of info extracted by yt-dlp that is needed for downloading streams of video. Storyboard formats
+    (image fragments which are never downloaded) are left out.
+    """
+    manifest = {key: info[key] for key in YTDLP_MANIFEST_KEYS if key in info}
+    manifest["formats"] = [stream for stream in info.get("formats", []) if stream.get("protocol") != "mhtml"]
+    return YoutubeDL.sanitize_info(manifest, remove_private_keys=True)
+
+
 class YTDLPDownloader(IDownloader):
     """
     Downloader based on yt-dlp library https://github.com/yt-dlp/yt-dlp
     """
 
     def get_video_info(self, url: YoutubeURL | str) -> VideoInfoResponse:
+        cached = self.video_info_cache.get(url) if self.video_info_cache else None
+        if cached is not None:
+            return cached.video_info
         with YoutubeDL() as ydl:
             info = ydl.extract_info(url, download=False)
         streams = info["formats"]
@@ -202,7 +343,7 @@ class YTDLPDownloader(IDownloader):
             and stream.get("vcodec") != "none"
             and stream.get("format_note") is not None
         ]
-        return VideoInfoResponse(
+        video_info = VideoInfoResponse(
             url=info["webpage_url"],
             title=info["title"],
             duration=info["duration"],
@@ -210,20 +351,27 @@ class YTDLPDownloader(IDownloader):
             audio_streams=audio_streams,
             video_streams=video_streams,
         )
+        if self.video_info_cache:
+            self.video_info_cache.put(url, video_info, manifest=get_ytdlp_manifest(info))
+        return video_info
 
     def download(self, download: Download):
         on_progress_callback = partial(
             self.on_progress_callback,
             download=download,
         )
+
+        def on_progress(progress: dict):
+            percent_str = progress.get("_percent_str")
+            percentage = extract_percentage_progress(percent_str) if percent_str else None
+            self._report_progress(download, percentage, partial(on_progress_callback, progress))
+
         try:
-            asyncio.run(self.on_download_callback_start(download))
-            with tempfile.TemporaryDirectory() as tmpdir:
+            self.event_loop_bridge.run(self.on_download_callback_start(download))
+            with tempfile.TemporaryDirectory(dir=self.staging_dir) as tmpdir:
                 directory_to_download_to = Path(tmpdir)
                 download_options = {
-                    "progress_hooks": [
-                        lambda d: asyncio.run(on_progress_callback(d)),
-                    ],
+                    "progress_hooks": [on_progress],
                     "outtmpl": f"{directory_to_download_to.as_posix()}/{download.media_id}.%(ext)s",
                     "nomtime": True,  # do not use modification time fro original video
                 }
@@ -238,12 +386,20 @@ class YTDLPDownloader(IDownloader):
                 else:
                     download_options["format"] = f"{download.video_stream_id}+{download.audio_stream_id}"
                     download_options["merge_output_format"] = download.media_format
+                cached = self.video_info_cache.get(download.url) if self.video_info_cache else None
                 with YoutubeDL(download_options) as ydl:
-                    ydl.download([download.url])
+                    if cached is not None and cached.manifest is not None:
+                        # Processing copy of already extracted info instead of extracting it again (copy is needed
+                        # as yt-dlp modifies it, cached manifest holds only what's needed, so copying it is cheap).
+                        ydl.process_ie_result(
+                            ydl.sanitize_info(cached.manifest, remove_private_keys=True), download=True
+                        )
+                    else:
+                        ydl.download([download.url])
                 downloaded_file_path = directory_to_download_to / download.storage_filename
-                asyncio.run(self.on_finish_callback(download, downloaded_file_path))
+                self.event_loop_bridge.run(self.on_finish_callback(download, downloaded_file_path))
                 return True
         except Exception as e:
             if self.on_error_callback:
-                asyncio.run(self.on_error_callback(download, e))
+                self.event_loop_bridge.run(self.on_error_callback(download, e))
             return False
@@ -1,22 +1,35 @@
-import asyncio
 import mimetypes
+from typing import Any
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
-from fastapi.responses import StreamingResponse
-from sse_starlette.sse import EventSourceResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from starlette import status
+from starlette.concurrency import run_in_threadpool
 
-from . import config, datasource, dependencies, storage
-from .constants import DownloadStatus
-from .converters import create_download_from_download_params
+from . import config, datasource, dependencies, storage, workers
+from .constants import DownloadStatus, MediaOffloadMode
+from .converters import (
+    DOWNLOAD_RESPONSE_STREAMS_FIELDS,
+    create_download_from_download_params,
+    create_download_response,
+    get_download_response_fields,
+)
 from .downloaders import IDownloader
-from .queue import NotificationQueue
+from .queue import NotificationQueue, Resync
 from .schemas import requests, responses
+from .sse import EventStreamResponse
 from .types import YoutubeURL
-from .utils import get_content_disposition_header_value
+from .utils import (
+    decode_cursor,
+    encode_cursor,
+    get_content_disposition_header_value,
+    get_media_offload_header_value,
+)
 
 router = APIRouter(tags=["base"])
 
+MAX_DOWNLOADS_PAGE_SIZE = 500
+
 get_uid = dependencies.get_uid_dependency_factory()
 get_uid_or_403 = dependencies.get_uid_dependency_factory(raise_error_on_empty=True)
 
@@ -47,14 +60,83 @@ async def get_api_version(
     responses={status.HTTP_500_INTERNAL_SERVER_ERROR: {"model": responses.ErrorResponse}},
 )
 async def get_downloads(
+    cursor: str | None = Query(None, description="`nextCursor` value returned with previous page"),
+    limit: int | None = Query(None, ge=1, le=MAX_DOWNLOADS_PAGE_SIZE, description="Max number of downloads"),
+    fields: str | None = Query(
+        None,
+        description="Comma-separated list of download fields to return. Stream lists are returned only if requested.",
+        examples=["mediaId,title,status,videoStreams"],
+    ),
+    uid: str = Depends(get_uid_or_403),
+    datasource: datasource.AsyncIDataSource = Depends(dependencies.get_async_database),
+):
+    """
+    Endpoint for fetching list of downloaded videos for current client/user ordered by submission time.
+    """
+    try:
+        after = decode_cursor(cursor) if cursor else None
+        response_fields = get_download_response_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    # One more download is fetched to find out if there is next page.
+    downloads = await datasource.fetch_available_downloads(
+        uid,
+        after=after,
+        limit=limit + 1 if limit else None,
+        include_streams=not response_fields.isdisjoint(DOWNLOAD_RESPONSE_STREAMS_FIELDS),
+    )
+    has_next_page = limit is not None and len(downloads) > limit
+    downloads = downloads[:limit]
+    content: dict[str, Any] = {
+        "downloads": [create_download_response(download, response_fields) for download in downloads]
+    }
+    if has_next_page:
+        content["nextCursor"] = encode_cursor(downloads[-1].when_submitted, downloads[-1].media_id)
+    return JSONResponse(content)
+
+
+@router.get(
+    "/downloads/changes",
+    response_model=responses.DownloadsChangesResponse,
+    status_code=status.HTTP_200_OK,
+    responses={status.HTTP_500_INTERNAL_SERVER_ERROR: {"model": responses.ErrorResponse}},
+)
+async def get_downloads_changes(
+    since: int = Query(0, ge=0, description="Highest change sequence number (`seq`) client already knows"),
+    epoch: str | None = Query(None, description="Epoch of change sequence (`epoch`) returned with `since`"),
+    fields: str | None = Query(
+        None,
+        description="Comma-separated list of download fields to return. Stream lists are returned only if requested.",
+        examples=["mediaId,status,seq"],
+    ),
     uid: str = Depends(get_uid_or_403),
-    datasource: datasource.IDataSource = Depends(dependencies.get_database),
+    datasource: datasource.AsyncIDataSource = Depends(dependencies.get_async_database),
 ):
     """
-    Endpoint for fetching list of downloaded videos for current client/user.
+    Endpoint for fetching downloads of current client/user that changed since specific change sequence number.
+    Deleted downloads are returned too, so client can remove them from its list. If `since` comes from
+    another epoch of change sequence (e.g. in-memory data source was restarted), all downloads are returned
+    with `resync` flag, so client replaces its list.
     """
-    downloads = datasource.fetch_available_downloads(uid)
-    return {"downloads": downloads}
+    try:
+        response_fields = get_download_response_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    current_epoch, last_seq = await datasource.get_change_sequence()
+    resync = since > last_seq or (epoch is not None and epoch != current_epoch)
+    if resync:
+        since = 0
+    downloads = await datasource.fetch_changed_downloads(
+        uid, since, include_streams=not response_fields.isdisjoint(DOWNLOAD_RESPONSE_STREAMS_FIELDS)
+    )
+    return JSONResponse(
+        {
+            "downloads": [create_download_response(download, response_fields) for download in downloads],
+            "seq": downloads[-1].seq if downloads else since,
+            "epoch": current_epoch,
+            "resync": resync,
+        }
+    )
 
 
 @router.get(
@@ -66,12 +148,12 @@ async def get_downloads(
 async def preview(
     url: YoutubeURL,
     downloader: IDownloader = Depends(dependencies.get_downloader),
+    extractor: workers.VideoInfoExtractorPool = Depends(dependencies.get_video_info_extractor_pool),
 ):
     """
     Endpoint for getting info about video.
     """
-    download = downloader.get_video_info(url)
-    return download
+    return await extractor.get_video_info(downloader, url)
 
 
 @router.put(
@@ -82,28 +164,35 @@ async def preview(
 )
 async def submit_download(
     download_params: requests.DownloadParams,
-    background_tasks: BackgroundTasks,
     uid: str = Depends(get_uid_or_403),
-    datasource: datasource.IDataSource = Depends(dependencies.get_database),
+    datasource: datasource.AsyncIDataSource = Depends(dependencies.get_async_database),
     downloader: IDownloader = Depends(dependencies.get_downloader),
+    worker_pool: workers.DownloadWorkerPool = Depends(dependencies.get_download_worker_pool),
+    extractor: workers.VideoInfoExtractorPool = Depends(dependencies.get_video_info_extractor_pool),
 ):
     """
     Endpoint for fetching video from Youtube and converting it to
     specified format.
     """
-    download = create_download_from_download_params(uid, download_params, downloader)
-    datasource.put_download(download)
-    background_tasks.add_task(downloader.download, download)
+    video_info = await extractor.get_video_info(downloader, download_params.url)
+    download = create_download_from_download_params(uid, download_params, video_info)
+    await datasource.put_download(download)
+    await run_in_threadpool(worker_pool.submit, downloader, download)
     return responses.SubmitDownloadResponse(media_id=download.media_id, when_submitted=download.when_submitted)
 
 
-@router.get(
+@router.api_route(
     "/download",
+    methods=["GET", "HEAD"],
     responses={
         status.HTTP_200_OK: {
             "content": {"application/octet-stream": {}},
             "description": "Downloaded media file",
         },
+        status.HTTP_206_PARTIAL_CONTENT: {
+            "content": {"application/octet-stream": {}},
+            "description": "Requested byte range of downloaded media file",
+        },
         status.HTTP_404_NOT_FOUND: {
             "content": {"application/json": {}},
             "model": responses.ErrorResponse,
@@ -113,15 +202,19 @@ async def submit_download(
     },
 )
 async def download_file(
+    request: Request,
     media_id: str = Query(..., alias="mediaId", description="Download id"),
     uid: str = Depends(dependencies.get_uid_dependency_factory(raise_error_on_empty=True)),
-    datasource: datasource.IDataSource = Depends(dependencies.get_database),
+    datasource: datasource.AsyncIDataSource = Depends(dependencies.get_async_database),
     storage: storage.IStorage = Depends(dependencies.get_storage),
+    settings: config.Settings = Depends(dependencies.get_settings),
 ):
     """
-    Endpoint for downloading fetched video from Youtube.
+    Endpoint for downloading fetched video from Youtube. Supports `HEAD` requests and
+    `Range` header for files kept in local storage. If media offload is enabled, sending
+    of local file is delegated to reverse proxy with internal redirect header.
     """
-    media_file = datasource.get_download(uid, media_id)
+    media_file = await datasource.get_download(uid, media_id)
     if media_file is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Download not found")
     if media_file.status not in (DownloadStatus.FINISHED, DownloadStatus.DOWNLOADED):
@@ -131,37 +224,76 @@ async def download_file(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Download is finished but file not found",
         )
-    bytes_stream = storage.get_download(media_file.file_path)
-    datasource.mark_as_downloaded(media_file)
+    media_type = mimetypes.guess_type(media_file.filename)[0]
+    file_path = storage.get_download_path(media_file.file_path)
+    bytes_stream = storage.get_download(media_file.file_path) if file_path is None else None
+    if file_path is None and bytes_stream is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Download is finished but file not found",
+        )
+    if request.method != "HEAD":
+        await datasource.mark_as_downloaded(media_file)
+    if file_path is not None and settings.media_offload != MediaOffloadMode.NONE:
+        offload_header_value = get_media_offload_header_value(
+            settings.media_offload, file_path, settings.storage.path, settings.media_offload_location
+        )
+        return Response(
+            media_type=media_type,
+            headers={
+                "content-disposition": get_content_disposition_header_value(media_file.filename),
+                settings.media_offload.header: offload_header_value,
+            },
+        )
+    if file_path is not None:
+        return FileResponse(file_path, media_type=media_type, filename=media_file.filename)
     return StreamingResponse(
         bytes_stream,
-        media_type=mimetypes.guess_type(media_file.filename)[0],
+        media_type=media_type,
         headers={"content-disposition": get_content_disposition_header_value(media_file.filename)},
     )
 
 
-@router.get("/download/stream", response_class=EventSourceResponse)
+@router.get("/download/stream", response_class=EventStreamResponse)
 async def fetch_stream(
-    request: Request,
     uid: str = Depends(get_uid_or_403),
+    last_event_id: str | None = Header(None, alias="Last-Event-ID"),
+    last_event_id_query: str | None = Query(
+        None, alias="lastEventId", description="ID of last received event if `Last-Event-ID` header can't be set"
+    ),
+    batch: bool = Query(False, description="Send notifications collected within short window as single array"),
     event_queue: NotificationQueue = Depends(dependencies.get_notification_queue),
+    settings: config.Settings = Depends(dependencies.get_settings),
 ):
     """
-    SSE endpoint for recieving download status of media items.
+    SSE endpoint for recieving download status of media items. Every open connection of client receives
+    every notification. Reconnecting client receives notifications it missed after `Last-Event-ID`; if
+    they are no longer available it receives `resync` event and should fetch downloads again.
+    Subscription is closed as soon as client disconnects.
+
+    In batch mode notifications published within `SSE_BATCH_WINDOW_SECONDS` are sent as single event
+    with array of statuses, so busy clients get fewer and larger writes.
     """
 
     async def _stream():
-        while True:
-            if await request.is_disconnected():
-                break
-            try:
-                data = await event_queue.get(uid)
-            except asyncio.QueueEmpty:
-                continue
-            else:
-                yield data.json(exclude={"key"}, by_alias=True)
+        with event_queue.subscribe(uid, last_event_id or last_event_id_query) as subscriber:
+            while True:
+                if batch:
+                    notifications = await subscriber.get_batch(settings.sse_batch_window_seconds)
+                else:
+                    notifications = [await subscriber.get()]
+                resync = notifications.pop() if isinstance(notifications[-1], Resync) else None
+                if batch and notifications:
+                    # Notifications are already serialized, so array is joined without serializing them again.
+                    data = ",".join(notification.data for notification in notifications)
+                    yield {"id": notifications[-1].id, "data": f"[{data}]"}
+                else:
+                    for notification in notifications:
+                        yield {"id": notification.id, "data": notification.data}
+                if resync is not None:
+                    yield {"id": resync.id, "event": "resync", "data": "{}"}
 
-    return EventSourceResponse(_stream())
+    return EventStreamResponse(_stream(), heartbeat_interval=settings.sse_heartbeat_interval_seconds)
 
 
 @router.delete(
@@ -187,13 +319,13 @@ async def fetch_stream(
 async def delete_download(
     media_id: str = Query(..., alias="mediaId", description="Download id"),
     uid: str = Depends(get_uid_or_403),
-    datasource: datasource.IDataSource = Depends(dependencies.get_database),
+    datasource: datasource.AsyncIDataSource = Depends(dependencies.get_async_database),
     storage: storage.IStorage = Depends(dependencies.get_storage),
 ):
     """
     Endpoint for deleting downloaded media.
     """
-    media_file = datasource.get_download(uid, media_id)
+    media_file = await datasource.get_download(uid, media_id)
     if media_file is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Download not found")
     if media_file.status not in (
@@ -205,7 +337,7 @@ async def delete_download(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Media file is not downloaded yet",
         )
-    datasource.delete_download(media_file)
+    await datasource.delete_download(media_file)
     if media_file.status != DownloadStatus.FAILED:
         storage.remove_download(media_file.file_path)
     return responses.DeleteResponse(
@@ -236,16 +368,16 @@ async def delete_download(
     },
 )
 async def retry_download(
-    background_tasks: BackgroundTasks,
     media_id: str = Query(..., alias="mediaId", description="Download id"),
     uid: str = Depends(get_uid_or_403),
-    datasource: datasource.IDataSource = Depends(dependencies.get_database),
+    datasource: datasource.AsyncIDataSource = Depends(dependencies.get_async_database),
     downloader: IDownloader = Depends(dependencies.get_downloader),
+    worker_pool: workers.DownloadWorkerPool = Depends(dependencies.get_download_worker_pool),
 ):
     """
     Endpoint for retrying failed media download.
     """
-    download = datasource.get_download(uid, media_id)
+    download = await datasource.get_download(uid, media_id)
     if download is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Download not found")
     if download.status not in (DownloadStatus.FAILED, DownloadStatus.STARTED):
@@ -254,8 +386,8 @@ async def retry_download(
             detail="Download cannot be retried",
         )
     download.status = DownloadStatus.STARTED
-    datasource.update_download(download)
-    background_tasks.add_task(downloader.download, download)
+    await datasource.patch_download(download.media_id, status=download.status)
+    await run_in_threadpool(worker_pool.submit, downloader, download)
     return status.HTTP_200_OK
 
 
@@ -263,3 +395,20 @@ async def retry_download(
 async def health():
     """Liveness probe for container orchestration health checks."""
     return {"status": "ok"}
+
+
+@router.get(
+    "/metrics",
+    response_model=responses.MetricsResponse,
+    status_code=status.HTTP_200_OK,
+    include_in_schema=False,
+)
+async def metrics(
+    worker_pool: workers.DownloadWorkerPool = Depends(dependencies.get_download_worker_pool),
+    extractor: workers.VideoInfoExtractorPool = Depends(dependencies.get_video_info_extractor_pool),
+    event_queue: NotificationQueue = Depends(dependencies.get_notification_queue),
+):
+    """Internal metrics of download queue, video info extractor and notification queue."""
+    return responses.MetricsResponse(
+        download_queue=worker_pool.metrics(), extractor=extractor.metrics(), notifications=event_queue.metrics()
+    )
@@ -11,12 +11,19 @@ from starlette.status import (
     HTTP_403_FORBIDDEN,
     HTTP_422_UNPROCESSABLE_ENTITY,
     HTTP_500_INTERNAL_SERVER_ERROR,
+    HTTP_504_GATEWAY_TIMEOUT,
 )
 from yt_dlp.utils import DownloadError
 
 from .types import YOUTUBE_REGEX
 
 
+class VideoInfoExtractionTimeout(Exception):
+    """
+    Raised when fetching info about video takes longer than configured timeout.
+    """
+
+
 def make_internal_error(
     error_code: str = "internal-server-error",
     detail: str = "Remote server encountered problem, please try again...",
@@ -89,6 +96,15 @@ async def yt_dlp_exception_handler(logger: Logger, request: Request, exc: Except
     )
 
 
+async def on_video_info_extraction_timeout(logger: Logger, request: Request, exc: VideoInfoExtractionTimeout):
+    logger.error(f"Fetching info about video {exc.args[0]} timed out.")
+    return make_internal_error(
+        "extraction-timeout",
+        "Fetching info about video took too long. Please try again later",
+        HTTP_504_GATEWAY_TIMEOUT,
+    )
+
+
 async def validation_exception_handler(logger: Logger, request: Request, exc: RequestValidationError):
     # Custom exception handling for youtube video link validation just because you
     # cannot specify custom error messages in Pydantic type.
@@ -111,5 +127,6 @@ ERROR_HANDLERS = (
     (RegexMatchError, on_pytube_regexmatch_error),
     (VideoPrivate, on_pytube_videoprivate_error),
     (DownloadError, yt_dlp_exception_handler),
+    (VideoInfoExtractionTimeout, on_video_info_extraction_timeout),
     (Exception, on_default_exception_handler),
 )
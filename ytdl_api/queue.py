@@ -1,17 +1,267 @@
 import asyncio
-import typing
-from collections import defaultdict
+import secrets
+import time
+from bisect import bisect_left
+from collections import deque
+from dataclasses import dataclass, field
+from operator import attrgetter
 
+from .constants import DownloadStatus
 from .schemas.models import DownloadStatusInfo
+from .schemas.responses import NotificationQueueMetrics
+
+
+@dataclass(slots=True)
+class Notification:
+    """
+    Notification stored in client's ring buffer. Same instance is read by all subscribers of client
+    and it is serialized only once.
+    """
+
+    seq: int
+    # Event ID sent to client which it sends back as `Last-Event-ID` when reconnecting.
+    id: str
+    status_info: DownloadStatusInfo
+    _data: str | None = field(default=None, repr=False)
+
+    @property
+    def data(self) -> str:
+        if self._data is None:
+            self._data = self.status_info.model_dump_json(exclude={"key"}, by_alias=True)
+        return self._data
+
+
+@dataclass(slots=True)
+class Resync:
+    """
+    Marker for subscriber that missed notifications which are no longer buffered, so client has to fetch
+    downloads again. Subscriber continues with notifications published after `seq`.
+    """
+
+    seq: int
+    id: str
+
+
+class ClientEventBuffer:
+    """
+    Bounded ring buffer of notifications for single client which is shared by all its subscribers.
+    Notifications are numbered with increasing sequence numbers and subscribers keep their own cursor.
+    Newer progress of download replaces previous one, so only the latest progress of download takes slot
+    in buffer, while state transitions are always delivered. Once buffer holds `max_size` notifications
+    the oldest one is dropped.
+
+    Event IDs consist of random buffer generation and sequence number, so ID issued by evicted buffer
+    or by previous process is never mistaken for ID issued by current buffer.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.generation = secrets.token_hex(4)
+        self.subscribers = 0
+        self.last_active = time.monotonic()
+        # Highest sequence number delivered to any subscriber.
+        self.delivered_seq = 0
+        self._notifications: deque[Notification] = deque()
+        self._next_seq = 1
+        # Highest sequence number of notification dropped because buffer was full.
+        self.dropped_seq = 0
+        # Latest progress notifications of downloads that can be superseded by newer progress.
+        self._progress: dict[str, Notification] = {}
+        self._published = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._notifications)
+
+    @property
+    def next_seq(self) -> int:
+        return self._next_seq
+
+    def is_dropped(self, cursor: int) -> bool:
+        """
+        Return True if notification that reader at `cursor` hasn't read yet was dropped from buffer.
+        """
+        return cursor <= self.dropped_seq
+
+    def get_event_id(self, seq: int) -> str:
+        return f"{self.generation}-{seq}"
+
+    def parse_event_id(self, event_id: str) -> int | None:
+        """
+        Return sequence number of event ID issued by this buffer or None if it was issued by other buffer.
+        """
+        generation, _, seq = event_id.strip().partition("-")
+        if generation != self.generation or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def publish(self, status_info: DownloadStatusInfo) -> Notification:
+        notification = Notification(self._next_seq, self.get_event_id(self._next_seq), status_info)
+        self._next_seq += 1
+        if status_info.status == DownloadStatus.DOWNLOADING:
+            previous = self._progress.get(status_info.media_id)
+            if previous is not None:
+                del self._notifications[self._index(previous.seq)]
+            self._progress[status_info.media_id] = notification
+        else:
+            # Progress reported after state transition must not replace progress published before it.
+            self._progress.pop(status_info.media_id, None)
+        self._notifications.append(notification)
+        if len(self._notifications) > self.max_size:
+            dropped = self._notifications.popleft()
+            self.dropped_seq = dropped.seq
+            if self._progress.get(dropped.status_info.media_id) is dropped:
+                del self._progress[dropped.status_info.media_id]
+        # Every waiting subscriber is woken up and new event is used for next publish.
+        self._published.set()
+        self._published = asyncio.Event()
+        return notification
+
+    def read(self, cursor: int) -> Notification | None:
+        """
+        Return first notification at or after `cursor`.
+        """
+        index = self._index(cursor)
+        return self._notifications[index] if index < len(self._notifications) else None
+
+    async def wait(self, cursor: int):
+        """
+        Wait until notification at `cursor` is published.
+        """
+        while cursor >= self._next_seq:
+            await self._published.wait()
+
+    def is_idle(self, ttl: float, now: float) -> bool:
+        return self.subscribers == 0 and now - self.last_active >= ttl
+
+    def _index(self, seq: int) -> int:
+        # Replaced progress leaves gaps in sequence numbers, so notification is looked up by binary search.
+        return bisect_left(self._notifications, seq, key=attrgetter("seq"))
+
+
+class Subscriber:
+    """
+    Single reader (e.g. SSE connection) of client's notifications. Should be closed once reader is gone,
+    can be used as context manager.
+
+    Reader that reconnects passes ID of last event it received and gets notifications published after it.
+    If some of them are no longer buffered (or ID is unknown) it gets `Resync` marker instead.
+    """
+
+    def __init__(self, buffer: ClientEventBuffer, last_event_id: str | None = None):
+        self.buffer = buffer
+        self.closed = False
+        self._resync = False
+        if last_event_id:
+            last_seq = buffer.parse_event_id(last_event_id)
+            if last_seq is None or last_seq >= buffer.next_seq:
+                self._resync = True
+                self.cursor = buffer.next_seq
+            else:
+                # Missed notifications may have been dropped already, which is detected on first read.
+                self.cursor = last_seq + 1
+        else:
+            # Notifications published while no one was listening are delivered to the first subscriber.
+            self.cursor = max(buffer.delivered_seq + 1, buffer.dropped_seq + 1)
+        buffer.subscribers += 1
+        buffer.last_active = time.monotonic()
+
+    def get_nowait(self) -> Notification | Resync:
+        if self._resync or self.buffer.is_dropped(self.cursor):
+            # Notifications that weren't read are lost, so reading continues with new ones.
+            self._resync = False
+            self.cursor = self.buffer.next_seq
+            return Resync(self.cursor - 1, self.buffer.get_event_id(self.cursor - 1))
+        notification = self.buffer.read(self.cursor)
+        if notification is None:
+            self.cursor = self.buffer.next_seq
+            raise asyncio.QueueEmpty()
+        self.cursor = notification.seq + 1
+        self.buffer.delivered_seq = max(self.buffer.delivered_seq, notification.seq)
+        return notification
+
+    async def get(self) -> Notification | Resync:
+        while True:
+            try:
+                return self.get_nowait()
+            except asyncio.QueueEmpty:
+                await self.buffer.wait(self.cursor)
+
+    async def get_batch(self, window: float) -> list[Notification | Resync]:
+        """
+        Wait for notification and return it together with notifications published within `window` seconds
+        after it. Progress replaced within window isn't returned. If notifications were lost, batch ends
+        with `Resync` marker.
+        """
+        batch: list[Notification | Resync] = []
+        while not batch:
+            if not self._resync and not self.buffer.is_dropped(self.cursor):
+                await self.buffer.wait(self.cursor)
+                await asyncio.sleep(window)
+            while not batch or not isinstance(batch[-1], Resync):
+                try:
+                    batch.append(self.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+        return batch
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.buffer.subscribers -= 1
+            self.buffer.last_active = time.monotonic()
+
+    def __enter__(self) -> "Subscriber":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
 
 class NotificationQueue:
-    queues: typing.Dict[str, asyncio.Queue] = defaultdict(asyncio.Queue)
+    """
+    Pub/sub hub of download status notifications. Notifications of client are published to its bounded
+    `ClientEventBuffer` and every subscriber of client (e.g. every open tab) reads all of them. Buffer is
+    evicted once it has no subscribers for `ttl` seconds, so memory doesn't grow with clients that
+    went away while their downloads kept going.
+    """
 
-    async def get(self, client_id: str) -> DownloadStatusInfo:
-        queue = self.queues[client_id]
-        return await queue.get()
+    def __init__(self, max_size: int = 100, ttl: float = 600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.buffers: dict[str, ClientEventBuffer] = {}
+        self._last_eviction = time.monotonic()
+
+    def subscribe(self, client_id: str, last_event_id: str | None = None) -> Subscriber:
+        return Subscriber(self._get_buffer(client_id), last_event_id)
 
     async def put(self, client_id: str, download_progress: DownloadStatusInfo):
-        queue = self.queues[client_id]
-        return await queue.put(download_progress)
+        self._get_buffer(client_id).publish(download_progress)
+
+    def metrics(self) -> NotificationQueueMetrics:
+        return NotificationQueueMetrics(
+            clients=len(self.buffers),
+            connections=sum(buffer.subscribers for buffer in self.buffers.values()),
+            buffered=sum(len(buffer) for buffer in self.buffers.values()),
+        )
+
+    def evict_idle(self, now: float | None = None) -> int:
+        """
+        Remove buffers of clients that have no subscribers for `ttl` seconds. Returns number of
+        removed buffers.
+        """
+        now = time.monotonic() if now is None else now
+        self._last_eviction = now
+        idle = [client_id for client_id, buffer in self.buffers.items() if buffer.is_idle(self.ttl, now)]
+        for client_id in idle:
+            del self.buffers[client_id]
+        return len(idle)
+
+    def _get_buffer(self, client_id: str) -> ClientEventBuffer:
+        # Idle buffers are looked for at most once per TTL, so eviction cost is amortized across calls.
+        now = time.monotonic()
+        if now - self._last_eviction >= self.ttl:
+            self.evict_idle(now)
+        buffer = self.buffers.get(client_id)
+        if buffer is None:
+            buffer = self.buffers[client_id] = ClientEventBuffer(self.max_size)
+        return buffer
@@ -2,7 +2,7 @@ import datetime
 
 from pydantic import AnyHttpUrl, Field
 
-from ..constants import DownloadStatus, MediaFormat
+from ..constants import DownloadStatus, MediaFormat, MergeStrategy
 from ..types import YoutubeURL
 from ..utils import get_datetime_now, get_unique_id
 from .base import BaseModel_
@@ -28,6 +28,9 @@ class Download(BaseModel_):
     url: YoutubeURL = Field(..., description="URL of video")
     video_streams: list[VideoStream] = Field(description="List of video streams", default_factory=list)
     audio_streams: list[AudioStream] = Field(description="List of audio streams", default_factory=list)
+    manifest_id: str | None = Field(
+        None, description="Canonical video ID of streams manifest shared by downloads of the same video"
+    )
     video_stream_id: str | None = Field(None, description="Video stream ID (downloaded)")
     audio_stream_id: str | None = Field(None, description="Audio stream ID (downloaded)")
     media_format: MediaFormat = Field(
@@ -41,6 +44,9 @@ class Download(BaseModel_):
     status: DownloadStatus = Field(DownloadStatus.STARTED, description="Download status")
     file_path: str | None = Field(None, description="Path to file")
     progress: int = Field(0, description="Download progress in %")
+    merge_strategy: MergeStrategy | None = Field(
+        None, description="How downloaded audio and video streams were merged into single file"
+    )
     when_submitted: datetime.datetime = Field(
         default_factory=get_datetime_now,
         description="Date & time in UTC when download was submitted to API.",
@@ -60,6 +66,7 @@ class Download(BaseModel_):
     when_failed: datetime.datetime | None = Field(
         None, description="Date & time in UTC when error occured during download."
     )
+    seq: int = Field(0, description="Change sequence number assigned by data source on last change of download")
 
     @property
     def key(self) -> str:
@@ -83,6 +90,11 @@ class Download(BaseModel_):
         return f"{self.title}.{self.media_format}"
 
 
+class StreamManifest(BaseModel_):
+    video_streams: list[VideoStream] = Field(description="List of video streams", default_factory=list)
+    audio_streams: list[AudioStream] = Field(description="List of audio streams", default_factory=list)
+
+
 class DownloadStatusInfo(BaseModel_):
     key: str = Field(..., description="Unique key used in database.")
     title: str = Field(..., description="Video/audio title")
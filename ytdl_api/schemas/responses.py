@@ -49,6 +49,7 @@ class DownloadResponse(BaseModel_):
     when_deleted: datetime.datetime | None = Field(
         None, description="Date & time in UTC when download was soft-deleted."
     )
+    seq: int = Field(0, description="Change sequence number of last change of download.")
 
 
 class SubmitDownloadResponse(BaseModel_):
@@ -62,7 +63,30 @@ class SubmitDownloadResponse(BaseModel_):
 class DownloadsResponse(BaseModel_):
     downloads: list[DownloadResponse] = Field(
         ...,
-        description="list of pending and finished downloads",
+        description="list of pending and finished downloads (only requested fields are returned)",
+    )
+    next_cursor: str | None = Field(
+        None,
+        description="Cursor for fetching next page of downloads. Absent if there are no more downloads.",
+    )
+
+
+class DownloadsChangesResponse(BaseModel_):
+    downloads: list[DownloadResponse] = Field(
+        ...,
+        description="list of downloads (including deleted ones) that changed since requested change sequence number",
+    )
+    seq: int = Field(
+        ...,
+        description="Change sequence number to request next changes since.",
+    )
+    epoch: str = Field(
+        ...,
+        description="Epoch of change sequence to request next changes with.",
+    )
+    resync: bool = Field(
+        False,
+        description="Whether requested change sequence number is from another epoch and all downloads are returned.",
     )
 
 
@@ -87,3 +111,34 @@ class VideoInfoResponse(BaseModel_):
     audio_streams: list[AudioStream] = Field([], description="Available audio streams")
     video_streams: list[VideoStream] = Field([], description="Available video streams")
     media_formats: list[MediaFormat] = Field(list(MediaFormat), description="Available media formats")
+
+
+class DownloadWorkerPoolMetrics(BaseModel_):
+    workers: int = Field(..., description="Number of download slots")
+    active: int = Field(..., description="Number of downloads currently running")
+    pending: int = Field(..., description="Number of downloads waiting for free slot")
+    submitted: int = Field(..., description="Total number of submitted downloads")
+    completed: int = Field(..., description="Total number of successfully finished downloads")
+    failed: int = Field(..., description="Total number of failed downloads")
+    avg_wait_time: float = Field(..., description="Average time (in seconds) download waited in queue")
+    max_wait_time: float = Field(..., description="Maximum time (in seconds) download waited in queue")
+
+
+class VideoInfoExtractorPoolMetrics(BaseModel_):
+    workers: int = Field(..., description="Number of extractor slots")
+    active: int = Field(..., description="Number of extractions currently running")
+    pending: int = Field(..., description="Number of extractions waiting for free slot")
+    timeouts: int = Field(..., description="Total number of extractions that timed out")
+    saturation: float = Field(..., description="Ratio of running and waiting extractions to number of slots")
+
+
+class NotificationQueueMetrics(BaseModel_):
+    clients: int = Field(..., description="Number of clients with notification buffer")
+    connections: int = Field(..., description="Number of live SSE connections")
+    buffered: int = Field(..., description="Number of notifications held in buffers")
+
+
+class MetricsResponse(BaseModel_):
+    download_queue: DownloadWorkerPoolMetrics = Field(..., description="Download worker pool metrics")
+    extractor: VideoInfoExtractorPoolMetrics = Field(..., description="Video info extractor pool metrics")
+    notifications: NotificationQueueMetrics = Field(..., description="Notification queue metrics")
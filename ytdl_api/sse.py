@@ -0,0 +1,31 @@
+import asyncio
+
+from sse_starlette.sse import EventSourceResponse
+from starlette.types import Receive, Scope, Send
+
+HEARTBEAT = b": heartbeat\r\n\r\n"
+
+
+class EventStreamResponse(EventSourceResponse):
+    """
+    EventSourceResponse that sends heartbeat comments (ignored by EventSource) instead of `ping` events.
+
+    Stream is raced against disconnect of client: once client goes away its pending wait for next event
+    is cancelled and stream is closed right away, so resources it holds (e.g. subscription) are released
+    without waiting for next event or garbage collection. Writing heartbeats to connection that was dropped
+    without closing makes server notice it as well.
+    """
+
+    def __init__(self, content, heartbeat_interval: float = EventSourceResponse.DEFAULT_PING_INTERVAL, **kwargs):
+        super().__init__(content, ping=heartbeat_interval, **kwargs)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+
+    async def _ping(self, send: Send) -> None:
+        while self.active:
+            await asyncio.sleep(self.ping_interval)
+            await send({"type": "http.response.body", "body": HEARTBEAT, "more_body": True})
@@ -1,5 +1,8 @@
 import abc
+import errno
+import os
 import shutil
+from functools import partial
 from pathlib import Path
 from typing import Iterator
 
@@ -11,6 +14,22 @@ class IStorage(abc.ABC):
     Base interface for storage class that manages downloaded file.
     """
 
+    @property
+    def staging_dir(self) -> Path | None:
+        """
+        Directory where downloads should be written before being saved to storage. Storage can
+        provide directory which allows saving files without copying them. `None` means system's
+        temporary directory.
+        """
+        return None
+
+    def clear_staging_dir(self):
+        """
+        Remove downloads left in staging directory by process that was stopped while they were written.
+        Must be called only while no download is running.
+        """
+        pass
+
     @abc.abstractmethod
     def save_download_from_file(self, download: Download, path: Path) -> str:  # pragma: no cover
         raise NotImplementedError
@@ -19,6 +38,13 @@ class IStorage(abc.ABC):
     def get_download(self, storage_file_name: str) -> Iterator[bytes] | None:  # pragma: no cover
         raise NotImplementedError
 
+    def get_download_path(self, storage_file_name: str) -> Path | None:
+        """
+        Return path to download file on local filesystem if storage keeps files there, so file
+        can be served directly (with range requests and zero-copy transfer). `None` otherwise.
+        """
+        return None
+
     @abc.abstractmethod
     def remove_download(self, storage_file_name: str):  # pragma: no cover
         raise NotImplementedError
@@ -28,9 +54,12 @@ class IStorage(abc.ABC):
         raise NotImplementedError
 
 
-def _read_file_at_chunks(file: Path) -> Iterator[bytes]:
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def _read_file_at_chunks(file: Path, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
     with file.open(mode="rb") as f:
-        yield from f
+        yield from iter(partial(f.read, chunk_size), b"")
 
 
 class LocalFileStorage(IStorage):
@@ -38,12 +67,37 @@ class LocalFileStorage(IStorage):
     Storage that saves downloaded files to host's filesystem.
     """
 
+    STAGING_DIR_NAME = ".staging"
+
     def __init__(self, downloads_dir: Path) -> None:
         self.dowloads_dir = downloads_dir
+        # Staging directory lives on the same filesystem as downloads so files can be renamed into place.
+        self._staging_dir = Path(downloads_dir) / self.STAGING_DIR_NAME
+        self._staging_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def staging_dir(self) -> Path:
+        return self._staging_dir
+
+    def clear_staging_dir(self):
+        for path in self._staging_dir.iterdir():
+            if path.is_dir() and not path.is_symlink():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
 
     def save_download_from_file(self, download: Download, path: Path) -> str:
+        """
+        Move downloaded file into storage. File is renamed if it is on the same filesystem
+        and copied otherwise.
+        """
         dest_path = self.dowloads_dir / download.storage_filename
-        shutil.copy(path, dest_path)
+        try:
+            os.replace(path, dest_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.copy(path, dest_path)
         return dest_path.as_posix()
 
     def get_download(self, storage_file_name: str) -> Iterator[bytes] | None:
@@ -52,6 +106,12 @@ class LocalFileStorage(IStorage):
             return None
         return _read_file_at_chunks(download_file)
 
+    def get_download_path(self, storage_file_name: str) -> Path | None:
+        download_file = self.dowloads_dir / Path(storage_file_name)
+        if not download_file.is_file():
+            return None
+        return download_file
+
     def remove_download(self, storage_file_name: str):
         download_file = self.dowloads_dir / Path(storage_file_name)
         if download_file.exists():
@@ -19,6 +19,23 @@ def _get_clear_video_url(url_str: str) -> str:
     return url_str
 
 
+def get_video_id(url_str: str) -> str:
+    """
+    Return canonical YouTube video ID for URL, so different links to the same video share it.
+    Unrecognized URLs are returned as is.
+    """
+    url = urllib.parse.urlparse(url_str if "://" in url_str else f"https://{url_str}")
+    query_params = urllib.parse.parse_qs(url.query)
+    if "v" in query_params:
+        return query_params["v"][0]
+    path_parts = [part for part in url.path.split("/") if part]
+    if url.netloc.endswith("youtu.be") and path_parts:
+        return path_parts[0]
+    if len(path_parts) >= 2 and path_parts[0] in ("embed", "v", "shorts", "live"):
+        return path_parts[1]
+    return url_str
+
+
 YoutubeURL = Annotated[
     str,
     StringConstraints(strip_whitespace=True, pattern=YOUTUBE_REGEX),
@@ -1,4 +1,6 @@
 import asyncio
+import base64
+import json
 import logging
 import re
 import uuid
@@ -11,6 +13,8 @@ import humanize
 from croniter import croniter
 from starlette.concurrency import run_in_threadpool
 
+from .constants import MediaOffloadMode
+
 LOGGER = logging.getLogger("uvicorn")
 
 PROGRESS_PATTERN = re.compile(r"(\d+.?\d+)?%")
@@ -54,6 +58,42 @@ def get_content_disposition_header_value(filename: str) -> str:
     return content_disposition
 
 
+def encode_cursor(when_submitted: datetime, media_id: str) -> str:
+    """
+    Encode position in list of downloads ordered by submission time as opaque URL-safe string.
+    """
+    return base64.urlsafe_b64encode(json.dumps([when_submitted.isoformat(), media_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """
+    Decode cursor created by `encode_cursor`. Raises ValueError if cursor is malformed. Submission time
+    is returned as timezone-aware UTC datetime like stored ones (naive one is considered to be in UTC),
+    so it can be compared with them.
+    """
+    try:
+        when_submitted, media_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        when_submitted = datetime.fromisoformat(when_submitted)
+        if when_submitted.tzinfo is None:
+            return when_submitted.replace(tzinfo=UTC), str(media_id)
+        return when_submitted.astimezone(UTC), str(media_id)
+    except (TypeError, ValueError, OverflowError) as e:
+        raise ValueError("Invalid cursor.") from e
+
+
+def get_media_offload_header_value(mode: MediaOffloadMode, file_path: Path, media_path: Path, location: str) -> str:
+    """
+    Return value of internal redirect header which tells reverse proxy what file it should send.
+    `X-Accel-Redirect` expects URI under internal location mapped to media directory and
+    `X-Sendfile` expects absolute path on the filesystem.
+    """
+    file_path = file_path.resolve()
+    if mode == MediaOffloadMode.X_SENDFILE:
+        return file_path.as_posix()
+    relative_path = file_path.relative_to(Path(media_path).resolve()).as_posix()
+    return f"{location.rstrip('/')}/{quote(relative_path)}"
+
+
 def get_sleep_time(cron) -> float:
     """
     This function returns the time delta between now and the next cron execution time.
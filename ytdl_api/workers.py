@@ -0,0 +1,267 @@
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from logging import Logger
+from pathlib import Path
+
+from .cache import SingleFlight, VideoInfoCache
+from .downloaders import IDownloader
+from .exceptions import VideoInfoExtractionTimeout
+from .schemas.models import Download
+from .schemas.responses import DownloadWorkerPoolMetrics, VideoInfoExtractorPoolMetrics, VideoInfoResponse
+from .types import YoutubeURL, get_video_id
+
+DOWNLOAD_JOURNAL_FILENAME = ".download-journal.jsonl"
+
+
+@dataclass
+class DownloadJob:
+    """
+    Download job waiting for free slot in worker pool.
+    """
+
+    download: Download
+    downloader: IDownloader
+    when_enqueued: float = field(default_factory=time.monotonic)
+
+
+class DownloadJournal:
+    """
+    Append-only journal of download jobs stored as JSON lines. Every submitted job is recorded
+    before it is queued and marked as done once worker finishes it, so jobs that were pending or
+    running when process stopped can be replayed on next startup.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending: set[str] = set()
+
+    def record_enqueued(self, download: Download):
+        with self._lock:
+            if download.media_id in self._pending:
+                return
+            self._pending.add(download.media_id)
+            self._append({"event": "enqueued", "download": download.model_dump(mode="json")})
+
+    def record_done(self, media_id: str):
+        with self._lock:
+            self._pending.discard(media_id)
+            if self._pending:
+                self._append({"event": "done", "media_id": media_id})
+            else:
+                # Nothing left to recover so journal can be truncated.
+                self.path.write_text("")
+
+    def replay(self) -> list[Download]:
+        """
+        Return downloads that were not finished and compact journal so it contains only them.
+        """
+        with self._lock:
+            unfinished: dict[str, dict] = {}
+            if self.path.exists():
+                with self.path.open("r") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            # Last line could be partially written if process was killed.
+                            continue
+                        if entry.get("event") == "enqueued":
+                            unfinished[entry["download"]["media_id"]] = entry["download"]
+                        elif entry.get("event") == "done":
+                            unfinished.pop(entry["media_id"], None)
+            tmp_path = self.path.with_suffix(".tmp")
+            with tmp_path.open("w") as f:
+                for download in unfinished.values():
+                    f.write(json.dumps({"event": "enqueued", "download": download}) + "\n")
+            os.replace(tmp_path, self.path)
+            self._pending = set(unfinished.keys())
+            return [Download(**download) for download in unfinished.values()]
+
+    def _append(self, entry: dict):
+        with self.path.open("a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class DownloadWorkerPool:
+    """
+    Dedicated pool of worker threads executing blocking download jobs. Jobs are put into pending
+    queue and executed in FIFO order by at most `max_workers` threads, so amount of concurrently
+    running downloads is bounded and API threadpool is not used for downloading media.
+    """
+
+    def __init__(self, max_workers: int, logger: Logger, journal: DownloadJournal | None = None):
+        if max_workers < 1:
+            raise ValueError("Download worker pool requires at least one worker.")
+        self.max_workers = max_workers
+        self.logger = logger
+        self.journal = journal
+        self._pending: queue.SimpleQueue[DownloadJob | None] = queue.SimpleQueue()
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._active = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_wait_time = 0.0
+        self._max_wait_time = 0.0
+
+    def submit(self, downloader: IDownloader, download: Download):
+        """
+        Put download job into pending queue. Worker threads are started on first submitted job.
+        Job is written to journal on disk first, so it should be called off event loop.
+        """
+        self._ensure_started()
+        if self.journal is not None:
+            self.journal.record_enqueued(download)
+        with self._lock:
+            self._submitted += 1
+        self._pending.put(DownloadJob(download=download, downloader=downloader))
+
+    def shutdown(self):
+        """
+        Stop worker threads once they finish currently running jobs. Pending jobs are dropped without
+        being started (journal keeps them, so they are replayed on next startup).
+        """
+        with self._lock:
+            threads, self._threads = self._threads, []
+            # Workers exit once queue they were started with is replaced, jobs submitted later start new workers.
+            pending, self._pending = self._pending, queue.SimpleQueue()
+        dropped = 0
+        while True:
+            try:
+                pending.get_nowait()
+            except queue.Empty:
+                break
+            dropped += 1
+        if dropped:
+            self.logger.info(f"Dropped {dropped} pending download job(s) on shutdown.")
+        for _ in threads:
+            pending.put(None)
+
+    def metrics(self) -> DownloadWorkerPoolMetrics:
+        with self._lock:
+            started = self._completed + self._failed + self._active
+            return DownloadWorkerPoolMetrics(
+                workers=self.max_workers,
+                active=self._active,
+                pending=self._pending.qsize(),
+                submitted=self._submitted,
+                completed=self._completed,
+                failed=self._failed,
+                avg_wait_time=self._total_wait_time / started if started else 0.0,
+                max_wait_time=self._max_wait_time,
+            )
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._threads:
+                return
+            for n in range(self.max_workers):
+                thread = threading.Thread(
+                    target=self._work, args=(self._pending,), name=f"ytdl-download-worker-{n}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self, pending: queue.SimpleQueue[DownloadJob | None]):
+        while True:
+            job = pending.get()
+            if job is None or pending is not self._pending:
+                return
+            wait_time = time.monotonic() - job.when_enqueued
+            with self._lock:
+                self._active += 1
+                self._total_wait_time += wait_time
+                self._max_wait_time = max(self._max_wait_time, wait_time)
+            self.logger.debug(f"Starting download job ({job.download.media_id}) after {wait_time:.2f}s in queue.")
+            succeeded = False
+            try:
+                succeeded = job.downloader.download(job.download)
+            except Exception as e:  # pragma: no cover
+                self.logger.exception(e)
+            finally:
+                if self.journal is not None:
+                    self.journal.record_done(job.download.media_id)
+                with self._lock:
+                    self._active -= 1
+                    if succeeded:
+                        self._completed += 1
+                    else:
+                        self._failed += 1
+
+
+class VideoInfoExtractorPool:
+    """
+    Dedicated pool of worker threads for blocking video info extraction. Extraction runs off event
+    loop with at most `max_workers` extractions at once, each caller waits at most `timeout` seconds
+    and concurrent requests for the same video share single extraction. Video info found in
+    `video_info_cache` is returned without waiting for free slot.
+    """
+
+    def __init__(self, max_workers: int, timeout: float, video_info_cache: VideoInfoCache | None = None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.video_info_cache = video_info_cache
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ytdl-extractor")
+        self._single_flight: SingleFlight[VideoInfoResponse] = SingleFlight()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._pending = 0
+        self._timeouts = 0
+
+    async def get_video_info(self, downloader: IDownloader, url: YoutubeURL | str) -> VideoInfoResponse:
+        cached = self.video_info_cache.get(url) if self.video_info_cache else None
+        if cached is not None:
+            return cached.video_info
+        return await self._single_flight.do(get_video_id(url), partial(self._extract, downloader, url))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def metrics(self) -> VideoInfoExtractorPoolMetrics:
+        with self._lock:
+            return VideoInfoExtractorPoolMetrics(
+                workers=self.max_workers,
+                active=self._active,
+                pending=self._pending,
+                timeouts=self._timeouts,
+                saturation=(self._active + self._pending) / self.max_workers,
+            )
+
+    async def _extract(self, downloader: IDownloader, url: YoutubeURL | str) -> VideoInfoResponse:
+        with self._lock:
+            self._pending += 1
+        future = self._executor.submit(self._run, downloader, url)
+        future.add_done_callback(self._on_done)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            raise VideoInfoExtractionTimeout(url)
+
+    def _on_done(self, future: Future):
+        # Extraction cancelled (e.g. by timeout) before it was started never reaches `_run`.
+        if future.cancelled():
+            with self._lock:
+                self._pending -= 1
+
+    def _run(self, downloader: IDownloader, url: YoutubeURL | str) -> VideoInfoResponse:
+        with self._lock:
+            self._pending -= 1
+            self._active += 1
+        try:
+            return downloader.get_video_info(url)
+        finally:
+            with self._lock:
+                self._active -= 1